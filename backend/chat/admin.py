@@ -9,7 +9,7 @@ class ChatSessionAdmin(admin.ModelAdmin):
 	list_display = ['title', 'user', 'message_count', 'created_at', 'updated_at', 'is_archived']
 	list_filter = ['is_archived', 'created_at', 'updated_at']
 	search_fields = ['title', 'user__email']
-	readonly_fields = ['id', 'created_at', 'updated_at', 'message_count']
+	readonly_fields = ['id', 'created_at', 'updated_at', 'message_count', 'last_message_at', 'total_tokens']
 	
 	fieldsets = (
 		('Session Info', {
@@ -22,7 +22,7 @@ class ChatSessionAdmin(admin.ModelAdmin):
 			'fields': ('created_at', 'updated_at')
 		}),
 		('Statistics', {
-			'fields': ('message_count',)
+			'fields': ('message_count', 'last_message_at', 'total_tokens')
 		}),
 		('Metadata', {
 			'fields': ('metadata',),
@@ -30,9 +30,7 @@ class ChatSessionAdmin(admin.ModelAdmin):
 		}),
 	)
 	
-	def message_count(self, obj):
-		return obj.messages.count()
-	message_count.short_description = 'Messages'
+	list_select_related = ['user']
 
 
 @admin.register(ChatMessage)
@@ -40,19 +38,22 @@ class ChatMessageAdmin(admin.ModelAdmin):
 	"""Admin interface for ChatMessage"""
 	
 	list_display = ['role', 'content_preview', 'session', 'created_at', 'rating', 'tokens_used']
-	list_filter = ['role', 'created_at', 'rating']
+	list_filter = ['role', 'created_at', 'rating', 'fallback', 'intent', 'sentiment']
 	search_fields = ['content', 'session__title']
-	readonly_fields = ['id', 'created_at', 'session']
+	readonly_fields = [
+		'id', 'created_at', 'session', 'latency_ms', 'ttft_ms', 'fallback', 'intent', 'sentiment', 'model',
+		'rag_enabled', 'rated_at'
+	]
 	
 	fieldsets = (
 		('Message Content', {
 			'fields': ('id', 'session', 'role', 'content')
 		}),
 		('AI Metrics', {
-			'fields': ('tokens_used', 'embedding')
+			'fields': ('tokens_used', 'latency_ms', 'ttft_ms', 'fallback', 'intent', 'sentiment', 'model', 'rag_enabled')
 		}),
 		('Feedback', {
-			'fields': ('rating',)
+			'fields': ('rating', 'rated_at')
 		}),
 		('Timestamp', {
 			'fields': ('created_at',)
@@ -1,12 +1,21 @@
 from django.apps import AppConfig
+import logging
 import os
 
+logger = logging.getLogger(__name__)
+
 
 class ChatConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'chat'
 
     def ready(self):
+        # Registers the system checks; servers don't run them, so report a
+        # process-local cache under several workers at every startup too
+        from .checks import shared_cache_check
+        for error in shared_cache_check():
+            logger.error(f"{error.id}: {error.msg}. {error.hint}")
+
         # When using Django's autoreloader, `ready()` may be called twice
         # (once in the parent watcher process and once in the child). Run
         # heavy initialization only in the reloader child process.
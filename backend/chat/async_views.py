@@ -0,0 +1,179 @@
+"""
+Native async (ASGI) chat endpoints.
+
+DRF views are synchronous, so long-lived streams are served by plain
+Django async views. Under an ASGI server a waiting Gemini stream costs an
+open socket and a coroutine instead of a pinned worker.
+"""
+
+import json
+import threading
+import uuid
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from core.exceptions import ConcurrencyLimitExceeded
+
+from chat.models import ChatSession
+from chat.serializers import SendMessageSerializer
+from chat.services.rag_service import RAGService
+from chat.services.admission import admission
+from chat.services.idempotency import IdempotencyService, IdempotencyKeyReused
+from chat.services.live_analytics import live_async
+from chat.services.replay_buffer import ReplayBuffer
+from chat.services.sse import stream_async, resume_async, last_event_id, sse_response, sse_complete_response
+
+
+async def authenticate_request(request):
+	"""Resolve the JWT bearer user for a plain Django request (None if anonymous/invalid)"""
+	try:
+		result = await sync_to_async(JWTAuthentication().authenticate)(request)
+	except AuthenticationFailed:
+		return None
+	return result[0] if result else None
+
+
+@csrf_exempt
+async def stream_message(request):
+	"""
+	POST /api/chat/messages/astream/ → Stream message (SSE, async)
+	Same payload and event format as /api/chat/messages/stream/.
+	"""
+	if request.method != 'POST':
+		return JsonResponse({'error': 'Method not allowed'}, status=405)
+
+	user = await authenticate_request(request)
+	if user is None:
+		return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=401)
+
+	try:
+		data = json.loads(request.body or b'{}')
+	except ValueError:
+		return JsonResponse({'error': 'Invalid JSON'}, status=400)
+
+	serializer = SendMessageSerializer(data=data)
+	if not serializer.is_valid():
+		return JsonResponse(serializer.errors, status=400)
+
+	session = await ChatSession.objects.filter(
+		id=serializer.validated_data['session_id'],
+		user=user
+	).afirst()
+	if session is None:
+		return JsonResponse({'error': 'Session not found'}, status=404)
+
+	# A retried request (same Idempotency-Key) attaches to the original
+	# stream while it runs, or replays the stored turn once it's done
+	try:
+		record, created = await sync_to_async(IdempotencyService.claim_request)(
+			request, session, serializer.validated_data
+		)
+	except IdempotencyKeyReused as e:
+		return JsonResponse({'error': str(e)}, status=422)
+	except ValueError as e:
+		return JsonResponse({'error': str(e)}, status=400)
+	if record is not None and not created:
+		return await replay_idempotent_stream(request, user, record)
+
+	# Take a generation slot (waits briefly, then 429 + Retry-After)
+	try:
+		await admission.aacquire(user.id)
+	except ConcurrencyLimitExceeded as e:
+		if record is not None:
+			await sync_to_async(IdempotencyService.release)(record)
+		response = JsonResponse({'detail': str(e.detail)}, status=e.status_code)
+		response['Retry-After'] = str(e.wait)
+		return response
+
+	try:
+		# Loads the FAISS index from disk; keep it off the event loop
+		rag_service = await sync_to_async(RAGService, thread_sensitive=False)()
+	except Exception:
+		await admission.arelease(user.id)
+		raise
+
+	turn_id = record.turn_id if record else uuid.uuid4()
+	buffer = ReplayBuffer(turn_id)
+	await sync_to_async(buffer.open)(user.id)
+	cancel = threading.Event()
+
+	async def events():
+		try:
+			async for item in rag_service.astream_user_message(
+				session=session,
+				user_message=serializer.validated_data['content'],
+				use_rag=serializer.validated_data['use_rag'],
+				temperature=serializer.validated_data['temperature'],
+				turn_id=turn_id,
+				cancel=cancel
+			):
+				yield item
+		except Exception:
+			if record is not None:
+				await sync_to_async(IdempotencyService.release)(record)
+			raise
+		finally:
+			# The slot is held until the generation ends, not the response
+			await admission.arelease(user.id)
+
+	return sse_response(stream_async(events(), buffer=buffer, cancel=cancel), turn_id=turn_id)
+
+
+async def replay_idempotent_stream(request, user, record):
+	"""Response for a repeated Idempotency-Key (see ChatMessageViewSet.stream)"""
+	buffer = ReplayBuffer(record.turn_id)
+	if await buffer.aowner() == str(user.id):
+		return sse_response(resume_async(buffer, last_event_id(request)), turn_id=record.turn_id)
+
+	turn = await sync_to_async(IdempotencyService.find_turn)(record)
+	if turn is None:
+		response = JsonResponse(
+			{'error': f"A request with this {IdempotencyService.HEADER} is still in progress"},
+			status=409
+		)
+		response['Retry-After'] = '1'
+		return response
+
+	response = sse_complete_response(RAGService.stored_turn_events(*turn), turn_id=record.turn_id)
+	response['Idempotent-Replayed'] = 'true'
+	return response
+
+
+async def resume_stream(request, turn_id):
+	"""
+	GET /api/chat/messages/astream/<turn_id>/ → Resume a dropped stream (SSE, async)
+	Same behaviour as /api/chat/messages/stream/<turn_id>/.
+	"""
+	if request.method != 'GET':
+		return JsonResponse({'error': 'Method not allowed'}, status=405)
+
+	user = await authenticate_request(request)
+	if user is None:
+		return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=401)
+
+	buffer = ReplayBuffer(turn_id)
+	if await buffer.aowner() != str(user.id):
+		return JsonResponse({'error': 'Stream not found'}, status=404)
+
+	return sse_response(resume_async(buffer, last_event_id(request)), turn_id=turn_id)
+
+
+async def live_analytics(request):
+	"""
+	GET /api/chat/admin/alive/ → Live metric deltas for admins (SSE, async)
+	Same events as /api/chat/admin/live/; a connected dashboard holds no thread.
+	"""
+	if request.method != 'GET':
+		return JsonResponse({'error': 'Method not allowed'}, status=405)
+
+	user = await authenticate_request(request)
+	if user is None:
+		return JsonResponse({'detail': 'Authentication credentials were not provided.'}, status=401)
+	if not user.is_staff:
+		return JsonResponse({'detail': 'You do not have permission to perform this action.'}, status=403)
+
+	return sse_response(live_async(last_event_id(request)))
@@ -0,0 +1,56 @@
+import os
+
+from django.conf import settings
+from django.core.checks import Error, Tags, Warning, register
+from django.db import connections
+from django.db.migrations.recorder import MigrationRecorder
+
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def web_workers():
+    """Worker processes per web instance, as gunicorn reads it by default"""
+    try:
+        return int(os.getenv('WEB_CONCURRENCY', '1'))
+    except ValueError:
+        return 1
+
+
+@register()
+def shared_cache_check(app_configs=None, **kwargs):
+    """
+    Replay buffers, idempotency keys, admission counters and the circuit
+    breaker only work across processes if the default cache is shared.
+    """
+    backend = settings.CACHES['default']['BACKEND']
+    workers = web_workers()
+    if backend in PROCESS_LOCAL_CACHES and workers > 1:
+        return [Error(
+            f"{backend.rsplit('.', 1)[-1]} is per process, but WEB_CONCURRENCY={workers}",
+            hint="Set CACHE_URL to a shared Redis or Memcached instance (see settings.CACHES).",
+            id='chat.E001',
+        )]
+    return []
+
+
+@register(Tags.database)
+def search_index_check(app_configs=None, databases=None, **kwargs):
+    """
+    A SQLite table rebuild drops the log search triggers, and it or a VACUUM
+    renumbers the rowids the index is keyed by. Runs with `migrate` and
+    `check --database default`; `rebuild_search_index --check` goes deeper.
+    """
+    if not databases or 'default' not in databases:
+        return []
+    applied = MigrationRecorder(connections['default']).applied_migrations()
+    if ('chat', '0018_log_search_index') not in applied:
+        return []
+
+    from chat.services.log_search import LogSearchService
+    return [
+        Warning(problem, hint="Run manage.py rebuild_search_index.", id='chat.W001')
+        for problem in LogSearchService.problems()
+    ]
@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from chat.models import ChatMessage, MessageEmbedding
+from chat.services.embedding_service import EmbeddingService
+
+
+class Command(BaseCommand):
+    help = "Embed messages that have no MessageEmbedding row yet, in chunks"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=256, help="Messages embedded and written per batch")
+        parser.add_argument('--dtype', choices=['float16', 'float32'], default=None, help="Storage dtype (defaults to MESSAGE_EMBEDDING_DTYPE)")
+        parser.add_argument('--limit', type=int, default=None, help="Stop after this many messages")
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        limit = options['limit']
+        dtype = options['dtype']
+
+        pending = ChatMessage.objects.filter(embedding_vector__isnull=True).exclude(content='')
+        total = pending.count() if limit is None else min(limit, pending.count())
+        self.stdout.write(self.style.NOTICE(f"Backfilling embeddings for {total} messages"))
+
+        embedding_service = EmbeddingService()
+        done = 0
+        cursor = None  # (created_at, id) of the last processed message
+
+        while done < total:
+            batch = pending.order_by('created_at', 'id')
+            if cursor is not None:
+                batch = batch.filter(
+                    Q(created_at__gt=cursor[0]) | Q(created_at=cursor[0], id__gt=cursor[1])
+                )
+            batch = list(batch.only('id', 'content', 'created_at')[:min(chunk_size, total - done)])
+            if not batch:
+                break
+
+            vectors = embedding_service.get_embeddings_batch([m.content for m in batch])
+            MessageEmbedding.objects.bulk_create(
+                [MessageEmbedding.build(m, v, dtype) for m, v in zip(batch, vectors)],
+                ignore_conflicts=True
+            )
+
+            done += len(batch)
+            cursor = (batch[-1].created_at, batch[-1].id)
+            self.stdout.write(f"  {done}/{total}")
+
+        self.stdout.write(self.style.SUCCESS(f"Backfilled {done} message embeddings"))
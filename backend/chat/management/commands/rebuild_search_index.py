@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from chat.services.log_search import LogSearchService
+
+
+class Command(BaseCommand):
+    help = "Recreate and repopulate the SQLite full-text index used by admin log search"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help="Only verify the index (triggers, row counts, FTS5 integrity-check); fail if it needs a rebuild",
+        )
+
+    def handle(self, *args, **options):
+        if options['check']:
+            problems = LogSearchService.problems(thorough=True)
+            if problems:
+                raise CommandError("Search index needs a rebuild: " + "; ".join(problems))
+            self.stdout.write(self.style.SUCCESS("Search index is in sync"))
+            return
+
+        if LogSearchService.install():
+            self.stdout.write(self.style.SUCCESS("Rebuilt chat_chatmessage_fts and chat_chatsession_fts"))
+        else:
+            # PostgreSQL search_vector columns are generated by the database
+            self.stdout.write(self.style.NOTICE("Nothing to rebuild on this database backend"))
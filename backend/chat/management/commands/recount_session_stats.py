@@ -0,0 +1,54 @@
+from django.core.management.base import BaseCommand
+
+from chat.models import ChatSession
+
+FIELDS = ['message_count', 'total_tokens', 'last_message_at', 'last_message_preview']
+
+
+class Command(BaseCommand):
+    help = "Recompute the denormalized ChatSession counters from the messages table, in chunks"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--chunk-size', type=int, default=500, help="Sessions recomputed and written per batch")
+        parser.add_argument('--dry-run', action='store_true', help="Report drifted sessions without writing")
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        dry_run = options['dry_run']
+
+        sessions = ChatSession.objects.order_by('pk')
+        total = sessions.count()
+        self.stdout.write(self.style.NOTICE(f"Checking counters of {total} sessions"))
+
+        checked = repaired = 0
+        last_pk = None  # keyset cursor over primary keys
+
+        while True:
+            chunk = sessions if last_pk is None else sessions.filter(pk__gt=last_pk)
+            pks = list(chunk.values_list('pk', flat=True)[:chunk_size])
+            if not pks:
+                break
+
+            drifted = []
+            for session in ChatSession.objects.filter(pk__in=pks).with_message_stats():
+                expected = {
+                    'message_count': session.num_messages,
+                    'total_tokens': session.sum_tokens,
+                    'last_message_at': session.latest_message_at,
+                    'last_message_preview': ChatSession.preview(session.last_message_head),
+                }
+                if any(getattr(session, f) != v for f, v in expected.items()):
+                    for f, v in expected.items():
+                        setattr(session, f, v)
+                    drifted.append(session)
+
+            if drifted and not dry_run:
+                ChatSession.objects.bulk_update(drifted, FIELDS)
+
+            checked += len(pks)
+            repaired += len(drifted)
+            last_pk = pks[-1]
+            self.stdout.write(f"  {checked}/{total} ({repaired} drifted)")
+
+        verb = "Found" if dry_run else "Repaired"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {repaired} sessions with drifted counters"))
@@ -0,0 +1,24 @@
+# Generated by Django 5.2.9 on 2026-10-18 22:01
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0005_systemsetting'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MessageEmbedding',
+            fields=[
+                ('message', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='embedding_vector', serialize=False, to='chat.chatmessage')),
+                ('dtype', models.CharField(choices=[('float16', 'float16'), ('float32', 'float32')], default='float16', max_length=8)),
+                ('dimension', models.PositiveSmallIntegerField()),
+                ('vector', models.BinaryField()),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True)),
+            ],
+        ),
+    ]
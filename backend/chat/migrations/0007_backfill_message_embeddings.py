@@ -0,0 +1,61 @@
+# Copies ChatMessage.embedding (JSON float lists) into packed MessageEmbedding rows
+
+import numpy as np
+from django.conf import settings
+from django.db import migrations
+
+CHUNK_SIZE = 500
+
+
+def copy_json_embeddings(apps, schema_editor):
+    ChatMessage = apps.get_model('chat', 'ChatMessage')
+    MessageEmbedding = apps.get_model('chat', 'MessageEmbedding')
+    dtype = getattr(settings, 'MESSAGE_EMBEDDING_DTYPE', 'float16')
+
+    rows = ChatMessage.objects.filter(embedding__isnull=False).values_list('id', 'embedding')
+    batch = []
+    for message_id, embedding in rows.iterator(chunk_size=CHUNK_SIZE):
+        if not embedding:
+            continue
+        batch.append(MessageEmbedding(
+            message_id=message_id,
+            dtype=dtype,
+            dimension=len(embedding),
+            vector=np.asarray(embedding, dtype=dtype).tobytes(),
+        ))
+        if len(batch) >= CHUNK_SIZE:
+            MessageEmbedding.objects.bulk_create(batch, ignore_conflicts=True)
+            batch = []
+    if batch:
+        MessageEmbedding.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def restore_json_embeddings(apps, schema_editor):
+    ChatMessage = apps.get_model('chat', 'ChatMessage')
+    MessageEmbedding = apps.get_model('chat', 'MessageEmbedding')
+
+    # Messages whose JSON column survived (see 0008) keep their original
+    # float32 vector; only ones embedded since are decoded from the table
+    batch = []
+    rows = MessageEmbedding.objects.filter(message__embedding__isnull=True).values_list('message_id', 'dtype', 'vector')
+    for message_id, dtype, vector in rows.iterator(chunk_size=CHUNK_SIZE):
+        batch.append(ChatMessage(
+            id=message_id,
+            embedding=np.frombuffer(vector, dtype=dtype).astype(np.float32).tolist(),
+        ))
+        if len(batch) >= CHUNK_SIZE:
+            ChatMessage.objects.bulk_update(batch, ['embedding'])
+            batch = []
+    if batch:
+        ChatMessage.objects.bulk_update(batch, ['embedding'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0006_messageembedding'),
+    ]
+
+    operations = [
+        migrations.RunPython(copy_json_embeddings, restore_json_embeddings),
+    ]
@@ -0,0 +1,28 @@
+# ChatMessage.embedding leaves the model here, but the JSON column stays in
+# the database for one release so rolling back to 0007 keeps the original
+# float32 vectors (MessageEmbedding holds float16 by default). It is nullable,
+# so inserts that omit it still work. A later migration drops it.
+#
+# On SQLite, later table rebuilds of chat_chatmessage (0013, 0016) copy
+# only the model's columns and drops it earlier; local databases only.
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0007_backfill_message_embeddings'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.RemoveField(
+                    model_name='chatmessage',
+                    name='embedding',
+                ),
+            ],
+            database_operations=[],
+        ),
+    ]
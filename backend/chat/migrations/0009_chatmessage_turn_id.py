@@ -0,0 +1,18 @@
+# Generated by Django 5.2.9 on 2026-10-18 22:04
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0008_remove_chatmessage_embedding'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatmessage',
+            name='turn_id',
+            field=models.UUIDField(blank=True, db_index=True, null=True),
+        ),
+    ]
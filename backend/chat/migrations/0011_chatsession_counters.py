@@ -0,0 +1,71 @@
+# Generated by Django 5.2.9 on 2026-10-18 22:28
+
+from django.db import migrations, models
+from django.db.models import Count, Max, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+
+CHUNK_SIZE = 500
+PREVIEW_LENGTH = 100
+
+
+def fill_session_counters(apps, schema_editor):
+    ChatSession = apps.get_model('chat', 'ChatSession')
+    ChatMessage = apps.get_model('chat', 'ChatMessage')
+
+    latest = ChatMessage.objects.filter(session=OuterRef('pk')).order_by('-created_at')
+    sessions = ChatSession.objects.filter(messages__isnull=False).distinct().order_by('pk')
+    last_pk = None
+    while True:
+        chunk = sessions if last_pk is None else sessions.filter(pk__gt=last_pk)
+        pks = list(chunk.values_list('pk', flat=True)[:CHUNK_SIZE])
+        if not pks:
+            break
+        rows = ChatSession.objects.filter(pk__in=pks).annotate(
+            n=Count('messages'),
+            tokens=Coalesce(Sum('messages__tokens_used'), 0),
+            latest_at=Max('messages__created_at'),
+            latest_content=Subquery(latest.values('content')[:1]),
+        )
+        batch = []
+        for session in rows:
+            content = session.latest_content or ''
+            session.message_count = session.n
+            session.total_tokens = session.tokens
+            session.last_message_at = session.latest_at
+            session.last_message_preview = content[:PREVIEW_LENGTH] + ('...' if len(content) > PREVIEW_LENGTH else '')
+            batch.append(session)
+        ChatSession.objects.bulk_update(
+            batch, ['message_count', 'total_tokens', 'last_message_at', 'last_message_preview']
+        )
+        last_pk = pks[-1]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0010_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatsession',
+            name='last_message_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='chatsession',
+            name='last_message_preview',
+            field=models.CharField(blank=True, max_length=103, null=True),
+        ),
+        migrations.AddField(
+            model_name='chatsession',
+            name='message_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='chatsession',
+            name='total_tokens',
+            field=models.PositiveBigIntegerField(default=0),
+        ),
+        migrations.RunPython(fill_session_counters, migrations.RunPython.noop),
+    ]
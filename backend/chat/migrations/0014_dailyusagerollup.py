@@ -0,0 +1,39 @@
+# Generated by Django 5.2.9 on 2026-10-18 22:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0013_delta_sync'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyUsageRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(unique=True)),
+                ('sessions', models.PositiveIntegerField(default=0)),
+                ('messages', models.PositiveIntegerField(default=0)),
+                ('user_messages', models.PositiveIntegerField(default=0)),
+                ('assistant_messages', models.PositiveIntegerField(default=0)),
+                ('active_users', models.PositiveIntegerField(default=0)),
+                ('engaged_users', models.PositiveIntegerField(default=0)),
+                ('tokens', models.PositiveBigIntegerField(default=0)),
+                ('fallbacks', models.PositiveIntegerField(default=0)),
+                ('latency_sum', models.FloatField(default=0)),
+                ('latency_count', models.PositiveIntegerField(default=0)),
+                ('cancelled_streams', models.PositiveIntegerField(default=0)),
+                ('tokens_saved', models.PositiveBigIntegerField(default=0)),
+                ('seconds_saved', models.FloatField(default=0)),
+                ('intents', models.JSONField(blank=True, default=dict)),
+                ('sentiments', models.JSONField(blank=True, default=dict)),
+                ('computed_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'ordering': ['date'],
+            },
+        ),
+    ]
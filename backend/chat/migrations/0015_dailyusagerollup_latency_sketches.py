@@ -0,0 +1,34 @@
+# Generated by Django 5.2.9 on 2026-10-18 22:45
+
+from django.db import migrations, models
+
+
+def drop_rollups(apps, schema_editor):
+    # Rollups are derived data: clearing them resets the high-water mark,
+    # so roll_up() recomputes history (with latency sketches) from messages
+    DailyUsageRollup = apps.get_model('chat', 'DailyUsageRollup')
+    DailyUsageRollup.objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0014_dailyusagerollup'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='dailyusagerollup',
+            name='latency_count',
+        ),
+        migrations.RemoveField(
+            model_name='dailyusagerollup',
+            name='latency_sum',
+        ),
+        migrations.AddField(
+            model_name='dailyusagerollup',
+            name='latency_sketches',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.RunPython(drop_rollups, migrations.RunPython.noop),
+    ]
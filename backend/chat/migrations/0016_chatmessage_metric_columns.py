@@ -0,0 +1,93 @@
+# Generated by Django 5.2.9 on 2026-10-18 22:49
+
+from django.db import migrations, models
+
+CHUNK_SIZE = 1000
+FIELDS = ['latency_ms', 'ttft_ms', 'fallback', 'intent', 'sentiment', 'model', 'rag_enabled']
+
+
+def to_ms(seconds):
+    return round(seconds * 1000) if seconds is not None else None
+
+
+def fill_metric_columns(apps, schema_editor):
+    # Same mapping as TurnStore.metric_fields at the time of this migration
+    ChatMessage = apps.get_model('chat', 'ChatMessage')
+    replies = ChatMessage.objects.filter(role='assistant').order_by('pk').only('pk', 'metadata')
+    last_pk = None
+    while True:
+        chunk = replies if last_pk is None else replies.filter(pk__gt=last_pk)
+        batch = list(chunk[:CHUNK_SIZE])
+        if not batch:
+            break
+        for message in batch:
+            metadata = message.metadata or {}
+            streaming = metadata.get('streaming')
+            message.latency_ms = to_ms(metadata.get('duration', metadata.get('latency')))
+            message.ttft_ms = to_ms(metadata.get('ttft', metadata.get('latency') if streaming else None))
+            message.fallback = bool(metadata.get('fallback'))
+            message.intent = metadata.get('intent') or ''
+            message.sentiment = metadata.get('sentiment') or ''
+            message.model = metadata.get('model') or ''
+            message.rag_enabled = metadata.get('rag_enabled')
+        ChatMessage.objects.bulk_update(batch, FIELDS)
+        last_pk = batch[-1].pk
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0015_dailyusagerollup_latency_sketches'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='chatmessage',
+            name='fallback',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.AddField(
+            model_name='chatmessage',
+            name='intent',
+            field=models.CharField(blank=True, default='', max_length=50),
+        ),
+        migrations.AddField(
+            model_name='chatmessage',
+            name='latency_ms',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='chatmessage',
+            name='model',
+            field=models.CharField(blank=True, default='', max_length=50),
+        ),
+        migrations.AddField(
+            model_name='chatmessage',
+            name='rag_enabled',
+            field=models.BooleanField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='chatmessage',
+            name='sentiment',
+            field=models.CharField(blank=True, default='', max_length=20),
+        ),
+        migrations.AddField(
+            model_name='chatmessage',
+            name='ttft_ms',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        # Backfill before building the indexes
+        migrations.RunPython(fill_metric_columns, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='chatmessage',
+            index=models.Index(fields=['role', 'created_at', 'fallback'], name='chat_chatme_role_d3c436_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='chatmessage',
+            index=models.Index(fields=['role', 'created_at', 'intent'], name='chat_chatme_role_aad340_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='chatmessage',
+            index=models.Index(fields=['role', 'created_at', 'sentiment'], name='chat_chatme_role_c903c9_idx'),
+        ),
+    ]
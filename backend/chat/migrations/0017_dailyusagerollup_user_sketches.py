@@ -0,0 +1,30 @@
+# Generated by Django 5.2.9 on 2026-10-18 22:52
+
+from django.db import migrations, models
+
+
+def drop_rollups(apps, schema_editor):
+    # Recomputed with user sketches by the next roll_up() runs
+    DailyUsageRollup = apps.get_model('chat', 'DailyUsageRollup')
+    DailyUsageRollup.objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0016_chatmessage_metric_columns'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='dailyusagerollup',
+            name='active_users_hll',
+            field=models.BinaryField(blank=True, default=bytes),
+        ),
+        migrations.AddField(
+            model_name='dailyusagerollup',
+            name='engaged_users_hll',
+            field=models.BinaryField(blank=True, default=bytes),
+        ),
+        migrations.RunPython(drop_rollups, migrations.RunPython.noop),
+    ]
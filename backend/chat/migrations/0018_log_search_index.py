@@ -0,0 +1,84 @@
+# Full-text index for admin log search (chat.services.log_search).
+#
+# SQLite: external-content FTS5 tables over message content and session
+# titles, kept in sync by triggers and keyed by the tables' rowid.
+# PostgreSQL: generated tsvector columns with GIN indexes.
+# Other backends keep the icontains search and get no index.
+#
+# The DDL is frozen here; chat/services/search_index.py holds the current
+# definition that LogSearchService.install() runs, and a change to the
+# index itself belongs in a new migration.
+
+from django.db import migrations
+
+SQLITE_FORWARD = [
+    "CREATE VIRTUAL TABLE chat_chatmessage_fts USING fts5("
+    " content, content='chat_chatmessage', content_rowid='rowid', tokenize='porter unicode61')",
+    "CREATE TRIGGER chat_chatmessage_fts_ai AFTER INSERT ON chat_chatmessage BEGIN"
+    " INSERT INTO chat_chatmessage_fts(rowid, content) VALUES (new.rowid, new.content); END",
+    "CREATE TRIGGER chat_chatmessage_fts_ad AFTER DELETE ON chat_chatmessage BEGIN"
+    " INSERT INTO chat_chatmessage_fts(chat_chatmessage_fts, rowid, content) VALUES ('delete', old.rowid, old.content); END",
+    "CREATE TRIGGER chat_chatmessage_fts_au AFTER UPDATE OF content ON chat_chatmessage BEGIN"
+    " INSERT INTO chat_chatmessage_fts(chat_chatmessage_fts, rowid, content) VALUES ('delete', old.rowid, old.content);"
+    " INSERT INTO chat_chatmessage_fts(rowid, content) VALUES (new.rowid, new.content); END",
+    "INSERT INTO chat_chatmessage_fts(chat_chatmessage_fts) VALUES ('rebuild')",
+
+    "CREATE VIRTUAL TABLE chat_chatsession_fts USING fts5("
+    " title, content='chat_chatsession', content_rowid='rowid', tokenize='porter unicode61')",
+    "CREATE TRIGGER chat_chatsession_fts_ai AFTER INSERT ON chat_chatsession BEGIN"
+    " INSERT INTO chat_chatsession_fts(rowid, title) VALUES (new.rowid, new.title); END",
+    "CREATE TRIGGER chat_chatsession_fts_ad AFTER DELETE ON chat_chatsession BEGIN"
+    " INSERT INTO chat_chatsession_fts(chat_chatsession_fts, rowid, title) VALUES ('delete', old.rowid, old.title); END",
+    "CREATE TRIGGER chat_chatsession_fts_au AFTER UPDATE OF title ON chat_chatsession BEGIN"
+    " INSERT INTO chat_chatsession_fts(chat_chatsession_fts, rowid, title) VALUES ('delete', old.rowid, old.title);"
+    " INSERT INTO chat_chatsession_fts(rowid, title) VALUES (new.rowid, new.title); END",
+    "INSERT INTO chat_chatsession_fts(chat_chatsession_fts) VALUES ('rebuild')",
+]
+
+SQLITE_BACKWARD = [
+    "DROP TRIGGER IF EXISTS chat_chatmessage_fts_ai",
+    "DROP TRIGGER IF EXISTS chat_chatmessage_fts_ad",
+    "DROP TRIGGER IF EXISTS chat_chatmessage_fts_au",
+    "DROP TABLE IF EXISTS chat_chatmessage_fts",
+    "DROP TRIGGER IF EXISTS chat_chatsession_fts_ai",
+    "DROP TRIGGER IF EXISTS chat_chatsession_fts_ad",
+    "DROP TRIGGER IF EXISTS chat_chatsession_fts_au",
+    "DROP TABLE IF EXISTS chat_chatsession_fts",
+]
+
+POSTGRES_FORWARD = [
+    "ALTER TABLE chat_chatmessage ADD COLUMN search_vector tsvector"
+    " GENERATED ALWAYS AS (to_tsvector('english', coalesce(content, ''))) STORED",
+    "CREATE INDEX chat_chatmessage_search_gin ON chat_chatmessage USING GIN (search_vector)",
+    "ALTER TABLE chat_chatsession ADD COLUMN search_vector tsvector"
+    " GENERATED ALWAYS AS (to_tsvector('english', coalesce(title, ''))) STORED",
+    "CREATE INDEX chat_chatsession_search_gin ON chat_chatsession USING GIN (search_vector)",
+]
+
+POSTGRES_BACKWARD = [
+    "DROP INDEX IF EXISTS chat_chatmessage_search_gin",
+    "ALTER TABLE chat_chatmessage DROP COLUMN IF EXISTS search_vector",
+    "DROP INDEX IF EXISTS chat_chatsession_search_gin",
+    "ALTER TABLE chat_chatsession DROP COLUMN IF EXISTS search_vector",
+]
+
+
+def _run(statements_by_vendor):
+    def run(apps, schema_editor):
+        for sql in statements_by_vendor.get(schema_editor.connection.vendor, []):
+            schema_editor.execute(sql)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0017_dailyusagerollup_user_sketches'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            _run({'sqlite': SQLITE_FORWARD, 'postgresql': POSTGRES_FORWARD}),
+            _run({'sqlite': SQLITE_BACKWARD, 'postgresql': POSTGRES_BACKWARD}),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.9 on 2026-10-18 23:03
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def backfill_rated_at(apps, schema_editor):
+    # Ratings before this column: the last write to the message is the best
+    # record of when it was rated. Only `rated_at` is updated, so the
+    # content triggers of the search index (0018) don't fire.
+    ChatMessage = apps.get_model('chat', 'ChatMessage')
+    ChatMessage.objects.filter(rating__isnull=False, rated_at__isnull=True).update(rated_at=F('updated_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('chat', '0018_log_search_index'),
+    ]
+
+    operations = [
+        # Nullable without a default: SQLite adds the column in place, so the
+        # FTS triggers from 0018 survive (no table rebuild)
+        migrations.AddField(
+            model_name='chatmessage',
+            name='rated_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.RunPython(backfill_rated_at, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='chatmessage',
+            index=models.Index(fields=['rated_at', 'id'], name='chat_chatme_rated_a_401362_idx'),
+        ),
+    ]
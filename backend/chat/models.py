@@ -1,13 +1,38 @@
 import uuid
+import numpy as np
+from django.conf import settings
 from django.db import models
+from django.db.models import Count, Max, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce, Substr
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
 
 
+class ChatSessionQuerySet(models.QuerySet):
+	def with_message_stats(self):
+		"""
+		Annotate the session counters recomputed from the messages table
+		(num_messages, sum_tokens, latest_message_at, last_message_head).
+		Used to repair the denormalized columns, not to serve reads.
+		"""
+		latest = ChatMessage.objects.filter(session=OuterRef('pk')).order_by('-created_at')
+		return self.annotate(
+			num_messages=Count('messages'),
+			sum_tokens=Coalesce(Sum('messages__tokens_used'), 0),
+			latest_message_at=Max('messages__created_at'),
+			last_message_head=Subquery(
+				latest.values(head=Substr('content', 1, ChatSession.PREVIEW_LENGTH + 1))[:1]
+			),
+		)
+
+
 class ChatSession(models.Model):
 	"""Container for a conversation thread"""
 	
+	# Characters of the latest message shown in session lists
+	PREVIEW_LENGTH = 100
+	
 	id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
 	user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='chat_sessions')
 	title = models.CharField(max_length=255, blank=True)
@@ -17,13 +42,23 @@ class ChatSession(models.Model):
 	is_pinned = models.BooleanField(default=False)
 	is_public = models.BooleanField(default=False)  # Allow public read-only access
 	
+	# Denormalized from the messages table, maintained by TurnStore on write
+	# (repair with `manage.py recount_session_stats`)
+	message_count = models.PositiveIntegerField(default=0)
+	last_message_at = models.DateTimeField(null=True, blank=True)
+	last_message_preview = models.CharField(max_length=PREVIEW_LENGTH + 3, null=True, blank=True)
+	total_tokens = models.PositiveBigIntegerField(default=0)
+	
 	# Metadata for future features
 	metadata = models.JSONField(default=dict, blank=True)
 	
+	objects = ChatSessionQuerySet.as_manager()
+	
 	class Meta:
 		ordering = ['-is_pinned', '-updated_at']
 		indexes = [
 			models.Index(fields=['user', 'created_at']),
+			models.Index(fields=['user', 'updated_at']),
 			models.Index(fields=['user', 'is_archived']),
 			models.Index(fields=['user', 'is_pinned']),
 		]
@@ -31,13 +66,17 @@ class ChatSession(models.Model):
 	def __str__(self):
 		return f"{self.title or 'Chat'} - {self.user.email}"
 	
-	@property
-	def message_count(self):
-		return self.messages.count()
-	
 	@property
 	def last_message(self):
 		return self.messages.last()
+	
+	@classmethod
+	def preview(cls, content):
+		"""Truncated message text for session lists"""
+		if content is None:
+			return None
+		head = content[:cls.PREVIEW_LENGTH]
+		return head + "..." if len(content) > cls.PREVIEW_LENGTH else head
 
 
 class ChatMessage(models.Model):
@@ -57,28 +96,224 @@ class ChatMessage(models.Model):
 	role = models.CharField(max_length=10, choices=ROLE_CHOICES)
 	content = models.TextField()
 	created_at = models.DateTimeField(auto_now_add=True)
+	# Delta sync position (chat.services.sync); bumped on rating/edits
+	updated_at = models.DateTimeField(auto_now=True, db_index=True)
+	
+	# Shared by the user/assistant pair written for one chat turn
+	turn_id = models.UUIDField(null=True, blank=True, db_index=True)
 	
-	# AI metrics
+	# AI metrics (embedding vectors live in MessageEmbedding)
 	tokens_used = models.IntegerField(null=True, blank=True)
-	embedding = models.JSONField(null=True, blank=True)  # Store vector for retrieval
 	
 	# User feedback
 	rating = models.IntegerField(null=True, blank=True, choices=[(i, str(i)) for i in range(1, 6)])
+	# Feedback export watermark (chat.services.feedback_export); set on every rating
+	rated_at = models.DateTimeField(null=True, blank=True)
 	
 	# Metadata
 	metadata = models.JSONField(default=dict, blank=True)
 	
+	# Reply metrics analytics filter and group on, copied out of metadata
+	# by TurnStore so they are indexable; empty on user messages
+	latency_ms = models.PositiveIntegerField(null=True, blank=True)
+	ttft_ms = models.PositiveIntegerField(null=True, blank=True)
+	fallback = models.BooleanField(default=False)
+	intent = models.CharField(max_length=50, blank=True, default='')
+	sentiment = models.CharField(max_length=20, blank=True, default='')
+	model = models.CharField(max_length=50, blank=True, default='')
+	rag_enabled = models.BooleanField(null=True, blank=True)
+	
 	class Meta:
 		ordering = ['created_at']
 		indexes = [
-			models.Index(fields=['session', 'created_at']),
+			# Keyset pagination order (chat.pagination)
+			models.Index(fields=['session', 'created_at', 'id']),
 			models.Index(fields=['session', 'role']),
+			# Windowed reply analytics (rollups, series)
+			models.Index(fields=['role', 'created_at', 'fallback']),
+			models.Index(fields=['role', 'created_at', 'intent']),
+			models.Index(fields=['role', 'created_at', 'sentiment']),
+			# Incremental feedback export
+			models.Index(fields=['rated_at', 'id']),
 		]
 	
 	def __str__(self):
 		preview = self.content[:50] + "..." if len(self.content) > 50 else self.content
 		return f"{self.get_role_display()}: {preview}"
 
+class MessageEmbeddingQuerySet(models.QuerySet):
+	def as_matrix(self):
+		"""
+		Load vectors as a (message_ids, float32 matrix) pair.
+
+		The matrix is one contiguous buffer sized from a COUNT; each stored
+		vector is widened straight into its row, so there is no per-row
+		array list and no final vstack copy. Rows written between the COUNT
+		and the read are appended (one extra copy, only in that case).
+		"""
+		total = self.count()
+		message_ids = []
+		matrix = None
+		extra = []
+		rows = self.values_list('message_id', 'dimension', 'dtype', 'vector')
+		for i, (message_id, dimension, dtype, vector) in enumerate(rows.iterator(chunk_size=2000)):
+			if matrix is None:
+				matrix = np.empty((total, dimension), dtype=np.float32)
+			if dimension != matrix.shape[1]:
+				raise ValueError(f"Mixed embedding dimensions: {dimension} != {matrix.shape[1]}")
+			message_ids.append(message_id)
+			if i < total:
+				matrix[i] = np.frombuffer(vector, dtype=dtype)
+			else:
+				extra.append(np.frombuffer(vector, dtype=dtype))
+		if matrix is None:
+			return message_ids, np.empty((0, 0), dtype=np.float32)
+		if extra:
+			return message_ids, np.concatenate([matrix, np.asarray(extra, dtype=np.float32)])
+		# Rows deleted since the COUNT leave the tail unused
+		return message_ids, matrix[:len(message_ids)]
+
+
+class MessageEmbedding(models.Model):
+	"""Packed semantic vector for a message, kept off the hot ChatMessage row"""
+	
+	DTYPE_CHOICES = (
+		('float16', 'float16'),
+		('float32', 'float32'),
+	)
+	
+	message = models.OneToOneField(
+		ChatMessage,
+		on_delete=models.CASCADE,
+		primary_key=True,
+		related_name='embedding_vector'
+	)
+	dtype = models.CharField(max_length=8, choices=DTYPE_CHOICES, default='float16')
+	dimension = models.PositiveSmallIntegerField()
+	vector = models.BinaryField()
+	created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+	
+	objects = MessageEmbeddingQuerySet.as_manager()
+	
+	def __str__(self):
+		return f"Embedding({self.dimension}, {self.dtype}) for {self.message_id}"
+	
+	@staticmethod
+	def pack(embedding, dtype=None) -> bytes:
+		dtype = dtype or getattr(settings, 'MESSAGE_EMBEDDING_DTYPE', 'float16')
+		return np.asarray(embedding, dtype=dtype).tobytes()
+	
+	def as_array(self) -> np.ndarray:
+		"""Zero-copy view over the stored bytes (read-only)"""
+		return np.frombuffer(self.vector, dtype=self.dtype)
+	
+	@classmethod
+	def build(cls, message, embedding, dtype=None):
+		"""Unsaved instance, for bulk_create"""
+		dtype = dtype or getattr(settings, 'MESSAGE_EMBEDDING_DTYPE', 'float16')
+		return cls(
+			message=message,
+			dtype=dtype,
+			dimension=len(embedding),
+			vector=cls.pack(embedding, dtype)
+		)
+	
+	@classmethod
+	def store(cls, message, embedding, dtype=None):
+		"""Insert or replace the vector for a message"""
+		packed = cls.build(message, embedding, dtype)
+		obj, _ = cls.objects.update_or_create(
+			message=message,
+			defaults={'dtype': packed.dtype, 'dimension': packed.dimension, 'vector': packed.vector}
+		)
+		return obj
+
+
+class IdempotencyKey(models.Model):
+	"""Client-supplied Idempotency-Key and the chat turn it produced"""
+	
+	user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='idempotency_keys')
+	key = models.CharField(max_length=255)
+	session = models.ForeignKey(ChatSession, on_delete=models.CASCADE, related_name='+')
+	turn_id = models.UUIDField(default=uuid.uuid4)
+	
+	# Hash of the request payload; a reused key must carry the same request
+	fingerprint = models.CharField(max_length=64)
+	created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+	
+	class Meta:
+		constraints = [
+			models.UniqueConstraint(fields=['user', 'key'], name='unique_idempotency_key_per_user'),
+		]
+	
+	def __str__(self):
+		return f"{self.key} → turn {self.turn_id}"
+
+
+class SyncTombstone(models.Model):
+	"""
+	Record of a deleted session or message, so delta sync can tell clients
+	to drop it. Purged after SYNC_TOMBSTONE_TTL_DAYS; older sync tokens
+	must resync from scratch.
+	"""
+	
+	KIND_CHOICES = [
+		('session', 'Session'),
+		('message', 'Message'),
+	]
+	
+	user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='sync_tombstones')
+	kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+	object_id = models.UUIDField()
+	deleted_at = models.DateTimeField(auto_now_add=True, db_index=True)
+	
+	class Meta:
+		indexes = [
+			models.Index(fields=['user', 'deleted_at']),
+		]
+	
+	def __str__(self):
+		return f"{self.kind} {self.object_id} deleted"
+
+
+class DailyUsageRollup(models.Model):
+	"""
+	Usage totals for one closed day (settings.TIME_ZONE), written once by
+	UsageRollupService. The latest date is the rollup high-water mark;
+	analytics read these rows and compute only the days after it live.
+	"""
+	
+	date = models.DateField(unique=True)
+	
+	sessions = models.PositiveIntegerField(default=0)
+	messages = models.PositiveIntegerField(default=0)
+	user_messages = models.PositiveIntegerField(default=0)
+	assistant_messages = models.PositiveIntegerField(default=0)
+	active_users = models.PositiveIntegerField(default=0)   # distinct users who sent a message
+	engaged_users = models.PositiveIntegerField(default=0)  # ... more than one
+	tokens = models.PositiveBigIntegerField(default=0)
+	
+	# Assistant replies
+	fallbacks = models.PositiveIntegerField(default=0)
+	cancelled_streams = models.PositiveIntegerField(default=0)
+	tokens_saved = models.PositiveBigIntegerField(default=0)
+	seconds_saved = models.FloatField(default=0)
+	intents = models.JSONField(default=dict, blank=True)     # {intent: count}
+	sentiments = models.JSONField(default=dict, blank=True)  # {sentiment: count}
+	latency_sketches = models.JSONField(default=dict, blank=True)  # {metric: DDSketch.to_dict()}
+	# HyperLogLog.to_bytes() of the day's active/engaged user ids (distinct over windows)
+	active_users_hll = models.BinaryField(default=bytes, blank=True)
+	engaged_users_hll = models.BinaryField(default=bytes, blank=True)
+	
+	computed_at = models.DateTimeField(auto_now=True)
+	
+	class Meta:
+		ordering = ['date']
+	
+	def __str__(self):
+		return f"Usage {self.date}"
+
+
 class KnowledgeBaseDocument(models.Model):
 	"""Registry of documents used for RAG"""
 	id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
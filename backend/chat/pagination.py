@@ -0,0 +1,109 @@
+"""
+Message Pagination
+Keyset (created_at, id) cursors over a session's messages, newest first
+"""
+
+import base64
+import uuid
+from dataclasses import dataclass, field
+from typing import List, Optional, Tuple
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import ValidationError
+
+from chat.models import ChatMessage
+
+
+@dataclass
+class MessagePage:
+	"""One page of messages (newest first) and the cursors around it"""
+	messages: List[ChatMessage] = field(default_factory=list)
+	before: Optional[str] = None  # older messages exist; pass as ?before=
+	after: Optional[str] = None   # position of the newest message; pass as ?after= to poll
+
+	@property
+	def cursors(self) -> dict:
+		return {'before': self.before, 'after': self.after}
+
+
+class MessageCursorPagination:
+	"""
+	Keyset pagination on (created_at, id)
+
+	Unlike offset pagination, a page costs one index range scan on
+	(session, created_at, id) however deep the client has scrolled, and
+	messages written meanwhile can't shift rows between pages.
+
+	- no cursor      → the latest `limit` messages
+	- ?before=<c>    → the `limit` messages just older than c
+	- ?after=<c>     → the `limit` messages just newer than c
+	Pages are always returned newest first. Cursors are opaque tokens.
+	"""
+
+	max_limit = 100
+
+	@property
+	def default_limit(self) -> int:
+		return getattr(settings, 'MESSAGE_PAGE_SIZE', 30)
+
+	@staticmethod
+	def encode(message: ChatMessage) -> str:
+		raw = f"{message.created_at.isoformat()}|{message.id}"
+		return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+	@staticmethod
+	def decode(token: str) -> Tuple:
+		"""(created_at, id) of a cursor; raises ValidationError if malformed"""
+		try:
+			raw = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)).decode('utf-8')
+			created_at, message_id = raw.split('|')
+			position = (parse_datetime(created_at), uuid.UUID(message_id))
+		except (ValueError, UnicodeDecodeError):
+			raise ValidationError({'cursor': 'Invalid cursor'})
+		if position[0] is None:
+			raise ValidationError({'cursor': 'Invalid cursor'})
+		return position
+
+	def _limit(self, value) -> int:
+		try:
+			limit = int(value) if value is not None else self.default_limit
+		except ValueError:
+			limit = self.default_limit
+		return max(1, min(limit, self.max_limit))
+
+	def paginate(self, queryset, before: str = None, after: str = None, limit: int = None) -> MessagePage:
+		if before and after:
+			raise ValidationError({'cursor': 'Pass either before or after, not both'})
+		limit = self._limit(limit)
+
+		if after:
+			created_at, message_id = self.decode(after)
+			rows = list(queryset.filter(
+				Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=message_id)
+			).order_by('created_at', 'id')[:limit])
+			rows.reverse()
+			# An empty catch-up keeps the caller's position
+			page = MessagePage(rows, after=self.encode(rows[0]) if rows else after)
+			if rows:
+				page.before = self.encode(rows[-1])
+			return page
+
+		rows = queryset.order_by('-created_at', '-id')
+		if before:
+			created_at, message_id = self.decode(before)
+			rows = rows.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=message_id))
+		rows = list(rows[:limit + 1])
+
+		has_older = len(rows) > limit
+		rows = rows[:limit]
+		return MessagePage(
+			rows,
+			before=self.encode(rows[-1]) if has_older else None,
+			after=self.encode(rows[0]) if rows else None,
+		)
+
+	def paginate_request(self, queryset, request) -> MessagePage:
+		params = request.query_params
+		return self.paginate(queryset, params.get('before'), params.get('after'), params.get('limit'))
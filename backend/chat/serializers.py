@@ -10,39 +10,55 @@ class ChatMessageSerializer(serializers.ModelSerializer):
 	
 	class Meta:
 		model = ChatMessage
-		fields = ['id', 'role', 'content', 'created_at', 'rating', 'tokens_used', 'metadata']
-		read_only_fields = ['id', 'created_at', 'tokens_used', 'metadata']
+		fields = ['id', 'turn_id', 'role', 'content', 'created_at', 'rating', 'tokens_used', 'metadata']
+		read_only_fields = ['id', 'turn_id', 'created_at', 'tokens_used', 'metadata']
+
+
+class SyncMessageSerializer(ChatMessageSerializer):
+	"""Message as returned by delta sync (carries its session)"""
+	
+	class Meta(ChatMessageSerializer.Meta):
+		fields = ChatMessageSerializer.Meta.fields + ['session_id', 'updated_at']
 
 
 class ChatSessionListSerializer(serializers.ModelSerializer):
 	"""Serializer for chat session list view"""
 	
-	message_count = serializers.SerializerMethodField()
-	last_message_preview = serializers.SerializerMethodField()
-	
 	class Meta:
 		model = ChatSession
-		fields = ['id', 'title', 'created_at', 'updated_at', 'message_count', 'last_message_preview', 'is_pinned', 'is_archived', 'is_public']
+		fields = [
+			'id', 'title', 'created_at', 'updated_at', 'message_count', 'last_message_at',
+			'last_message_preview', 'total_tokens', 'is_pinned', 'is_archived', 'is_public'
+		]
+		read_only_fields = ['message_count', 'last_message_at', 'last_message_preview', 'total_tokens']
+
+
+class MessagePageMixin(serializers.Serializer):
+	"""
+	Session header plus one page of messages (newest first), from the
+	MessagePage passed as context['message_page']. Older pages are
+	fetched with the 'before' cursor from the messages endpoint.
+	"""
 	
-	def get_message_count(self, obj):
-		return obj.messages.count()
+	messages = serializers.SerializerMethodField()
+	cursors = serializers.SerializerMethodField()
 	
-	def get_last_message_preview(self, obj):
-		last_msg = obj.messages.last()
-		if not last_msg:
-			return None
-		preview = last_msg.content[:100]
-		return preview + "..." if len(last_msg.content) > 100 else preview
+	def get_messages(self, obj):
+		return ChatMessageSerializer(self.context['message_page'].messages, many=True).data
+	
+	def get_cursors(self, obj):
+		return self.context['message_page'].cursors
 
 
-class ChatSessionDetailSerializer(serializers.ModelSerializer):
-	"""Serializer for full chat session with all messages"""
-	
-	messages = ChatMessageSerializer(many=True, read_only=True)
+class ChatSessionDetailSerializer(MessagePageMixin, serializers.ModelSerializer):
+	"""Serializer for a chat session with its latest page of messages"""
 	
 	class Meta:
 		model = ChatSession
-		fields = ['id', 'title', 'created_at', 'updated_at', 'messages', 'is_pinned', 'is_archived', 'is_public']
+		fields = [
+			'id', 'title', 'created_at', 'updated_at', 'message_count', 'messages', 'cursors',
+			'is_pinned', 'is_archived', 'is_public'
+		]
 
 
 class ChatSessionCreateSerializer(serializers.ModelSerializer):
@@ -68,14 +84,12 @@ class MessageRatingSerializer(serializers.Serializer):
 	rating = serializers.IntegerField(min_value=1, max_value=5)
 
 
-class PublicChatSessionSerializer(serializers.ModelSerializer):
+class PublicChatSessionSerializer(MessagePageMixin, serializers.ModelSerializer):
 	"""Serializer for public read-only access to a chat session"""
 	
-	messages = ChatMessageSerializer(many=True, read_only=True)
-	
 	class Meta:
 		model = ChatSession
-		fields = ['id', 'title', 'created_at', 'messages']
+		fields = ['id', 'title', 'created_at', 'message_count', 'messages', 'cursors']
 
 class KnowledgeBaseDocumentSerializer(serializers.ModelSerializer):
 	"""Serializer for Knowledge Base documents"""
@@ -0,0 +1,119 @@
+"""
+Admission Control
+Caps concurrent LLM generations per user and across the deployment
+"""
+
+import asyncio
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from core.exceptions import ConcurrencyLimitExceeded
+
+
+class AdmissionController:
+	"""
+	In-flight generation counters in the shared cache
+
+	- llm:inflight:global       → generations running anywhere
+	- llm:inflight:user:{id}    → generations running for one user
+
+	A slot is taken with an atomic incr and handed back (decr) if it
+	overshoots either cap. When saturated, a request waits up to
+	LLM_ADMISSION_QUEUE_SECONDS for a slot before being rejected with
+	Retry-After, which keeps tail latency bounded under bursts instead of
+	piling work onto Gemini.
+
+	Every acquire and release refreshes a counter's expiry, so it only
+	lapses after LLM_INFLIGHT_TTL_SECONDS without admission activity on it;
+	that is how a slot leaked by a crashed worker is eventually reclaimed
+	without a busy counter expiring under running generations. A release
+	that finds its counter recreated (lapsed meanwhile) is clamped at zero
+	rather than driving it negative and letting the caps be exceeded.
+	"""
+
+	GLOBAL_KEY = "llm:inflight:global"
+	POLL_INTERVAL = 0.05
+
+	@staticmethod
+	def _user_key(user_id) -> str:
+		return f"llm:inflight:user:{user_id}"
+
+	@staticmethod
+	def _setting(name: str, default):
+		return getattr(settings, name, default)
+
+	@property
+	def per_user_limit(self) -> int:
+		return self._setting('LLM_MAX_INFLIGHT_PER_USER', 2)
+
+	@property
+	def global_limit(self) -> int:
+		return self._setting('LLM_MAX_INFLIGHT_GLOBAL', 64)
+
+	@property
+	def ttl(self) -> int:
+		return self._setting('LLM_INFLIGHT_TTL_SECONDS', 300)
+
+	def _retry_after(self) -> int:
+		return self._setting('LLM_ADMISSION_RETRY_AFTER_SECONDS', 2)
+
+	def _decr(self, key: str):
+		try:
+			remaining = cache.decr(key)
+		except ValueError:
+			return  # expired meanwhile
+		if remaining < 0:
+			# Counter lapsed and was recreated while this slot ran
+			cache.incr(key, -remaining)
+		cache.touch(key, self.ttl)
+
+	def _take(self, key: str, limit: int) -> bool:
+		cache.add(key, 0, timeout=self.ttl)
+		try:
+			count = cache.incr(key)
+		except ValueError:
+			return False
+		cache.touch(key, self.ttl)
+		if count > limit:
+			self._decr(key)
+			return False
+		return True
+
+	def try_acquire(self, user_id) -> bool:
+		if not self._take(self._user_key(user_id), self.per_user_limit):
+			return False
+		if not self._take(self.GLOBAL_KEY, self.global_limit):
+			self._decr(self._user_key(user_id))
+			return False
+		return True
+
+	def acquire(self, user_id):
+		"""Take a slot, waiting briefly; raises ConcurrencyLimitExceeded"""
+		deadline = time.monotonic() + self._setting('LLM_ADMISSION_QUEUE_SECONDS', 2)
+		while not self.try_acquire(user_id):
+			if time.monotonic() >= deadline:
+				raise ConcurrencyLimitExceeded(wait=self._retry_after())
+			time.sleep(self.POLL_INTERVAL)
+
+	async def aacquire(self, user_id):
+		deadline = time.monotonic() + self._setting('LLM_ADMISSION_QUEUE_SECONDS', 2)
+		while not await asyncio.to_thread(self.try_acquire, user_id):
+			if time.monotonic() >= deadline:
+				raise ConcurrencyLimitExceeded(wait=self._retry_after())
+			await asyncio.sleep(self.POLL_INTERVAL)
+
+	def release(self, user_id):
+		self._decr(self._user_key(user_id))
+		self._decr(self.GLOBAL_KEY)
+
+	async def arelease(self, user_id):
+		await asyncio.to_thread(self.release, user_id)
+
+	def inflight(self) -> int:
+		"""Generations currently running across the deployment"""
+		return max(0, cache.get(self.GLOBAL_KEY) or 0)
+
+
+admission = AdmissionController()
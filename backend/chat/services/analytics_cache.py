@@ -0,0 +1,124 @@
+"""
+Analytics Dashboard Cache
+The admin analytics payload, computed in parallel and served
+stale-while-revalidate from the shared cache
+"""
+
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+
+from .analytics_service import AnalyticsService
+
+logger = logging.getLogger(__name__)
+
+
+class AnalyticsDashboard:
+	"""
+	Composite admin analytics payload per `days` window
+
+	- fresh (younger than ANALYTICS_CACHE_FRESH_SECONDS) → served as is
+	- stale (kept up to ANALYTICS_CACHE_STALE_SECONDS)   → served as is, and
+	  one background refresh is started; a lock in the shared cache keeps
+	  other requests and workers from starting their own
+	- missing                                             → computed inline
+
+	Sections are independent, so they run on a small thread pool
+	(ANALYTICS_SECTION_WORKERS); each thread uses and then closes its own
+	DB connection. The rollup-backed sections share one task so the usage
+	window is read once.
+	"""
+
+	REFRESH_LOCK_SECONDS = 120  # a crashed refresh frees the window after this
+
+	@staticmethod
+	def _setting(name: str, default):
+		return getattr(settings, name, default)
+
+	@staticmethod
+	def _key(days: int) -> str:
+		return f"analytics:dashboard:{days}"
+
+	@staticmethod
+	def _lock_key(days: int) -> str:
+		return f"analytics:dashboard:{days}:refreshing"
+
+	# Compute
+
+	@staticmethod
+	def _usage_sections(days: int) -> dict:
+		service = AnalyticsService()
+		return {
+			'summary': service.get_summary_stats(days),
+			'nlp': service.get_nlp_performance(days),
+			'intents': service.get_intent_distribution(days),
+		}
+
+	@classmethod
+	def _tasks(cls, days: int) -> list:
+		return [
+			lambda: cls._usage_sections(days),
+			lambda: {'trends': AnalyticsService().get_engagement_trends(days if days < 30 else 7)},
+			lambda: {'learning': AnalyticsService().get_learning_pipeline_stats()},
+			lambda: {'health': AnalyticsService().get_system_health()},
+		]
+
+	@staticmethod
+	def _in_own_connection(task):
+		try:
+			return task()
+		finally:
+			connection.close()
+
+	@classmethod
+	def compute(cls, days: int) -> dict:
+		"""Build the payload and store it in the cache"""
+		tasks = cls._tasks(days)
+		workers = cls._setting('ANALYTICS_SECTION_WORKERS', 4)
+		payload = {}
+		if workers > 1:
+			with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='analytics') as pool:
+				for sections in pool.map(cls._in_own_connection, tasks):
+					payload.update(sections)
+		else:
+			for task in tasks:
+				payload.update(task())
+
+		payload['generated_at'] = time.time()
+		cache.set(cls._key(days), payload, timeout=cls._setting('ANALYTICS_CACHE_STALE_SECONDS', 3600))
+		return payload
+
+	# Reads
+
+	@classmethod
+	def get(cls, days: int) -> dict:
+		payload = cache.get(cls._key(days))
+		if payload is None:
+			return cls.compute(days)
+		if time.time() - payload['generated_at'] >= cls._setting('ANALYTICS_CACHE_FRESH_SECONDS', 60):
+			cls.refresh_in_background(days)
+		return payload
+
+	@classmethod
+	def refresh_in_background(cls, days: int) -> bool:
+		"""Start one refresh for the window unless one is running"""
+		lock_key = cls._lock_key(days)
+		if not cache.add(lock_key, 1, timeout=cls.REFRESH_LOCK_SECONDS):
+			return False
+
+		def refresh():
+			try:
+				cls.compute(days)
+			except Exception as e:
+				logger.warning(f"Analytics refresh for {days} days failed: {e}")
+			finally:
+				cache.delete(lock_key)
+				connection.close()
+
+		threading.Thread(target=refresh, name=f'analytics-refresh-{days}', daemon=True).start()
+		return True
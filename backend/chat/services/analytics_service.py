@@ -1,44 +1,68 @@
-from django.db.models import Count, Avg, Q, F
+from django.db.models import Count, Avg, Q, F, Sum
+from django.db.models.functions import Coalesce, TruncDate, TruncHour, TruncWeek
 from django.utils import timezone
-from datetime import timedelta
+from datetime import datetime, time, timedelta
 from django.conf import settings
 from chat.models import ChatSession, ChatMessage, KnowledgeBaseDocument
 from django.contrib.auth import get_user_model
 import os
-import glob
 from chat.serializers import KnowledgeBaseDocumentSerializer
+from chat.services.degradation import degradation
+from chat.services.feedback_export import IncrementalFeedbackExport
+from chat.services.quantiles import TimingSketches
+from chat.services.usage_rollups import UsageRollupService
 
 User = get_user_model()
 
 class AnalyticsService:
     """
     Service for computing chatbot usage and performance metrics.
+
+    Usage counts come from DailyUsageRollup plus a live delta for the days
+    not rolled up yet (see UsageRollupService); windows are calendar days
+    including today.
     """
 
+    # Metrics available as time series: (table, aggregate)
+    SERIES_METRICS = {
+        'sessions': ('sessions', Count('id')),
+        'messages': ('messages', Count('id')),
+        'tokens': ('messages', Coalesce(Sum('tokens_used'), 0)),
+        'fallbacks': ('messages', Count('id', filter=Q(role='assistant', fallback=True))),
+    }
+    SERIES_INTERVALS = {'hour': TruncHour, 'day': TruncDate, 'week': TruncWeek}
+    SERIES_MAX_BUCKETS = 1000
+
+    def __init__(self):
+        self._usage_windows = {}
+
+    def _usage(self, days):
+        """Rolled-up usage for the window, computed once per service instance"""
+        if days not in self._usage_windows:
+            self._usage_windows[days] = UsageRollupService.window(days)
+        return self._usage_windows[days]
+
     def get_summary_stats(self, days=30):
         """
         Get high-level engagement metrics.
         """
         period = timezone.now() - timedelta(days=days)
+        usage = self._usage(days)
         
-        total_conversations = ChatSession.objects.filter(created_at__gte=period).count()
-        active_users = User.objects.filter(chat_sessions__created_at__gte=period).distinct().count()
+        total_conversations = usage['sessions']
+        # Distinct users who sent a message, and those who sent more than one
+        # on some day: HyperLogLog estimates merged from the daily sketches
+        active_users = usage['active_users_hll'].count()
+        engaged_users = min(usage['engaged_users_hll'].count(), active_users)
         
-        # Engagement Rate: users with >1 message / total active users
-        total_users_with_messages = ChatMessage.objects.filter(
-            created_at__gte=period, role='user'
-        ).values('session__user').distinct().count()
+        # Engagement Rate: engaged users / total active users
+        engagement_rate = (engaged_users / active_users * 100) if active_users > 0 else 0
         
-        users_with_multi_messages = ChatMessage.objects.filter(
-            created_at__gte=period, role='user'
-        ).values('session__user').annotate(msg_count=Count('id')).filter(msg_count__gt=1).count()
-        
-        engagement_rate = (users_with_multi_messages / total_users_with_messages * 100) if total_users_with_messages > 0 else 0
-        
-        # Average Turn Count
-        avg_turns = ChatMessage.objects.filter(created_at__gte=period).values('session').annotate(
-            turns=Count('id')
-        ).aggregate(avg_turns=Avg('turns'))['avg_turns'] or 0
+        # Average Turn Count (messages per session active in the period,
+        # from the denormalized counter rather than grouping messages)
+        avg_turns = ChatSession.objects.filter(
+            last_message_at__gte=period
+        ).aggregate(avg_turns=Avg('message_count'))['avg_turns'] or 0
 
         return {
             'total_conversations': total_conversations,
@@ -51,55 +75,102 @@ class AnalyticsService:
         """
         Get NLP and model performance metrics.
         """
-        period = timezone.now() - timedelta(days=days)
-        assistant_messages = ChatMessage.objects.filter(created_at__gte=period, role='assistant')
-        
-        # Latency (Sliding Window of last 50 messages for responsive "DSA" metrics)
-        # optimization: O(1) latency calculation relative to total history size
-        recent_messages = assistant_messages.order_by('-created_at')[:10]
-        latencies = [msg.metadata.get('latency', 0) for msg in recent_messages if msg.metadata and 'latency' in msg.metadata]
-        avg_latency = sum(latencies) / len(latencies) if latencies else 0
+        usage = self._usage(days)
         
         # Fallback Rate
-        total_responses = assistant_messages.count()
-        fallbacks = assistant_messages.filter(metadata__fallback=True).count()
-        fallback_rate = (fallbacks / total_responses * 100) if total_responses > 0 else 0
-        
-        # Sentiment Breakdown
-        sentiments = assistant_messages.values('metadata__sentiment').annotate(count=Count('id'))
-        sentiment_map = {s['metadata__sentiment'] or 'neutral': s['count'] for s in sentiments}
+        total_responses = usage['assistant_messages']
+        fallback_rate = (usage['fallbacks'] / total_responses * 100) if total_responses > 0 else 0
         
         return {
-            'avg_latency': round(avg_latency, 3),
+            # p50/p90/p99 (seconds) of ttft, latency, embedding and retrieval,
+            # merged from the daily DDSketches
+            'latency': TimingSketches.summaries(usage['latency_sketches']),
             'fallback_rate': round(fallback_rate, 1),
-            'sentiment_breakdown': sentiment_map,
-            'total_responses': total_responses
+            'sentiment_breakdown': usage['sentiments'],
+            'total_responses': total_responses,
+            # Streams stopped early because the client disconnected
+            'cancelled_streams': usage['cancelled_streams'],
+            'tokens_saved': usage['tokens_saved'],
+            'worker_seconds_saved': round(usage['seconds_saved'], 1)
         }
 
     def get_intent_distribution(self, days=30):
         """
         Get distribution of detected intents.
         """
-        period = timezone.now() - timedelta(days=days)
-        intents = ChatMessage.objects.filter(
-            created_at__gte=period, role='assistant'
-        ).values('metadata__intent').annotate(count=Count('id')).order_by('-count')
-        
-        return {item['metadata__intent'] or 'unknown': item['count'] for item in intents}
+        intents = self._usage(days)['intents']
+        return dict(sorted(intents.items(), key=lambda item: item[1], reverse=True))
 
     def get_engagement_trends(self, days=7):
         """
         Get daily conversation count for trending.
         """
-        trends = []
-        for i in range(days):
-            date = timezone.now().date() - timedelta(days=i)
-            count = ChatSession.objects.filter(created_at__date=date).count()
-            trends.append({
-                'date': date.strftime('%Y-%m-%d'),
-                'count': count
-            })
-        return trends[::-1]
+        series = self.get_series(['sessions'], days)
+        return [
+            {'date': bucket, 'count': count}
+            for bucket, count in zip(series['buckets'], series['series']['sessions'])
+        ]
+
+    def _series_buckets(self, interval, days):
+        """Bucket starts covering the last `days` days up to now, oldest first"""
+        now = timezone.localtime()
+        if interval == 'hour':
+            last = now.replace(minute=0, second=0, microsecond=0)
+            return [last - timedelta(hours=i) for i in range(days * 24 - 1, -1, -1)]
+
+        first = now.date() - timedelta(days=days - 1)
+        if interval == 'day':
+            return [first + timedelta(days=i) for i in range(days)]
+
+        first -= timedelta(days=first.weekday())  # weeks start on Monday
+        return [first + timedelta(weeks=i) for i in range((now.date() - first).days // 7 + 1)]
+
+    def get_series(self, metrics, days=30, interval='day'):
+        """
+        Zero-filled time series for several metrics in one call.
+
+        One GROUP BY per table (sessions, messages) on Trunc{Hour,Date,Week}
+        of created_at, over an indexable created_at range instead of a
+        per-bucket __date lookup.
+
+        Raises ValueError for an unknown metric or interval, or too many buckets.
+        """
+        unknown = [m for m in metrics if m not in self.SERIES_METRICS]
+        if unknown or not metrics:
+            raise ValueError(f"Unknown metrics {unknown}; choose from {sorted(self.SERIES_METRICS)}")
+        if interval not in self.SERIES_INTERVALS:
+            raise ValueError(f"Unknown interval '{interval}'; choose from {sorted(self.SERIES_INTERVALS)}")
+
+        buckets = self._series_buckets(interval, days)
+        if len(buckets) > self.SERIES_MAX_BUCKETS:
+            raise ValueError(f"Too many buckets ({len(buckets)}); shorten the range or widen the interval")
+
+        start = buckets[0] if interval == 'hour' else timezone.make_aware(datetime.combine(buckets[0], time.min))
+        tables = {
+            'sessions': ChatSession.objects.filter(created_at__gte=start),
+            'messages': ChatMessage.objects.filter(created_at__gte=start),
+        }
+
+        values = {metric: {} for metric in metrics}
+        for table, queryset in tables.items():
+            wanted = {m: self.SERIES_METRICS[m][1] for m in metrics if self.SERIES_METRICS[m][0] == table}
+            if not wanted:
+                continue
+            rows = queryset.annotate(
+                bucket=self.SERIES_INTERVALS[interval]('created_at')
+            ).values('bucket').annotate(**wanted).order_by()
+            for row in rows:
+                bucket = row['bucket']
+                if interval == 'week':
+                    bucket = timezone.localtime(bucket).date() if isinstance(bucket, datetime) else bucket
+                for metric in wanted:
+                    values[metric][bucket] = row[metric]
+
+        return {
+            'interval': interval,
+            'buckets': [b.isoformat() for b in buckets],
+            'series': {metric: [values[metric].get(b, 0) for b in buckets] for metric in metrics},
+        }
 
     def get_learning_pipeline_stats(self):
         """
@@ -107,21 +178,27 @@ class AnalyticsService:
         """
         high_quality_count = ChatMessage.objects.filter(rating__gte=4, role='assistant').count()
         
-        # Check exported datasets in media/datasets
-        dataset_dir = os.path.join(settings.BASE_DIR, 'media', 'datasets')
+        # Dataset files of the incremental export (snapshot, then delta
+        # shards), newest first, read from its manifest
+        export = IncrementalFeedbackExport()
+        manifest = export.load_manifest()
+        records = ([manifest['snapshot']] if manifest['snapshot'] else []) + manifest['shards']
         datasets = []
-        if os.path.exists(dataset_dir):
-            files = glob.glob(os.path.join(dataset_dir, 'feedback_tuning_*.jsonl'))
-            for f in sorted(files, reverse=True):
-                datasets.append({
-                    'name': os.path.basename(f),
-                    'size': os.path.getsize(f),
-                    'created_at': os.path.getmtime(f)
-                })
+        for record in reversed(records[-10:]):
+            try:
+                size = os.path.getsize(os.path.join(export.directory, record['file']))
+            except FileNotFoundError:
+                continue  # compacted away since the manifest was read
+            datasets.append({
+                'name': record['file'],
+                'entries': record['entries'],
+                'size': size,
+                'created_at': datetime.fromisoformat(record['created_at']).timestamp()
+            })
         
         return {
             'high_quality_feedback_count': high_quality_count,
-            'exported_datasets': datasets[:10], # Last 10
+            'exported_datasets': datasets, # Last 10
             'last_export_status': 'Success' if datasets else 'No exports yet'
         }
 
@@ -135,10 +212,15 @@ class AnalyticsService:
         
         # KB Status
         kb_docs = KnowledgeBaseDocument.objects.all()
+        kb_totals = kb_docs.aggregate(
+            total=Count('id'),
+            active=Count('id', filter=Q(is_active=True)),
+            size=Coalesce(Sum('size'), 0),
+        )
         kb_stats = {
-            'total_documents': kb_docs.count(),
-            'active_documents': kb_docs.filter(is_active=True).count(),
-            'total_size_bytes': sum(doc.size for doc in kb_docs),
+            'total_documents': kb_totals['total'],
+            'active_documents': kb_totals['active'],
+            'total_size_bytes': kb_totals['size'],
             'documents': KnowledgeBaseDocumentSerializer(kb_docs[:20], many=True).data
         }
         
@@ -149,9 +231,14 @@ class AnalyticsService:
             'max_tasks_per_child': getattr(settings, 'CELERY_WORKER_MAX_TASKS_PER_CHILD', 1000),
         }
         
+        # Load shedding: current level of the RAG pipeline and its signals
+        degradation_stats = degradation.status()
+        
         return {
             'throttle_rates': throttle_rates,
             'knowledge_base': kb_stats,
             'celery': celery_stats,
-            'uptime_status': 'Healthy' # Placeholder
+            'degradation': degradation_stats,
+            'latency_last_hour': TimingSketches.summaries(TimingSketches.recent(hours=1)),
+            'uptime_status': 'Healthy' if degradation_stats['level'] == 0 else 'Degraded'
         }
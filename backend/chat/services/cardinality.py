@@ -0,0 +1,66 @@
+"""
+Distinct Counts
+HyperLogLog sketches for distinct users over arbitrary windows
+"""
+
+import hashlib
+import math
+import zlib
+from typing import Iterable, Optional
+
+
+class HyperLogLog:
+	"""
+	Cardinality sketch (HyperLogLog, 2^precision one-byte registers)
+
+	Each item hashes to a register and a rank (leading zeros + 1); a
+	register keeps the highest rank it has seen. The union of two sets is
+	the register-wise max, so per-day sketches merge into any window in
+	constant memory. Standard error is 1.04 / sqrt(2^precision): ~0.8% at
+	the default precision of 14 (16 KiB, stored zlib-compressed).
+	"""
+
+	def __init__(self, precision: int = 14):
+		self.precision = precision
+		self.m = 1 << precision
+		self.registers = bytearray(self.m)
+
+	def add(self, item):
+		h = int.from_bytes(hashlib.blake2b(str(item).encode('utf-8'), digest_size=8).digest(), 'big')
+		index = h >> (64 - self.precision)
+		rest = h & ((1 << (64 - self.precision)) - 1)
+		rank = (64 - self.precision) - rest.bit_length() + 1
+		if rank > self.registers[index]:
+			self.registers[index] = rank
+
+	def update(self, items: Iterable):
+		for item in items:
+			self.add(item)
+		return self
+
+	def merge(self, other: 'HyperLogLog') -> 'HyperLogLog':
+		if other.precision != self.precision:
+			raise ValueError("Cannot merge sketches with different precision")
+		self.registers = bytearray(map(max, self.registers, other.registers))
+		return self
+
+	def count(self) -> int:
+		alpha = 0.7213 / (1 + 1.079 / self.m)
+		estimate = alpha * self.m * self.m / sum(2.0 ** -r for r in self.registers)
+		zeros = self.registers.count(0)
+		if estimate <= 2.5 * self.m and zeros:
+			# Small cardinalities: linear counting over empty registers
+			estimate = self.m * math.log(self.m / zeros)
+		return int(round(estimate))
+
+	def to_bytes(self) -> bytes:
+		return bytes([self.precision]) + zlib.compress(bytes(self.registers))
+
+	@classmethod
+	def from_bytes(cls, data: Optional[bytes]) -> 'HyperLogLog':
+		if not data:
+			return cls()
+		data = bytes(data)
+		sketch = cls(precision=data[0])
+		sketch.registers = bytearray(zlib.decompress(data[1:]))
+		return sketch
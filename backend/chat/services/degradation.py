@@ -0,0 +1,210 @@
+"""
+Load Shedding
+Graded degradation of the RAG pipeline under pressure, driven by live
+signals shared through the cache
+"""
+
+import time
+from dataclasses import dataclass
+from typing import List, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .admission import admission
+
+
+class CircuitBreaker:
+	"""
+	Consecutive-failure breaker for an upstream dependency
+
+	- closed:    calls go through
+	- open:      failure_threshold failures in a row; calls are skipped for
+	             `cooldown` seconds
+	- half_open: cooldown passed; the next call is a probe, and a success
+	             closes the breaker again
+	"""
+
+	CLOSED = 'closed'
+	OPEN = 'open'
+	HALF_OPEN = 'half_open'
+
+	def __init__(self, name: str):
+		self.name = name
+
+	@property
+	def failure_threshold(self) -> int:
+		return getattr(settings, 'LLM_BREAKER_FAILURES', 5)
+
+	@property
+	def cooldown(self) -> int:
+		return getattr(settings, 'LLM_BREAKER_COOLDOWN_SECONDS', 30)
+
+	@property
+	def failures_key(self) -> str:
+		return f"breaker:{self.name}:failures"
+
+	@property
+	def opened_key(self) -> str:
+		return f"breaker:{self.name}:opened_at"
+
+	def state(self) -> str:
+		opened_at = cache.get(self.opened_key)
+		if opened_at is None:
+			return self.CLOSED
+		if time.time() - opened_at < self.cooldown:
+			return self.OPEN
+		return self.HALF_OPEN
+
+	def record_failure(self):
+		cache.add(self.failures_key, 0, timeout=self.cooldown * 10)
+		try:
+			failures = cache.incr(self.failures_key)
+		except ValueError:
+			failures = 1
+		if failures >= self.failure_threshold:
+			cache.set(self.opened_key, time.time(), timeout=self.cooldown * 10)
+
+	def record_success(self):
+		if cache.get_many([self.failures_key, self.opened_key]):
+			cache.delete_many([self.failures_key, self.opened_key])
+
+
+llm_breaker = CircuitBreaker('gemini')
+
+
+class LatencyWindow:
+	"""
+	Recent time-to-first-token samples (seconds) for percentile signals
+
+	A ring of SIZE slots in the shared cache: each sample takes the next
+	index from an atomic counter and writes only its own slot, so
+	concurrent turns never overwrite each other's samples (no shared list
+	to read-modify-write). Samples expire after
+	DEGRADATION_TTFT_WINDOW_SECONDS, so a slow spell stops counting once
+	it is that old even if little traffic has replaced it.
+	"""
+
+	SEQ_KEY = "llm:ttft:seq"
+	SIZE = 200
+
+	@property
+	def ttl(self) -> int:
+		return getattr(settings, 'DEGRADATION_TTFT_WINDOW_SECONDS', 300)
+
+	@staticmethod
+	def _slot(index: int) -> str:
+		return f"llm:ttft:{index}"
+
+	def record(self, seconds: float):
+		if not seconds:
+			return
+		cache.add(self.SEQ_KEY, 0, timeout=None)
+		try:
+			seq = cache.incr(self.SEQ_KEY)
+		except ValueError:
+			return  # counter evicted between add and incr; drop one sample
+		cache.set(self._slot(seq % self.SIZE), round(seconds, 3), timeout=self.ttl)
+
+	def samples(self) -> List[float]:
+		return list(cache.get_many([self._slot(i) for i in range(self.SIZE)]).values())
+
+	def percentile(self, pct: float) -> Optional[float]:
+		samples = sorted(self.samples())
+		if not samples:
+			return None
+		return samples[min(len(samples) - 1, int(round(pct / 100 * (len(samples) - 1))))]
+
+
+ttft_window = LatencyWindow()
+
+
+@dataclass(frozen=True)
+class DegradationPlan:
+	"""What the pipeline does at one degradation level"""
+	level: int
+	name: str
+	use_history: bool = True
+	top_k: Optional[int] = None       # cap on retrieved chunks
+	max_tokens: Optional[int] = None  # cap on Gemini output
+	use_llm: bool = True               # False → FAISS-only fallback answer
+
+	def retrieval_k(self, requested: int) -> int:
+		return min(requested, self.top_k) if self.top_k else requested
+
+
+class DegradationLadder:
+	"""
+	Picks the degradation level for new requests
+
+	Each signal maps to a level through its thresholds (one per level
+	1-4); the highest wins:
+	- in-flight generations / LLM_MAX_INFLIGHT_GLOBAL  (DEGRADATION_INFLIGHT_RATIOS)
+	- p95 time-to-first-token                          (DEGRADATION_TTFT_SECONDS)
+	- Gemini breaker: open → FAISS-only, half-open → capped output
+	DEGRADATION_FORCE_LEVEL pins the level (ops override).
+
+	TTFT never sheds past TTFT_MAX_LEVEL: FAISS-only answers make no Gemini
+	call, so no sample would ever show that Gemini recovered. Failures
+	reach FAISS-only through the breaker, whose half-open probe does.
+	"""
+
+	TTFT_MAX_LEVEL = 3
+
+	def __init__(self):
+		self.levels = (
+			DegradationPlan(0, 'normal'),
+			DegradationPlan(1, 'skip_history', use_history=False),
+			DegradationPlan(2, 'reduced_retrieval', use_history=False, top_k=1),
+			DegradationPlan(3, 'capped_output', use_history=False, top_k=1, max_tokens=self._max_tokens()),
+			DegradationPlan(4, 'faiss_only', use_history=False, use_llm=False),
+		)
+
+	@staticmethod
+	def _max_tokens() -> int:
+		return getattr(settings, 'DEGRADED_MAX_TOKENS', 512)
+
+	@staticmethod
+	def _level_for(value: Optional[float], thresholds: List[float]) -> int:
+		if value is None:
+			return 0
+		return sum(1 for t in thresholds if value >= t)
+
+	def signals(self) -> dict:
+		limit = getattr(settings, 'LLM_MAX_INFLIGHT_GLOBAL', 64)
+		inflight = admission.inflight()
+		return {
+			'inflight': inflight,
+			'inflight_limit': limit,
+			'inflight_ratio': round(inflight / limit, 3) if limit else 0,
+			'p95_ttft': ttft_window.percentile(95),
+			'breaker': llm_breaker.state(),
+		}
+
+	def level(self, signals: dict = None) -> int:
+		forced = getattr(settings, 'DEGRADATION_FORCE_LEVEL', None)
+		if forced is not None:
+			return max(0, min(int(forced), len(self.levels) - 1))
+
+		signals = signals or self.signals()
+		breaker_level = {
+			CircuitBreaker.OPEN: 4,
+			CircuitBreaker.HALF_OPEN: 3,
+		}.get(signals['breaker'], 0)
+		return max(
+			self._level_for(signals['inflight_ratio'], getattr(settings, 'DEGRADATION_INFLIGHT_RATIOS', [0.5, 0.7, 0.85, 0.95])),
+			min(self._level_for(signals['p95_ttft'], getattr(settings, 'DEGRADATION_TTFT_SECONDS', [2, 4, 6])), self.TTFT_MAX_LEVEL),
+			breaker_level,
+		)
+
+	def current_plan(self) -> DegradationPlan:
+		return self.levels[self.level()]
+
+	def status(self) -> dict:
+		"""Current level and the signals behind it (analytics health)"""
+		signals = self.signals()
+		plan = self.levels[self.level(signals)]
+		return {'level': plan.level, 'name': plan.name, 'signals': signals}
+
+
+degradation = DegradationLadder()
@@ -19,12 +19,18 @@ class EmbeddingService:
 	- Captures semantic similarity between different phrasings
 	- Enables meaning-based retrieval (not keyword-based)
 	"""
-	
+
+	# Loaded models are shared per process so that request-scoped services
+	# (search, RAG) don't reload weights from disk on every instantiation.
+	_models = {}
+
 	def __init__(self):
 		# Use a lightweight, efficient model
 		# all-MiniLM-L6-v2: Fast, 384 dimensions, great for semantic search
 		model_name = os.getenv('EMBEDDING_MODEL', 'all-MiniLM-L6-v2')
-		self.model = SentenceTransformer(model_name)
+		if model_name not in EmbeddingService._models:
+			EmbeddingService._models[model_name] = SentenceTransformer(model_name)
+		self.model = EmbeddingService._models[model_name]
 	
 	def get_embedding(self, text: str) -> List[float]:
 		"""
@@ -40,7 +46,7 @@ class EmbeddingService:
 			raise ValueError("Text must be a non-empty string")
 		
 		# Check cache first (24h TTL for performance)
-		cache_key = f"emb:{hashlib.md5(text.encode()).hexdigest()}"
+		cache_key = self._cache_key(text)
 		cached = cache.get(cache_key)
 		if cached is not None:
 			return cached
@@ -65,9 +71,23 @@ class EmbeddingService:
 		if not texts:
 			return []
 		
-		# Batch encoding is faster and uses GPU if available
-		embeddings = self.model.encode(texts, convert_to_tensor=False, batch_size=32)
-		return [emb.tolist() for emb in embeddings]
+		# Reuse vectors already computed for single-text lookups (e.g. queries)
+		keys = [self._cache_key(text) for text in texts]
+		cached = cache.get_many(keys)
+		missing = [i for i, key in enumerate(keys) if key not in cached]
+		
+		if missing:
+			# Batch encoding is faster and uses GPU if available
+			embeddings = self.model.encode([texts[i] for i in missing], convert_to_tensor=False, batch_size=32)
+			fresh = {keys[i]: emb.tolist() for i, emb in zip(missing, embeddings)}
+			cache.set_many(fresh, timeout=86400)
+			cached.update(fresh)
+		
+		return [cached[key] for key in keys]
+	
+	@staticmethod
+	def _cache_key(text: str) -> str:
+		return f"emb:{hashlib.md5(text.encode()).hexdigest()}"
 	
 	def cosine_similarity(self, vec1: List[float], vec2: List[float]) -> float:
 		"""
@@ -0,0 +1,195 @@
+"""
+Incremental Feedback Export
+Replies rated since the last run, exported as delta shards past a persisted
+watermark and periodically compacted into one snapshot
+"""
+
+import json
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Q
+from django.utils import timezone
+
+from .feedback_pipeline import FeedbackPipeline
+
+logger = logging.getLogger(__name__)
+
+
+class IncrementalFeedbackExport:
+	"""
+	Fine-tuning dataset kept current in FEEDBACK_EXPORT_DIR
+
+	manifest.json:
+	- watermark: (rated_at, id) of the last exported reply
+	- snapshot:  one file covering everything up to its watermark
+	- shards:    delta files written since, oldest first
+	The dataset is the snapshot followed by the shards (`files`).
+
+	Each run exports the replies rated past the watermark into a new shard,
+	so its cost follows the new feedback, not the whole history. The
+	watermark is on rated_at rather than created_at: ratings arrive after
+	the reply is written, and a created_at watermark would skip any older
+	reply rated later. Replies rated in the last
+	FEEDBACK_EXPORT_SETTLE_SECONDS wait for the next run, so a rating still
+	being committed can't end up behind the watermark.
+
+	Once FEEDBACK_EXPORT_COMPACT_SHARDS shards pile up, the snapshot is
+	rebuilt from the database up to the watermark and the shards dropped.
+	This also settles re-rated replies, which until then a later shard may
+	repeat (or an earlier one still hold after a downgrade).
+	"""
+
+	MANIFEST = 'manifest.json'
+	LOCK_KEY = 'feedback_export:running'
+	LOCK_SECONDS = 3600  # a crashed run frees the lock after this
+
+	def __init__(self, directory: Optional[str] = None, min_rating: int = 4):
+		self.directory = directory or getattr(
+			settings, 'FEEDBACK_EXPORT_DIR', os.path.join(settings.BASE_DIR, 'media', 'datasets', 'feedback')
+		)
+		self.min_rating = min_rating
+
+	@staticmethod
+	def _setting(name: str, default):
+		return getattr(settings, name, default)
+
+	# Manifest
+
+	@property
+	def manifest_path(self) -> str:
+		return os.path.join(self.directory, self.MANIFEST)
+
+	def _empty_manifest(self) -> dict:
+		return {'min_rating': self.min_rating, 'sequence': 0, 'watermark': None, 'snapshot': None, 'shards': []}
+
+	def load_manifest(self) -> dict:
+		try:
+			with open(self.manifest_path, encoding='utf-8') as f:
+				return json.load(f)
+		except FileNotFoundError:
+			return self._empty_manifest()
+
+	def _save_manifest(self, manifest: dict):
+		tmp_path = f"{self.manifest_path}.tmp"
+		with open(tmp_path, 'w', encoding='utf-8') as f:
+			json.dump(manifest, f, indent=2)
+		os.replace(tmp_path, self.manifest_path)
+
+	@staticmethod
+	def files(manifest: dict) -> List[str]:
+		"""Dataset files in read order"""
+		snapshot = [manifest['snapshot']['file']] if manifest['snapshot'] else []
+		return snapshot + [shard['file'] for shard in manifest['shards']]
+
+	# Queries
+
+	def _replies(self):
+		return FeedbackPipeline.get_high_quality_feedback(self.min_rating).filter(rated_at__isnull=False)
+
+	@staticmethod
+	def _after(watermark: dict) -> Q:
+		rated_at = datetime.fromisoformat(watermark['rated_at'])
+		return Q(rated_at__gt=rated_at) | Q(rated_at=rated_at, id__gt=watermark['id'])
+
+	def _write(self, name: str, replies) -> Tuple[int, Optional[dict]]:
+		"""Stream `replies` to a file; (entries written, watermark of the last one)"""
+		chunk_size = self._setting('FEEDBACK_EXPORT_CHUNK_SIZE', 2000)
+		last = {}
+
+		def entries():
+			pairs = FeedbackPipeline.training_pairs(replies.order_by('rated_at', 'id'), fields=('rated_at', 'id'))
+			for rated_at, reply_id, prompt, response in pairs.iterator(chunk_size=chunk_size):
+				last['watermark'] = {'rated_at': rated_at.isoformat(), 'id': str(reply_id)}
+				yield FeedbackPipeline.fine_tuning_entry(prompt, response)
+
+		count = FeedbackPipeline.write_jsonl(os.path.join(self.directory, name), entries())
+		return count, last.get('watermark')
+
+	@staticmethod
+	def _next_name(manifest: dict, kind: str) -> str:
+		manifest['sequence'] += 1
+		return f"{kind}-{manifest['sequence']:06d}.jsonl.gz"
+
+	# Export
+
+	def export_delta(self, manifest: dict) -> Optional[dict]:
+		"""Write replies rated past the watermark as a new shard; None if there were none"""
+		cutoff = timezone.now() - timedelta(seconds=self._setting('FEEDBACK_EXPORT_SETTLE_SECONDS', 60))
+		replies = self._replies().filter(rated_at__lt=cutoff)
+		if manifest['watermark']:
+			replies = replies.filter(self._after(manifest['watermark']))
+
+		name = self._next_name(manifest, 'delta')
+		count, watermark = self._write(name, replies)
+		if not count:
+			os.remove(os.path.join(self.directory, name))
+			return None
+
+		shard = {'file': name, 'entries': count, 'watermark': watermark, 'created_at': timezone.now().isoformat()}
+		manifest['shards'].append(shard)
+		manifest['watermark'] = watermark
+		self._save_manifest(manifest)
+		return shard
+
+	def compact(self, manifest: dict) -> Optional[dict]:
+		"""Replace the snapshot and shards with one snapshot up to the watermark"""
+		if not manifest['watermark']:
+			return None
+		stale = self.files(manifest)
+
+		name = self._next_name(manifest, 'snapshot')
+		count, _ = self._write(name, self._replies().exclude(self._after(manifest['watermark'])))
+		manifest['snapshot'] = {
+			'file': name, 'entries': count, 'watermark': manifest['watermark'],
+			'created_at': timezone.now().isoformat(),
+		}
+		manifest['shards'] = []
+		self._save_manifest(manifest)
+		self._remove(stale)
+		return manifest['snapshot']
+
+	def _remove(self, names: List[str]):
+		for name in names:
+			try:
+				os.remove(os.path.join(self.directory, name))
+			except FileNotFoundError:
+				pass
+
+	def run(self) -> dict:
+		"""
+		One scheduled run: export the delta, then compact if due.
+
+		Runs are serialized by a lock in the shared cache; a run that finds
+		it taken returns {'status': 'busy'}.
+		"""
+		if not cache.add(self.LOCK_KEY, 1, timeout=self.LOCK_SECONDS):
+			return {'status': 'busy'}
+		try:
+			os.makedirs(self.directory, exist_ok=True)
+			manifest = self.load_manifest()
+			stale = []
+			if manifest['min_rating'] != self.min_rating:
+				# Files written with another threshold; start the dataset over
+				stale = self.files(manifest)
+				manifest = dict(self._empty_manifest(), sequence=manifest['sequence'])
+
+			shard = self.export_delta(manifest)
+			snapshot = None
+			if len(manifest['shards']) >= self._setting('FEEDBACK_EXPORT_COMPACT_SHARDS', 7):
+				snapshot = self.compact(manifest)
+			if stale:
+				self._save_manifest(manifest)
+				self._remove(stale)
+
+			logger.info(
+				f"Feedback export: {shard['entries'] if shard else 0} new entries"
+				f"{', compacted' if snapshot else ''} in {self.directory}"
+			)
+			return {'status': 'ok', 'shard': shard, 'snapshot': snapshot, 'files': self.files(manifest)}
+		finally:
+			cache.delete(self.LOCK_KEY)
@@ -1,6 +1,9 @@
+import gzip
 import json
 import logging
-from django.db.models import Q
+import os
+from django.conf import settings
+from django.db.models import OuterRef, Subquery
 from chat.models import ChatMessage
 
 logger = logging.getLogger(__name__)
@@ -21,44 +24,88 @@ class FeedbackPipeline:
         ).select_related('session')
 
     @staticmethod
-    def format_for_fine_tuning(messages):
+    def training_pairs(messages, fields=()):
+        """
+        (*fields, user content, assistant content) for each assistant message, in one query.
+
+        The user message immediately preceding each response comes from a
+        correlated subquery (served by the (session, created_at, id) index),
+        so there is no per-message lookup; responses without one are dropped.
+        """
+        preceding_user = ChatMessage.objects.filter(
+            session=OuterRef('session'),
+            created_at__lt=OuterRef('created_at'),
+            role='user'
+        ).order_by('-created_at').values('content')[:1]
+
+        return messages.annotate(
+            prompt=Subquery(preceding_user)
+        ).filter(prompt__isnull=False).values_list(*fields, 'prompt', 'content')
+
+    @staticmethod
+    def fine_tuning_entry(prompt, response):
+        return {
+            "messages": [
+                {"role": "user", "content": prompt},
+                {"role": "assistant", "content": response}
+            ]
+        }
+
+    @staticmethod
+    def write_jsonl(file_path, entries):
+        """
+        Streams entries to a JSONL file and returns how many were written.
+
+        Paths ending in .gz are gzip-compressed. The file is written under a
+        temporary name and moved into place, so a failure never leaves a
+        truncated file behind.
+        """
+        opener = gzip.open if file_path.endswith('.gz') else open
+        tmp_path = f"{file_path}.tmp"
+        count = 0
+        try:
+            with opener(tmp_path, 'wt', encoding='utf-8') as f:
+                for entry in entries:
+                    f.write(json.dumps(entry) + '\n')
+                    count += 1
+            os.replace(tmp_path, file_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return count
+
+    @classmethod
+    def iter_fine_tuning_entries(cls, messages, chunk_size=None):
+        """
+        Yields fine-tuning entries, reading the pairs from a server-side cursor.
+        """
+        chunk_size = chunk_size or getattr(settings, 'FEEDBACK_EXPORT_CHUNK_SIZE', 2000)
+        pairs = cls.training_pairs(messages.order_by('created_at', 'id'))
+        for prompt, response in pairs.iterator(chunk_size=chunk_size):
+            yield cls.fine_tuning_entry(prompt, response)
+
+    @classmethod
+    def format_for_fine_tuning(cls, messages):
         """
         Formats assistant messages and their preceding user messages into a 
         fine-tuning JSONL format (chat-based).
         """
-        dataset = []
-        for msg in messages:
-            # Find the user message immediately preceding this assistant response
-            user_msg = ChatMessage.objects.filter(
-                session=msg.session,
-                created_at__lt=msg.created_at,
-                role='user'
-            ).order_by('-created_at').first()
-
-            if user_msg:
-                dataset.append({
-                    "messages": [
-                        {"role": "user", "content": user_msg.content},
-                        {"role": "assistant", "content": msg.content}
-                    ]
-                })
-        
-        return dataset
+        return list(cls.iter_fine_tuning_entries(messages))
 
     @classmethod
     def export_feedback_dataset(cls, file_path, min_rating=4):
         """
         Exports high-quality feedback to a JSONL file for training.
+
+        Entries are streamed to disk as they are read, so memory stays flat
+        whatever the dataset size (see write_jsonl).
         """
         feedback = cls.get_high_quality_feedback(min_rating)
-        dataset = cls.format_for_fine_tuning(feedback)
-        
         try:
-            with open(file_path, 'w', encoding='utf-8') as f:
-                for entry in dataset:
-                    f.write(json.dumps(entry) + '\n')
-            logger.info(f"Successfully exported {len(dataset)} entries to {file_path}")
-            return len(dataset)
+            count = cls.write_jsonl(file_path, cls.iter_fine_tuning_entries(feedback))
+            logger.info(f"Successfully exported {count} entries to {file_path}")
+            return count
         except Exception as e:
             logger.error(f"Failed to export feedback dataset: {str(e)}")
             return 0
@@ -0,0 +1,301 @@
+"""
+Per-user Chat History Index
+Semantic Recall: Search a user's own past messages by meaning
+"""
+
+import threading
+from collections import OrderedDict
+from datetime import timedelta
+from typing import Dict, Iterable, List, Optional
+
+import faiss
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+
+from chat.models import ChatSession, ChatMessage, MessageEmbedding
+
+
+def _version_key(user_id) -> str:
+	return f"history_index:v:{user_id}"
+
+
+def _epoch_key(user_id) -> str:
+	return f"history_index:epoch:{user_id}"
+
+
+def bump_version(user_id) -> int:
+	"""Advance the shared per-user index version (signals other processes to catch up)"""
+	return _bump(_version_key(user_id))
+
+
+def bump_epoch(user_id) -> int:
+	"""Advance the shared per-user deletion epoch (signals other processes to rebuild)"""
+	return _bump(_epoch_key(user_id))
+
+
+def _bump(key) -> int:
+	cache.add(key, 0, timeout=None)
+	try:
+		return cache.incr(key)
+	except ValueError:
+		# Key evicted between add() and incr()
+		cache.set(key, 1, timeout=None)
+		return 1
+
+
+class UserHistoryIndex:
+	"""
+	In-memory FAISS index over one user's message embeddings
+
+	This index:
+	- Is built once from packed MessageEmbedding rows, then grown incrementally
+	- Uses inner product over L2-normalised vectors (cosine similarity)
+	- Keeps a high-water mark so catching up only reads new rows
+	- Drops deleted messages' vectors (IndexIDMap.remove_ids), so they
+	  don't take top-k slots from live messages; other processes see the
+	  deletion epoch move and rebuild
+	"""
+
+	# Concurrent transactions can commit embedding rows out of created_at
+	# order, so catch-up re-reads a small trailing window and skips known ids.
+	CATCHUP_MARGIN = timedelta(minutes=5)
+
+	def __init__(self, user_id, dimension: int = 384):
+		self.user_id = user_id
+		self.dimension = dimension
+		self.lock = threading.Lock()
+		self._reset()
+
+	def _reset(self):
+		self.index = faiss.IndexIDMap(faiss.IndexFlatIP(self.dimension))
+		self.entries: Dict[int, tuple] = {}  # FAISS id -> (message_id, session_id)
+		self.labels: Dict = {}               # message_id -> FAISS id
+		self.next_label = 0
+		self.high_water = None
+		self.version = None
+		self.epoch = None
+
+	def add(self, message_id, session_id, embedding, created_at=None):
+		"""Append a single message vector to the index"""
+		with self.lock:
+			self._add_rows([(message_id, session_id, created_at, embedding)])
+
+	def _add_rows(self, rows):
+		rows = [r for r in rows if r[0] not in self.labels and r[3] is not None and len(r[3])]
+		if not rows:
+			return
+
+		vectors = np.vstack([np.asarray(r[3], dtype=np.float32) for r in rows])
+		faiss.normalize_L2(vectors)
+		labels = np.arange(self.next_label, self.next_label + len(rows), dtype=np.int64)
+		self.index.add_with_ids(vectors, labels)
+		self.next_label += len(rows)
+
+		for label, (message_id, session_id, created_at, _) in zip(labels.tolist(), rows):
+			self.entries[label] = (message_id, session_id)
+			self.labels[message_id] = label
+			if created_at and (self.high_water is None or created_at > self.high_water):
+				self.high_water = created_at
+
+	def remove(self, message_ids: Iterable):
+		"""Drop deleted messages from the index"""
+		with self.lock:
+			labels = [self.labels.pop(m) for m in message_ids if m in self.labels]
+			if not labels:
+				return
+			self.index.remove_ids(np.array(labels, dtype=np.int64))
+			for label in labels:
+				del self.entries[label]
+
+	def sync(self):
+		"""Load any messages persisted since the last sync (full build on first call or after deletions elsewhere)"""
+		with self.lock:
+			shared = cache.get_many([_version_key(self.user_id), _epoch_key(self.user_id)])
+			version = shared.get(_version_key(self.user_id), 0)
+			epoch = shared.get(_epoch_key(self.user_id), 0)
+			if self.epoch is not None and epoch != self.epoch:
+				self._reset()
+			if self.version is not None and version == self.version:
+				return
+
+			embeddings = MessageEmbedding.objects.filter(message__session__user_id=self.user_id)
+			if self.high_water is not None:
+				embeddings = embeddings.filter(created_at__gte=self.high_water - self.CATCHUP_MARGIN)
+
+			rows = embeddings.order_by('created_at').values_list(
+				'message_id', 'message__session_id', 'created_at', 'dtype', 'vector'
+			)
+			self._add_rows([
+				(message_id, session_id, created_at, np.frombuffer(vector, dtype=dtype))
+				for message_id, session_id, created_at, dtype, vector in rows.iterator(chunk_size=2000)
+			])
+			self.version = version
+			self.epoch = epoch
+
+	def search(self, query_embedding: List[float], top_k: int = 50) -> List[Dict]:
+		"""
+		Find the user's messages closest in meaning to the query
+
+		Returns:
+			List of {"message_id", "session_id", "score"} sorted by score
+		"""
+		with self.lock:
+			if self.index.ntotal == 0:
+				return []
+
+			query = np.array([query_embedding], dtype=np.float32)
+			faiss.normalize_L2(query)
+			scores, indices = self.index.search(query, min(top_k, self.index.ntotal))
+
+			return [
+				{
+					'message_id': self.entries[label][0],
+					'session_id': self.entries[label][1],
+					'score': float(score),
+				}
+				for score, label in zip(scores[0], indices[0]) if label != -1
+			]
+
+
+class HistoryIndexRegistry:
+	"""Process-local LRU of per-user indexes"""
+
+	def __init__(self, max_users: int = 256):
+		self.max_users = max_users
+		self._indexes: "OrderedDict[object, UserHistoryIndex]" = OrderedDict()
+		self._lock = threading.Lock()
+
+	def get(self, user_id) -> UserHistoryIndex:
+		with self._lock:
+			index = self._indexes.get(user_id)
+			if index is None:
+				index = UserHistoryIndex(user_id)
+				self._indexes[user_id] = index
+				while len(self._indexes) > self.max_users:
+					self._indexes.popitem(last=False)
+			else:
+				self._indexes.move_to_end(user_id)
+			return index
+
+	def peek(self, user_id) -> Optional[UserHistoryIndex]:
+		with self._lock:
+			return self._indexes.get(user_id)
+
+	def record_message(self, user_id, message_id, session_id, embedding, created_at=None):
+		"""
+		Maintain the index on message creation.
+
+		The shared version is always bumped so other processes catch up on
+		their next search; the local index is appended to directly when it
+		was already current.
+		"""
+		version = bump_version(user_id)
+		index = self.peek(user_id)
+		if index is None or embedding is None:
+			return
+		if index.version == version - 1:
+			index.add(message_id, session_id, embedding, created_at)
+			index.version = version
+
+	def record_deletions(self, user_id, message_ids: Iterable):
+		"""
+		Maintain the index on message deletion.
+
+		The shared epoch is bumped so other processes rebuild on their next
+		search; the local index drops the vectors directly when it was
+		already current.
+		"""
+		epoch = bump_epoch(user_id)
+		index = self.peek(user_id)
+		if index is None:
+			return
+		if index.epoch == epoch - 1:
+			index.remove(message_ids)
+			index.epoch = epoch
+
+	def clear(self):
+		with self._lock:
+			self._indexes.clear()
+
+
+history_indexes = HistoryIndexRegistry(
+	max_users=getattr(settings, 'HISTORY_INDEX_MAX_USERS', 256)
+)
+
+
+class HistorySearchService:
+	"""
+	Semantic search over a user's own chat sessions
+
+	Flow:
+	1. Embed the query once
+	2. Search the user's in-memory history index
+	3. Group matching messages by session and rank sessions by best match
+	"""
+
+	def __init__(self, embedding_service=None):
+		if embedding_service is None:
+			from .embedding_service import EmbeddingService
+			embedding_service = EmbeddingService()
+		self.embedding_service = embedding_service
+
+	def search(self, user, query: str, limit: int = 10, snippets_per_session: int = 3) -> List[Dict]:
+		query_embedding = self.embedding_service.get_embedding(query)
+		return self.search_by_vector(user, query_embedding, limit, snippets_per_session)
+
+	def search_by_vector(self, user, query_embedding, limit: int = 10, snippets_per_session: int = 3) -> List[Dict]:
+		index = history_indexes.get(user.id)
+		index.sync()
+
+		hits = index.search(query_embedding, top_k=max(limit * 10, 50))
+		if not hits:
+			return []
+
+		# Group hits by session, keeping first-seen (best) order
+		grouped: "OrderedDict[object, List[Dict]]" = OrderedDict()
+		for hit in hits:
+			grouped.setdefault(hit['session_id'], []).append(hit)
+		session_ids = list(grouped.keys())[:limit]
+
+		sessions = ChatSession.objects.filter(user=user, id__in=session_ids).only(
+			'id', 'title', 'updated_at', 'is_archived', 'is_pinned'
+		).in_bulk()
+
+		message_ids = [h['message_id'] for sid in session_ids for h in grouped[sid][:snippets_per_session]]
+		messages = ChatMessage.objects.filter(id__in=message_ids).only(
+			'id', 'role', 'content', 'created_at'
+		).in_bulk()
+
+		results = []
+		for session_id in session_ids:
+			session = sessions.get(session_id)
+			if session is None:
+				# Deleted since it was indexed
+				continue
+
+			matches = []
+			for hit in grouped[session_id][:snippets_per_session]:
+				msg = messages.get(hit['message_id'])
+				if msg is None:
+					continue
+				snippet = msg.content[:160]
+				matches.append({
+					'message_id': msg.id,
+					'role': msg.role,
+					'snippet': snippet + "..." if len(msg.content) > 160 else snippet,
+					'created_at': msg.created_at,
+					'score': round(hit['score'], 4),
+				})
+
+			results.append({
+				'id': session.id,
+				'title': session.title,
+				'updated_at': session.updated_at,
+				'is_archived': session.is_archived,
+				'is_pinned': session.is_pinned,
+				'score': round(grouped[session_id][0]['score'], 4),
+				'matches': matches,
+			})
+
+		return results
@@ -0,0 +1,130 @@
+"""
+Idempotent Message Submission
+Maps a client's Idempotency-Key to the chat turn it produced, so retries
+return (or attach to) the original turn instead of re-running the pipeline
+"""
+
+import hashlib
+import json
+from datetime import timedelta
+from typing import Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+from chat.models import ChatMessage, IdempotencyKey
+
+
+class IdempotencyKeyReused(Exception):
+	"""The key was already used for a request with a different payload"""
+
+	def __init__(self, message="Idempotency-Key was already used for a different request"):
+		super().__init__(message)
+
+
+class IdempotencyService:
+	"""
+	Key → turn mapping for POST /messages/ and /messages/stream/
+
+	The database row (unique per user and key) is the source of truth and
+	makes the first claim atomic across processes; the shared cache keeps
+	repeated lookups off the database. The claimed turn id is used as the
+	persisted messages' turn_id and as the stream's replay buffer id, which
+	is how a retry finds the original result.
+	"""
+
+	HEADER = 'Idempotency-Key'
+	MAX_KEY_LENGTH = 255
+
+	@classmethod
+	def key_from(cls, request) -> Optional[str]:
+		"""The request's Idempotency-Key (None if absent); raises ValueError if malformed"""
+		key = (request.headers.get(cls.HEADER) or '').strip()
+		if not key:
+			return None
+		if len(key) > cls.MAX_KEY_LENGTH:
+			raise ValueError(f"{cls.HEADER} must be at most {cls.MAX_KEY_LENGTH} characters")
+		return key
+
+	@staticmethod
+	def fingerprint(session_id, content: str, use_rag: bool, temperature: float) -> str:
+		payload = json.dumps([str(session_id), content, use_rag, temperature])
+		return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+	@staticmethod
+	def _ttl() -> timedelta:
+		return timedelta(hours=getattr(settings, 'IDEMPOTENCY_KEY_TTL_HOURS', 24))
+
+	@staticmethod
+	def _cache_key(user_id, key: str) -> str:
+		digest = hashlib.sha256(key.encode('utf-8')).hexdigest()
+		return f"idem:{user_id}:{digest}"
+
+	@classmethod
+	def claim(cls, user_id, session, key: str, fingerprint: str) -> Tuple[IdempotencyKey, bool]:
+		"""
+		Claim a key for a new turn.
+
+		Returns:
+			(record, created) - created is False when the key was already
+			used; compare record.fingerprint to detect a different payload
+		"""
+		cache_key = cls._cache_key(user_id, key)
+		record = cache.get(cache_key)
+		if record is not None:
+			return record, False
+
+		record, created = IdempotencyKey.objects.get_or_create(
+			user_id=user_id,
+			key=key,
+			defaults={'session': session, 'fingerprint': fingerprint}
+		)
+		if not created and record.created_at < timezone.now() - cls._ttl():
+			# Expired keys are free to reuse
+			record.delete()
+			return cls.claim(user_id, session, key, fingerprint)
+
+		cache.set(cache_key, record, timeout=int(cls._ttl().total_seconds()))
+		return record, created
+
+	@classmethod
+	def claim_request(cls, request, session, validated_data: dict) -> Tuple[Optional[IdempotencyKey], bool]:
+		"""
+		claim() for a SendMessageSerializer payload; (None, True) when the
+		request carries no key.
+
+		Raises ValueError for a malformed key and IdempotencyKeyReused when
+		it comes with a different payload than the first time.
+		"""
+		key = cls.key_from(request)
+		if key is None:
+			return None, True
+		fingerprint = cls.fingerprint(
+			session.id, validated_data['content'], validated_data['use_rag'], validated_data['temperature']
+		)
+		record, created = cls.claim(session.user_id, session, key, fingerprint)
+		if not created and record.fingerprint != fingerprint:
+			raise IdempotencyKeyReused()
+		return record, created
+
+	@classmethod
+	def release(cls, record: IdempotencyKey):
+		"""Forget a claim whose turn failed, so the client can retry it"""
+		cache.delete(cls._cache_key(record.user_id, record.key))
+		IdempotencyKey.objects.filter(pk=record.pk).delete()
+
+	@staticmethod
+	def find_turn(record: IdempotencyKey) -> Optional[Tuple[ChatMessage, ChatMessage]]:
+		"""The persisted (user, assistant) messages for a claim, if the turn has completed"""
+		by_role = {
+			m.role: m for m in ChatMessage.objects.filter(session_id=record.session_id, turn_id=record.turn_id)
+		}
+		if 'user' in by_role and 'assistant' in by_role:
+			return by_role['user'], by_role['assistant']
+		return None
+
+	@classmethod
+	def purge_expired(cls) -> int:
+		deleted, _ = IdempotencyKey.objects.filter(created_at__lt=timezone.now() - cls._ttl()).delete()
+		return deleted
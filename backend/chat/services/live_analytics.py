@@ -0,0 +1,244 @@
+"""
+Live Analytics
+Metric deltas published by the chat pipeline and pushed to admin
+dashboards over SSE
+"""
+
+import asyncio
+import logging
+import time
+from typing import List, Optional, Tuple
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+
+from .degradation import degradation
+from .quantiles import TimingSketches
+from .sse import CONNECTED, HEARTBEAT, format_event
+
+logger = logging.getLogger(__name__)
+
+
+class LiveAnalyticsChannel:
+	"""
+	Pub/sub channel in the shared cache
+
+	- analytics:live:last  → id of the newest event (atomic incr)
+	- analytics:live:{id}  → {'event', 'data'}
+
+	Publishers take an id and then write the event; subscribers poll for
+	ids after their position. Only the last LIVE_ANALYTICS_MAX_EVENTS are
+	kept, and a subscriber that falls further behind is told to resync.
+	Events are small deltas (a turn, a session), never aggregates.
+	"""
+
+	LAST_KEY = "analytics:live:last"
+
+	@staticmethod
+	def _setting(name: str, default):
+		return getattr(settings, name, default)
+
+	@staticmethod
+	def _key(event_id: int) -> str:
+		return f"analytics:live:{event_id}"
+
+	@property
+	def max_events(self) -> int:
+		return self._setting('LIVE_ANALYTICS_MAX_EVENTS', 1000)
+
+	@property
+	def ttl(self) -> int:
+		return self._setting('LIVE_ANALYTICS_TTL_SECONDS', 600)
+
+	def publish(self, event: str, data: dict) -> Optional[int]:
+		"""Append an event; never raises (analytics must not break a chat turn)"""
+		try:
+			cache.add(self.LAST_KEY, 0, timeout=None)
+			event_id = cache.incr(self.LAST_KEY)
+			cache.set(self._key(event_id), {'event': event, 'data': data}, timeout=self.ttl)
+			return event_id
+		except Exception as e:
+			logger.warning(f"Live analytics publish failed: {e}")
+			return None
+
+	def last_id(self) -> int:
+		return cache.get(self.LAST_KEY) or 0
+
+	async def alast_id(self) -> int:
+		return await cache.aget(self.LAST_KEY) or 0
+
+	def _range(self, after: int, last: int) -> Optional[range]:
+		if after > last or after + 1 < max(1, last - self.max_events + 1):
+			return None
+		return range(after + 1, last + 1)
+
+	def read_after(self, after: int) -> Tuple[Optional[List[Tuple[int, str, dict]]], int]:
+		"""
+		(events with id > after, newest id published).
+
+		Events stop at the first id whose event isn't stored (yet); events
+		is None when `after` has been evicted (or the counter was reset).
+		"""
+		last = self.last_id()
+		ids = self._range(after, last)
+		if ids is None:
+			return None, last
+		return self._collect(ids, cache.get_many([self._key(i) for i in ids])), last
+
+	async def aread_after(self, after: int) -> Tuple[Optional[List[Tuple[int, str, dict]]], int]:
+		last = await self.alast_id()
+		ids = self._range(after, last)
+		if ids is None:
+			return None, last
+		return self._collect(ids, await cache.aget_many([self._key(i) for i in ids])), last
+
+	def _collect(self, ids: range, found: dict) -> List[Tuple[int, str, dict]]:
+		events = []
+		for event_id in ids:
+			stored = found.get(self._key(event_id))
+			if stored is None:
+				break
+			events.append((event_id, stored['event'], stored['data']))
+		return events
+
+	# Publishers
+
+	def turn_completed(self, session_id, assistant_msg) -> Optional[int]:
+		metadata = assistant_msg.metadata or {}
+		return self.publish('turn', {
+			'session_id': str(session_id),
+			'messages': 2,
+			'tokens': assistant_msg.tokens_used or 0,
+			'fallback': assistant_msg.fallback,
+			'intent': assistant_msg.intent or 'unknown',
+			'sentiment': assistant_msg.sentiment or 'neutral',
+			'timings': {m: v for m, v in TimingSketches.samples(metadata).items() if v is not None},
+		})
+
+	def session_created(self, session) -> Optional[int]:
+		return self.publish('session', {'session_id': str(session.id)})
+
+
+live_channel = LiveAnalyticsChannel()
+
+
+def _status() -> dict:
+	"""Degradation level and last-hour latency percentiles (cache reads only)"""
+	return {
+		'degradation': degradation.status(),
+		'latency_last_hour': TimingSketches.summaries(TimingSketches.recent(hours=1)),
+	}
+
+
+class _LiveFeed:
+	"""
+	One dashboard connection's position and timers; live_sync and
+	live_async drive it with their own reads and sleeps
+	"""
+
+	# A publisher that took an id but never wrote the event leaves a hole;
+	# skip it once it has been missing this long
+	HOLE_GRACE = 2.0
+
+	def __init__(self, position: int, status: dict):
+		self.poll = getattr(settings, 'LIVE_ANALYTICS_POLL_MS', 500) / 1000
+		self.status_every = getattr(settings, 'LIVE_ANALYTICS_STATUS_SECONDS', 5)
+		self.heartbeat_interval = getattr(settings, 'SSE_HEARTBEAT_SECONDS', 15)
+		self.deadline = time.monotonic() + getattr(settings, 'LIVE_ANALYTICS_MAX_SECONDS', 300)
+		self.position = position
+		self.status = status
+		self.last_write = self.last_status = time.monotonic()
+		self.hole_since = None
+		self.turns_since_status = False
+
+	def open(self) -> bool:
+		return time.monotonic() < self.deadline
+
+	def start(self) -> List[str]:
+		return [CONNECTED, format_event('status', self.status)]
+
+	def events(self, events: Optional[list], last: int) -> List[str]:
+		"""Frames for a channel read (LiveAnalyticsChannel.read_after)"""
+		if events is None:
+			self.position = last
+			self.last_write = time.monotonic()
+			return [format_event('resync', {'code': 'resync_required', 'last_event_id': last})]
+
+		frames = []
+		for event_id, event, data in events:
+			frames.append(format_event(event, data, event_id))
+			self.position = event_id
+			self.turns_since_status = self.turns_since_status or event == 'turn'
+			self.last_write = time.monotonic()
+
+		if self.position < last:
+			self.hole_since = self.hole_since or time.monotonic()
+			if time.monotonic() - self.hole_since >= self.HOLE_GRACE:
+				self.position += 1
+				self.hole_since = None
+		else:
+			self.hole_since = None
+		return frames
+
+	def status_due(self) -> bool:
+		return time.monotonic() - self.last_status >= self.status_every
+
+	def status_changed(self, current: dict) -> List[str]:
+		frames = []
+		if self.turns_since_status or current['degradation']['level'] != self.status['degradation']['level']:
+			frames.append(format_event('status', current))
+			self.last_write = time.monotonic()
+		self.status, self.last_status, self.turns_since_status = current, time.monotonic(), False
+		return frames
+
+	def heartbeat(self) -> List[str]:
+		if time.monotonic() - self.last_write < self.heartbeat_interval:
+			return []
+		self.last_write = time.monotonic()
+		return [HEARTBEAT]
+
+
+def live_sync(last_event_id: int = 0, channel: LiveAnalyticsChannel = live_channel):
+	"""
+	SSE frames for the admin dashboard:
+	- "status" first, then whenever a turn changed the latency sketches or
+	  the degradation level changed (checked every LIVE_ANALYTICS_STATUS_SECONDS)
+	- "turn" / "session" deltas with their channel ids, so a reconnect with
+	  Last-Event-ID resumes where it stopped
+	- "resync" if the position fell out of the channel; the client reloads
+	  the payload and continues from the id it carries
+	The stream ends after LIVE_ANALYTICS_MAX_SECONDS and clients reconnect.
+	This generator sleeps between polls, so it holds a worker (WSGI) or a
+	thread-pool thread (ASGI) for the whole connection; under ASGI serve
+	live_async instead.
+	"""
+	feed = _LiveFeed(last_event_id or channel.last_id(), _status())
+	yield from feed.start()
+	while feed.open():
+		yield from feed.events(*channel.read_after(feed.position))
+		if feed.status_due():
+			yield from feed.status_changed(_status())
+		yield from feed.heartbeat()
+		time.sleep(feed.poll)
+
+
+async def live_async(last_event_id: int = 0, channel: LiveAnalyticsChannel = live_channel):
+	"""
+	Async counterpart of live_sync: a waiting connection holds only a
+	coroutine; channel reads go through the async cache API and the status
+	(a handful of cache reads) runs in a worker thread
+	"""
+	status = sync_to_async(_status, thread_sensitive=False)
+	feed = _LiveFeed(last_event_id or await channel.alast_id(), await status())
+	for frame in feed.start():
+		yield frame
+	while feed.open():
+		for frame in feed.events(*await channel.aread_after(feed.position)):
+			yield frame
+		if feed.status_due():
+			for frame in feed.status_changed(await status()):
+				yield frame
+		for frame in feed.heartbeat():
+			yield frame
+		await asyncio.sleep(feed.poll)
@@ -3,12 +3,18 @@ Google Gemini LLM Service
 Natural Language Generation + Reasoning: Intelligent conversation
 """
 
+from asgiref.sync import sync_to_async
 from google import genai
 from google.genai import errors as genai_errors
 import time
+import logging
 from django.conf import settings
 from typing import Optional
 
+from .degradation import llm_breaker
+
+logger = logging.getLogger(__name__)
+
 
 class LLMService:
 	"""
@@ -23,6 +29,10 @@ class LLMService:
 		self.client = genai.Client(api_key=api_key)
 		self.model_name = "gemini-2.5-flash"  # Use stable flash model
 
+		# Token usage / error of the most recent streamed response
+		self.last_usage = {}
+		self.last_error = None
+
 		self.safety_settings = [
 			{
 				"category": "HARM_CATEGORY_HARASSMENT",
@@ -51,31 +61,7 @@ class LLMService:
 		Returns: {"text": str, "tokens_used": int}
 		"""
 
-		system_message = (
-			"""You are TalkSense AI, a helpful and knowledgeable assistant.
-
-		Rules:
-		- Answer directly without preamble or disclaimers
-		- If context is missing, use your general knowledge - do NOT mention context availability
-		- Be concise but complete
-		- DO NOT include a "Sources" section (the UI handles this)
-		- Format with headers/bullets if helpful"""
-		)
-
-		if context:
-			final_prompt = f"""{system_message}
-
-=== CONTEXT ===
-{context}
-===============
-
-Question: {prompt}
-
-Answer the question using the context when relevant. Supplement with your knowledge if needed."""
-		else:
-			final_prompt = f"""{system_message}
-
-User Question: {prompt}"""
+		final_prompt = self._build_prompt(prompt, context)
 
 		# Retry loop with exponential backoff for transient errors
 		attempts = 3
@@ -96,6 +82,7 @@ User Question: {prompt}"""
 				if hasattr(response, "usage_metadata") and response.usage_metadata:
 					tokens_used = getattr(response.usage_metadata, "output_tokens", 0)
 
+				llm_breaker.record_success()
 				return {"text": getattr(response, "text", str(response)), "tokens_used": tokens_used}
 			except genai_errors.ServerError as e:
 				# Server-side issues (e.g., overloaded). Retry a few times then fallback.
@@ -105,10 +92,12 @@ User Question: {prompt}"""
 					backoff *= 2
 					continue
 				# Final attempt failed — return graceful fallback
+				llm_breaker.record_failure()
 				return {"text": "⚠️ The AI is currently busy. Please try again in a moment.", "tokens_used": 0, "fallback": True, "reason": msg}
 			except Exception as e:
 				# Non-server error (network, auth). Return a safe fallback instead of raising.
 				msg = str(e)
+				llm_breaker.record_failure()
 				return {"text": "⚠️ The AI is temporarily unavailable. Please try again later.", "tokens_used": 0, "fallback": True, "reason": msg}
 
 	def stream_response(
@@ -120,7 +109,94 @@ User Question: {prompt}"""
 	):
 		"""
 		Stream response for real-time frontend updates. Yields text chunks.
+		Usage reported by Gemini is left in self.last_usage. Errors are
+		answered with an apology chunk and left in self.last_error.
+		Closing the generator closes the upstream Gemini stream.
+		"""
+		final_prompt = self._build_prompt(prompt, context)
+		self.last_usage = {}
+		self.last_error = None
+		response = None
+
+		try:
+			response = self.client.models.generate_content_stream(
+				model=self.model_name,
+				contents=final_prompt,
+				config=genai.types.GenerateContentConfig(
+					temperature=temperature,
+					max_output_tokens=max_tokens,
+				),
+			)
+
+			for chunk in response:
+				self._record_usage(chunk)
+				if hasattr(chunk, "text") and chunk.text:
+					yield chunk.text
+				else:
+					# Skip empty or usage-only chunks if they don't have text
+					continue
+			llm_breaker.record_success()
+		except Exception as e:
+			logger.error(f"LLM streaming error: {str(e)}")
+			self.last_error = e
+			llm_breaker.record_failure()
+			yield "Sorry, something went wrong. Please try again in a moment."
+		finally:
+			if hasattr(response, 'close'):
+				response.close()
+
+	async def astream_response(
+		self,
+		prompt: str,
+		context: Optional[str] = None,
+		temperature: float = 0.3,
+		max_tokens: int = 2000,
+	):
 		"""
+		Async variant of stream_response using the genai async client.
+		Yields text chunks without holding a thread while waiting on Gemini.
+		aclose() closes the upstream Gemini stream.
+		"""
+		final_prompt = self._build_prompt(prompt, context)
+		self.last_usage = {}
+		self.last_error = None
+		response = None
+
+		try:
+			response = await self.client.aio.models.generate_content_stream(
+				model=self.model_name,
+				contents=final_prompt,
+				config=genai.types.GenerateContentConfig(
+					temperature=temperature,
+					max_output_tokens=max_tokens,
+				),
+			)
+
+			async for chunk in response:
+				self._record_usage(chunk)
+				if hasattr(chunk, "text") and chunk.text:
+					yield chunk.text
+			await sync_to_async(llm_breaker.record_success, thread_sensitive=False)()
+		except Exception as e:
+			logger.error(f"LLM async streaming error: {str(e)}")
+			self.last_error = e
+			await sync_to_async(llm_breaker.record_failure, thread_sensitive=False)()
+			yield "Sorry, something went wrong. Please try again in a moment."
+		finally:
+			if hasattr(response, 'aclose'):
+				await response.aclose()
+
+	def _record_usage(self, chunk):
+		usage = getattr(chunk, "usage_metadata", None)
+		if usage:
+			self.last_usage = {
+				'prompt': getattr(usage, "prompt_token_count", None) or 0,
+				'completion': getattr(usage, "candidates_token_count", None) or 0,
+			}
+
+	@staticmethod
+	def _build_prompt(prompt: str, context: Optional[str] = None) -> str:
+		"""Assemble the system rules, optional RAG context and the question"""
 		system_message = (
 			"""You are TalkSense AI, a helpful and knowledgeable assistant.
 
@@ -133,7 +209,7 @@ User Question: {prompt}"""
 		)
 
 		if context:
-			final_prompt = f"""{system_message}
+			return f"""{system_message}
 
 === CONTEXT ===
 {context}
@@ -142,35 +218,11 @@ User Question: {prompt}"""
 Question: {prompt}
 
 Answer the question using the context when relevant. Supplement with your knowledge if needed."""
-		else:
-			final_prompt = f"""{system_message}
+		return f"""{system_message}
 
 User Question: {prompt}"""
 
-		import time
-		start_time = time.time()
-		try:
-			response = self.client.models.generate_content_stream(
-				model=self.model_name,
-				contents=final_prompt,
-				config=genai.types.GenerateContentConfig(
-					temperature=temperature,
-					max_output_tokens=max_tokens,
-				),
-			)
-
-			for chunk in response:
-				if hasattr(chunk, "text") and chunk.text:
-					yield chunk.text
-				else:
-					# Skip empty or usage-only chunks if they don't have text
-					continue
-		except Exception as e:
-			import logging
-			logger = logging.getLogger(__name__)
-			logger.error(f"LLM streaming error: {str(e)}")
-			yield "Sorry, something went wrong. Please try again in a moment."
-
-	def count_tokens(self, text: str) -> int:
+	@staticmethod
+	def count_tokens(text: str) -> int:
 		"""Estimate token count for text (approx)."""
 		return len(text) // 4
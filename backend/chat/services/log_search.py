@@ -0,0 +1,211 @@
+"""
+Admin Log Search
+Ranked full-text search over message content and session titles
+"""
+
+import base64
+import json
+import re
+import uuid
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Exists, OuterRef, Q
+
+from chat.models import ChatSession, ChatMessage
+from . import search_index
+
+
+class LogSearchService:
+	"""
+	Sessions matching a query, best match first
+
+	The index lives in the database (migration 0018, DDL in search_index):
+	- SQLite:     FTS5 tables chat_chatmessage_fts / chat_chatsession_fts,
+	              synced by triggers, ranked by bm25
+	- PostgreSQL: generated search_vector columns with GIN indexes, ranked
+	              by ts_rank, cast to float8 so a cursor's score compares
+	              equal to the float4 rank it was read from
+	A session scores as its best hit; a title hit counts double. Terms are
+	prefix-matched and all must occur. Pages are keyset-paginated on
+	(score, session id), so deep pages cost no OFFSET scan.
+
+	Queries containing '@' match user emails instead, and other backends
+	fall back to icontains; both are ordered by (updated_at, id).
+	"""
+
+	TITLE_WEIGHT = 2
+	MAX_TERMS = 8
+
+	SQLITE_SEARCH = """
+		SELECT session_id, MAX(score) FROM (
+			SELECT m.session_id AS session_id, -bm25(chat_chatmessage_fts) AS score
+			FROM chat_chatmessage_fts JOIN chat_chatmessage m ON m.rowid = chat_chatmessage_fts.rowid
+			WHERE chat_chatmessage_fts MATCH %s
+			UNION ALL
+			SELECT s.id, -bm25(chat_chatsession_fts) * {weight}
+			FROM chat_chatsession_fts JOIN chat_chatsession s ON s.rowid = chat_chatsession_fts.rowid
+			WHERE chat_chatsession_fts MATCH %s
+		) hits GROUP BY session_id {having} ORDER BY MAX(score) DESC, session_id LIMIT %s
+	"""
+
+	POSTGRES_SEARCH = """
+		WITH q AS (SELECT to_tsquery('english', %s) AS query)
+		SELECT session_id, MAX(score) FROM (
+			SELECT m.session_id AS session_id, ts_rank(m.search_vector, q.query)::float8 AS score
+			FROM chat_chatmessage m, q WHERE m.search_vector @@ q.query
+			UNION ALL
+			SELECT s.id, ts_rank(s.search_vector, q.query)::float8 * {weight}
+			FROM chat_chatsession s, q WHERE s.search_vector @@ q.query
+		) hits GROUP BY session_id {having} ORDER BY MAX(score) DESC, session_id LIMIT %s
+	"""
+
+	HAVING = "HAVING MAX(score) < %s OR (MAX(score) = %s AND session_id > %s)"
+
+	# Cursors
+
+	@staticmethod
+	def encode(position: dict) -> str:
+		raw = json.dumps(position, separators=(',', ':')).encode('utf-8')
+		return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+	@staticmethod
+	def decode(token: str) -> dict:
+		"""Position of a cursor; raises ValueError if malformed"""
+		try:
+			position = json.loads(base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)))
+			uuid.UUID(position['id'])
+			return position
+		except (ValueError, KeyError, TypeError):
+			raise ValueError("Invalid cursor")
+
+	# Search
+
+	@classmethod
+	def terms(cls, query: str) -> List[str]:
+		return re.findall(r'\w+', query.lower())[:cls.MAX_TERMS]
+
+	@classmethod
+	def search(cls, query: str = '', cursor: Optional[str] = None, limit: int = 50) -> dict:
+		"""
+		{'results': [...], 'next': cursor or None}
+
+		Raises ValueError for a malformed cursor.
+		"""
+		position = cls.decode(cursor) if cursor else None
+		terms = cls.terms(query)
+		if terms and '@' not in query and connection.vendor in ('sqlite', 'postgresql'):
+			ranked, more = cls._ranked(terms, position, limit)
+		else:
+			ranked, more = cls._recent(query.strip(), position, limit)
+
+		sessions = ChatSession.objects.select_related('user').in_bulk([session_id for session_id, _ in ranked])
+		results = []
+		for session_id, score in ranked:
+			s = sessions.get(session_id)
+			if s is None:
+				continue  # deleted since the search ran
+			results.append({
+				'id': s.id,
+				'user': s.user.email,
+				'title': s.title,
+				'updated_at': s.updated_at,
+				'message_count': s.message_count,
+				'score': round(score, 4) if isinstance(score, float) else None,
+			})
+
+		next_cursor = None
+		if more:
+			session_id, score = ranked[-1]
+			key = 's' if isinstance(score, float) else 't'
+			next_cursor = cls.encode({key: score if key == 's' else score.isoformat(), 'id': str(session_id)})
+		return {'results': results, 'next': next_cursor}
+
+	@classmethod
+	def _ranked(cls, terms: List[str], position: Optional[dict], limit: int) -> Tuple[list, bool]:
+		sqlite = connection.vendor == 'sqlite'
+		if sqlite:
+			sql, match = cls.SQLITE_SEARCH, ' '.join(f'"{t}"*' for t in terms)
+			params = [match, match]
+		else:
+			sql, match = cls.POSTGRES_SEARCH, ' & '.join(f'{t}:*' for t in terms)
+			params = [match]
+
+		having = ''
+		if position and 's' in position:
+			after_id = uuid.UUID(position['id'])
+			having = cls.HAVING
+			params += [position['s'], position['s'], after_id.hex if sqlite else after_id]
+		params.append(limit + 1)
+
+		with connection.cursor() as cursor:
+			cursor.execute(sql.format(weight=cls.TITLE_WEIGHT, having=having), params)
+			rows = [(uuid.UUID(str(session_id)), float(score)) for session_id, score in cursor.fetchall()]
+		return rows[:limit], len(rows) > limit
+
+	@classmethod
+	def _recent(cls, query: str, position: Optional[dict], limit: int) -> Tuple[list, bool]:
+		sessions = ChatSession.objects.order_by('-updated_at', '-id')
+		if '@' in query:
+			sessions = sessions.filter(user__email__icontains=query)
+		elif query:
+			sessions = sessions.filter(
+				Q(title__icontains=query) |
+				Exists(ChatMessage.objects.filter(session=OuterRef('pk'), content__icontains=query))
+			)
+		if position and 't' in position:
+			updated_at = datetime.fromisoformat(position['t'])
+			sessions = sessions.filter(
+				Q(updated_at__lt=updated_at) | Q(updated_at=updated_at, id__lt=position['id'])
+			)
+		rows = list(sessions.values_list('id', 'updated_at')[:limit + 1])
+		return rows[:limit], len(rows) > limit
+
+	# Maintenance
+
+	@classmethod
+	def install(cls) -> bool:
+		"""(Re)create the SQLite index and rebuild it from the tables; False elsewhere"""
+		if connection.vendor != 'sqlite':
+			return False
+		with connection.cursor() as cursor:
+			for sql in search_index.SQLITE_SCHEMA + search_index.SQLITE_REBUILD:
+				cursor.execute(sql)
+		return True
+
+	@classmethod
+	def problems(cls, thorough: bool = False) -> List[str]:
+		"""
+		What is wrong with the SQLite index; empty if it is sound or not SQLite
+
+		Checks that every trigger exists and that each FTS table indexes as
+		many rows as its table holds. `thorough` also runs FTS5's
+		integrity-check against the table, which reads the whole index but
+		catches rowids renumbered by a VACUUM or a table rebuild.
+		"""
+		if connection.vendor != 'sqlite':
+			return []
+		found = []
+		with connection.cursor() as cursor:
+			cursor.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'trigger')")
+			names = {row[0] for row in cursor.fetchall()}
+			for fts, (table, _) in search_index.SQLITE_TABLES.items():
+				if fts not in names:
+					found.append(f"{fts} is missing")
+					continue
+				missing = [name for name in search_index.sqlite_triggers(fts) if name not in names]
+				if missing:
+					found.append(f"{table} is missing trigger(s) {', '.join(missing)}")
+
+				cursor.execute(f"SELECT (SELECT COUNT(*) FROM {fts}_docsize), (SELECT COUNT(*) FROM {table})")
+				indexed, rows = cursor.fetchone()
+				if indexed != rows:
+					found.append(f"{fts} indexes {indexed} rows but {table} has {rows}")
+				elif thorough:
+					try:
+						with transaction.atomic():
+							cursor.execute(f"INSERT INTO {fts}({fts}, rank) VALUES ('integrity-check', 1)")
+					except DatabaseError:
+						found.append(f"{fts} does not match {table} (rowids renumbered?)")
+		return found
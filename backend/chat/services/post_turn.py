@@ -0,0 +1,106 @@
+"""
+Post-turn Processing
+Background bookkeeping that the user does not wait for
+"""
+
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F
+from django.utils import timezone
+
+from chat.models import ChatSession, ChatMessage, MessageEmbedding
+from .history_index import history_indexes
+from .llm_service import LLMService
+
+logger = logging.getLogger(__name__)
+
+
+class PostTurnProcessor:
+	"""
+	Deferred work for completed chat turns
+
+	Handles, per session:
+	- Storing vectors for every message still missing one (query vectors
+	  come from the embedding cache, responses are embedded here)
+	- Metadata enrichment (token estimates for streamed responses)
+	- History index bookkeeping
+
+	Scheduling is coalesced: several turns in the same session within the
+	coalesce window share one task run. Runs are idempotent because they
+	work from database state (messages without a MessageEmbedding row).
+	"""
+
+	@staticmethod
+	def _scheduled_key(session_id) -> str:
+		return f"post_turn:scheduled:{session_id}"
+
+	@classmethod
+	def schedule(cls, session_id):
+		"""Queue post-turn work for a session unless a run is already pending"""
+		countdown = getattr(settings, 'POST_TURN_COALESCE_SECONDS', 2)
+		key = cls._scheduled_key(session_id)
+
+		if not cache.add(key, 1, timeout=countdown + 60):
+			return False
+
+		from chat.tasks import finalize_session_turns_task
+		try:
+			finalize_session_turns_task.apply_async(args=[str(session_id)], countdown=countdown)
+		except Exception as e:
+			# Broker unavailable: do the work inline rather than lose it
+			logger.warning(f"Post-turn task could not be queued, running inline: {e}")
+			cls.finalize_session(session_id)
+		return True
+
+	@classmethod
+	def finalize_session(cls, session_id) -> int:
+		"""
+		Complete post-turn work for every pending message in a session.
+
+		Returns:
+			Number of messages embedded
+		"""
+		# Clear the flag first so turns persisted from here on schedule a new run
+		cache.delete(cls._scheduled_key(session_id))
+
+		session = ChatSession.objects.filter(id=session_id).only('id', 'user_id').first()
+		if session is None:
+			return 0
+
+		pending = list(
+			ChatMessage.objects.filter(session_id=session_id, embedding_vector__isnull=True)
+			.exclude(content='')
+			.only('id', 'role', 'content', 'tokens_used', 'created_at')
+			.order_by('created_at')
+		)
+
+		if pending:
+			from .embedding_service import EmbeddingService
+			vectors = EmbeddingService().get_embeddings_batch([m.content for m in pending])
+			MessageEmbedding.objects.bulk_create(
+				[MessageEmbedding.build(m, v) for m, v in zip(pending, vectors)],
+				ignore_conflicts=True
+			)
+			for msg, vector in zip(pending, vectors):
+				history_indexes.record_message(session.user_id, msg.id, session.id, vector, msg.created_at)
+
+			# Streamed responses don't report usage; fill in an estimate. Each
+			# row is claimed with a conditional update, and only the rows this
+			# run claimed count towards the session total, so overlapping runs
+			# (beat plus on-demand, a retried task) can't count a reply twice.
+			now = timezone.now()
+			claimed = 0
+			for msg in pending:
+				if msg.role != 'assistant' or msg.tokens_used is not None:
+					continue
+				tokens = LLMService.count_tokens(msg.content)
+				if ChatMessage.objects.filter(pk=msg.pk, tokens_used__isnull=True).update(
+					tokens_used=tokens, updated_at=now
+				):
+					claimed += tokens
+			if claimed:
+				ChatSession.objects.filter(id=session_id).update(total_tokens=F('total_tokens') + claimed)
+
+		return len(pending)
@@ -0,0 +1,263 @@
+"""
+Latency Quantiles
+Mergeable DDSketch quantile sketches for pipeline timings
+"""
+
+import math
+import os
+import threading
+from datetime import datetime, timedelta, timezone as dt_timezone
+from typing import Dict, Iterable, Optional
+
+from django.conf import settings
+from django.core.cache import cache
+from django.utils import timezone
+
+
+class DDSketch:
+	"""
+	Quantile sketch with relative-error guarantees (DDSketch)
+
+	A value x lands in bucket ceil(log_gamma(x)), gamma = (1+a)/(1-a), so
+	every quantile is returned within relative accuracy `a` of the true
+	value. Sketches merge by adding bucket counts, which is what lets
+	per-day and per-hour sketches answer arbitrary windows. Past
+	`max_buckets` the lowest buckets are collapsed, sacrificing accuracy
+	at the fast end rather than the tail.
+	"""
+
+	MIN_VALUE = 1e-6  # seconds; anything smaller counts as zero
+
+	def __init__(self, relative_accuracy: float = 0.01, max_buckets: int = 2048):
+		self.relative_accuracy = relative_accuracy
+		self.max_buckets = max_buckets
+		self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+		self._log_gamma = math.log(self.gamma)
+		self.buckets: Dict[int, int] = {}
+		self.zero_count = 0
+		self.count = 0
+		self.sum = 0.0
+		self.min = math.inf
+		self.max = -math.inf
+
+	def add(self, value: float, weight: int = 1):
+		if value is None:
+			return
+		if value <= self.MIN_VALUE:
+			self.zero_count += weight
+		else:
+			index = math.ceil(math.log(value) / self._log_gamma)
+			self.buckets[index] = self.buckets.get(index, 0) + weight
+			self._collapse()
+		self.count += weight
+		self.sum += value * weight
+		self.min = min(self.min, value)
+		self.max = max(self.max, value)
+
+	def merge(self, other: 'DDSketch') -> 'DDSketch':
+		if other.count == 0:
+			return self
+		if other.gamma != self.gamma:
+			raise ValueError("Cannot merge sketches with different relative accuracy")
+		for index, count in other.buckets.items():
+			self.buckets[index] = self.buckets.get(index, 0) + count
+		self._collapse()
+		self.zero_count += other.zero_count
+		self.count += other.count
+		self.sum += other.sum
+		self.min = min(self.min, other.min)
+		self.max = max(self.max, other.max)
+		return self
+
+	def _collapse(self):
+		if len(self.buckets) <= self.max_buckets:
+			return
+		ordered = sorted(self.buckets)
+		overflow = ordered[:len(ordered) - self.max_buckets + 1]
+		target = overflow[-1]
+		self.buckets[target] = sum(self.buckets.pop(i) for i in overflow)
+
+	def quantile(self, q: float) -> Optional[float]:
+		"""Value at quantile q (0..1), None for an empty sketch"""
+		if self.count == 0:
+			return None
+		rank = q * (self.count - 1)
+		seen = self.zero_count
+		if rank < seen:
+			return 0.0
+		for index in sorted(self.buckets):
+			seen += self.buckets[index]
+			if seen > rank:
+				estimate = 2 * self.gamma ** index / (self.gamma + 1)
+				return min(max(estimate, self.min), self.max)
+		return self.max
+
+	def summary(self, digits: int = 3) -> dict:
+		"""p50/p90/p99, mean and count (what analytics report)"""
+		def rounded(value):
+			return round(value, digits) if value is not None else None
+		return {
+			'p50': rounded(self.quantile(0.5)),
+			'p90': rounded(self.quantile(0.9)),
+			'p99': rounded(self.quantile(0.99)),
+			'mean': rounded(self.sum / self.count) if self.count else None,
+			'count': self.count,
+		}
+
+	def to_dict(self) -> dict:
+		return {
+			'a': self.relative_accuracy,
+			'b': {str(i): c for i, c in self.buckets.items()},
+			'z': self.zero_count,
+			'n': self.count,
+			's': self.sum,
+			'lo': self.min if self.count else None,
+			'hi': self.max if self.count else None,
+		}
+
+	@classmethod
+	def from_dict(cls, data: Optional[dict]) -> 'DDSketch':
+		if not data:
+			return cls()
+		sketch = cls(relative_accuracy=data['a'])
+		sketch.buckets = {int(i): c for i, c in data['b'].items()}
+		sketch.zero_count = data['z']
+		sketch.count = data['n']
+		sketch.sum = data['s']
+		if sketch.count:
+			sketch.min, sketch.max = data['lo'], data['hi']
+		return sketch
+
+
+class TimingSketches:
+	"""
+	One DDSketch per pipeline timing (seconds)
+
+	- ttft:       time to first token of streamed replies
+	- latency:    request start to full reply
+	- embedding:  query embedding
+	- retrieval:  FAISS search
+
+	Daily sketches are stored on DailyUsageRollup (exact, from the replies'
+	timing columns). Short windows (the last hour, or today until it is
+	rolled up) are answered from hourly sketches in the shared cache: each
+	process adds its turns to its own sketch for the hour and writes it
+	under a writer slot it claimed from an atomic counter, and reads merge
+	every slot of the hour. No process ever read-modify-writes another's
+	sketch, so concurrent turns can't drop each other's samples.
+	"""
+
+	METRICS = ('ttft', 'latency', 'embedding', 'retrieval')
+	CACHE_TTL = 3 * 24 * 3600
+
+	# This process's sketches for the current hour: (pid, hour key, slot key, sketches)
+	_buffer = None
+	_buffer_lock = threading.Lock()
+
+	@staticmethod
+	def samples(metadata: dict) -> Dict[str, Optional[float]]:
+		"""Timings recorded in an assistant message's metadata"""
+		streaming = metadata.get('streaming')
+		return {
+			# Streamed replies store time-to-first-token as 'latency' and the
+			# full duration as 'duration'
+			'ttft': metadata.get('ttft', metadata.get('latency') if streaming else None),
+			'latency': metadata.get('duration', metadata.get('latency')),
+			'embedding': metadata.get('embedding_time'),
+			'retrieval': metadata.get('retrieval_time'),
+		}
+
+	@classmethod
+	def empty(cls) -> Dict[str, DDSketch]:
+		return {metric: DDSketch(cls._accuracy()) for metric in cls.METRICS}
+
+	@staticmethod
+	def _accuracy() -> float:
+		return getattr(settings, 'LATENCY_SKETCH_ACCURACY', 0.01)
+
+	@classmethod
+	def add(cls, sketches: Dict[str, DDSketch], metadata: dict):
+		for metric, value in cls.samples(metadata).items():
+			if value is not None:
+				sketches[metric].add(value)
+
+	@classmethod
+	def merge_dicts(cls, total: Dict[str, DDSketch], stored: Optional[dict]):
+		"""Merge serialised {metric: sketch} (a rollup's sketches) into total"""
+		for metric, data in (stored or {}).items():
+			if metric in total:
+				total[metric].merge(DDSketch.from_dict(data))
+		return total
+
+	@staticmethod
+	def to_dicts(sketches: Dict[str, DDSketch]) -> dict:
+		return {metric: sketch.to_dict() for metric, sketch in sketches.items() if sketch.count}
+
+	@staticmethod
+	def summaries(sketches: Dict[str, DDSketch]) -> dict:
+		return {metric: sketch.summary() for metric, sketch in sketches.items()}
+
+	# Hourly sketches in the shared cache
+
+	@staticmethod
+	def _hour_key(hour: datetime) -> str:
+		return f"latency:sketch:{hour.astimezone(dt_timezone.utc).strftime('%Y%m%d%H')}"
+
+	@classmethod
+	def _claim_slot(cls, hour_key: str) -> str:
+		"""Key of a writer slot of its own for this process in the hour"""
+		writers_key = f"{hour_key}:writers"
+		cache.add(writers_key, 0, timeout=cls.CACHE_TTL)
+		try:
+			slot = cache.incr(writers_key)
+		except ValueError:
+			# Counter evicted between add and incr; start it over
+			cache.set(writers_key, 1, timeout=cls.CACHE_TTL)
+			slot = 1
+		return f"{hour_key}:{slot}"
+
+	@classmethod
+	def record(cls, metadata: dict, now: datetime = None):
+		"""Add one turn's timings to this process's sketches for the current hour"""
+		samples = {m: v for m, v in cls.samples(metadata).items() if v is not None}
+		if not samples:
+			return
+		hour_key = cls._hour_key(now or timezone.now())
+		with cls._buffer_lock:
+			pid = os.getpid()
+			# A new hour, or a forked worker that inherited its parent's buffer
+			if cls._buffer is None or cls._buffer[:2] != (pid, hour_key):
+				cls._buffer = (pid, hour_key, cls._claim_slot(hour_key), cls.empty())
+			_, _, slot_key, sketches = cls._buffer
+			for metric, value in samples.items():
+				sketches[metric].add(value)
+			cache.set(slot_key, cls.to_dicts(sketches), timeout=cls.CACHE_TTL)
+
+	@classmethod
+	def recent(cls, hours: int = 1, now: datetime = None) -> Dict[str, DDSketch]:
+		"""Merged sketches for the current hour and the `hours - 1` before it"""
+		now = now or timezone.now()
+		hour_keys = [cls._hour_key(now - timedelta(hours=i)) for i in range(hours)]
+		writers = cache.get_many([f"{key}:writers" for key in hour_keys])
+		slot_keys = [
+			f"{key}:{slot}" for key in hour_keys
+			for slot in range(1, writers.get(f"{key}:writers", 0) + 1)
+		]
+		sketches = cls.empty()
+		for stored in cache.get_many(slot_keys).values():
+			cls.merge_dicts(sketches, stored)
+		return sketches
+
+	@classmethod
+	def since(cls, start: datetime, now: datetime = None) -> Dict[str, DDSketch]:
+		"""Merged sketches for every hour from the one holding `start` through now"""
+		now = now or timezone.now()
+		first_hour = start.astimezone(dt_timezone.utc).replace(minute=0, second=0, microsecond=0)
+		return cls.recent(hours=max(1, int((now - first_hour) // timedelta(hours=1)) + 1), now=now)
+
+	@classmethod
+	def from_metadata(cls, rows: Iterable[dict]) -> Dict[str, DDSketch]:
+		sketches = cls.empty()
+		for metadata in rows:
+			cls.add(sketches, metadata or {})
+		return sketches
@@ -3,18 +3,28 @@ RAG Service: Orchestrates the full NLP pipeline
 Retrieval-Augmented Generation: Combines NLU, semantic search, and NLG
 """
 
+from asgiref.sync import sync_to_async
 from django.contrib.auth import get_user_model
 from chat.models import ChatSession, ChatMessage
 from .embedding_service import EmbeddingService
 from .vector_store import VectorStore
 from .llm_service import LLMService
+from .turn_store import TurnStore
+from .degradation import DegradationPlan, degradation, ttft_window
+from .quantiles import TimingSketches
 from typing import Optional, Tuple, List
+import logging
+import threading
 import uuid
 import time
 import random
 import re
 
 User = get_user_model()
+logger = logging.getLogger(__name__)
+
+# Completed streams used to estimate what a cancellation saved
+CANCELLATION_BASELINE_SIZE = 50
 
 def trim_to_sentence(text: str, max_chars: int = 350) -> str:
 	"""Trim text to last complete sentence within max_chars."""
@@ -37,7 +47,11 @@ class RAGService:
 	2. Semantic Search (FAISS): Find relevant context by meaning
 	3. Context Injection: Combine context + conversation history
 	4. NLG (Gemini): Generate intelligent response
-	5. Persist: Save both messages with embeddings
+	5. Persist: The question is stored up front, the reply in one
+	   transaction at the end; embeddings run post-turn
+	
+	Under load, steps 2-4 are trimmed according to the current
+	degradation level (see chat.services.degradation).
 	"""
 	
 	def __init__(self):
@@ -51,90 +65,315 @@ class RAGService:
 		user_message: str,
 		use_rag: bool = True,
 		top_k: int = 3,
-		temperature: float = 0.3
+		temperature: float = 0.3,
+		turn_id: Optional[uuid.UUID] = None,
+		cancel: Optional[threading.Event] = None
 	):
 		"""
 		Streaming version of RAG pipeline.
-		Yields chunks of the AI response and persists final message.
+		Yields (event, data) pairs - 'sources', then 'token' chunks, then
+		'done' with the persisted turn - for chat.services.sse to frame.
+
+		Setting `cancel` (the client went away) stops reading the Gemini
+		stream at the next chunk and closes it; the partial response is
+		persisted with metadata.cancelled and estimates of the tokens/seconds
+		saved. Cancellation is per chunk: an upstream that stalls without
+		sending one can't be interrupted before the LLM client's timeout.
 		"""
-		# 0. Start timer
+		# 0. Start timer; pick the degradation level for this request; store
+		# the question first so a failure below can't lose it
 		start_time = time.time()
+		plan = degradation.current_plan()
+		user_msg = TurnStore.persist_user_message(session, user_message, turn_id)
+
+		# 1. Embed the query (cached; the post-turn task reuses it to store the vector)
+		timings = {}
+		step = time.time()
+		query_embedding = self.embedding_service.get_embedding(user_message)
+		timings['embedding_time'] = self._elapsed(step)
+
+		# 2. Retrieve context
+		step = time.time()
+		retrieved_docs, retrieved_context = self._retrieve(query_embedding, use_rag, plan.retrieval_k(top_k))
+		timings['retrieval_time'] = self._elapsed(step)
+		yield ('sources', self._sources(retrieved_docs))
+
+		# 3. Get history (limit to 3 for speed; skipped under load)
+		history = self._get_conversation_history(session, limit=3) if plan.use_history else ""
+		final_context = self._with_history(history, retrieved_context)
+
+		# 4. Stream from LLM (or answer from the knowledge base alone)
+		full_response_text = ""
+		ttft = 0
+		cancelled = False
+
+		if plan.use_llm:
+			chunks = self.llm_service.stream_response(
+				prompt=user_message,
+				context=final_context,
+				temperature=temperature,
+				**self._llm_limits(plan)
+			)
+		else:
+			chunks = iter([self._fallback_text(retrieved_context)])
+
+		for chunk in chunks:
+			if cancel is not None and cancel.is_set():
+				cancelled = True
+				# Release the upstream HTTP stream now, not when GC gets to it
+				if hasattr(chunks, 'close'):
+					chunks.close()
+				break
+			if not ttft:
+				ttft = time.time() - start_time
+			full_response_text += chunk
+			yield ('token', chunk)
 
-		# 1. Save user message & embedding
-		user_msg = ChatMessage.objects.create(
+		if self._streamed_from_llm(plan):
+			ttft_window.record(ttft)
+
+		# 5. Persist the turn (response embedding and enrichment happen post-turn)
+		tokens = self._stream_tokens(user_message, final_context, full_response_text)
+		metadata = self._stream_metadata(retrieved_docs, use_rag, start_time, ttft, timings)
+		metadata.update(self._degradation_metadata(plan))
+		if cancelled:
+			metadata.update(self._cancellation_metadata(tokens['completion'], start_time))
+		assistant_msg = TurnStore.persist_reply(
 			session=session,
-			role='user',
-			content=user_message
+			user_msg=user_msg,
+			assistant_content=full_response_text,
+			tokens_used=tokens['completion'],
+			metadata=metadata
 		)
+		TimingSketches.record(assistant_msg.metadata)
+		yield ('done', self._done_payload(user_msg, assistant_msg, start_time, ttft, tokens))
 
-		# Emit a very small initial chunk so the frontend can render
-		# the user message and typing indicator immediately while
-		# embeddings / retrieval happen (prevents perceived buffering).
-		yield " "
-		query_embedding = self.embedding_service.get_embedding(user_message)
-		user_msg.embedding = query_embedding
-		user_msg.save()
+	async def astream_user_message(
+		self,
+		session: ChatSession,
+		user_message: str,
+		use_rag: bool = True,
+		top_k: int = 3,
+		temperature: float = 0.3,
+		turn_id: Optional[uuid.UUID] = None,
+		cancel: Optional[threading.Event] = None
+	):
+		"""
+		Async streaming pipeline for ASGI deployments (same events as
+		stream_user_message). Embedding and FAISS search run in worker
+		threads; the Gemini stream is awaited on the event loop, so a
+		waiting stream holds no thread.
+		"""
+		start_time = time.time()
+
+		plan = await sync_to_async(degradation.current_plan, thread_sensitive=False)()
+		user_msg = await sync_to_async(TurnStore.persist_user_message)(session, user_message, turn_id)
+
+		# 1. Embed the query off the event loop (CPU-bound)
+		timings = {}
+		step = time.time()
+		query_embedding = await sync_to_async(
+			self.embedding_service.get_embedding, thread_sensitive=False
+		)(user_message)
+		timings['embedding_time'] = self._elapsed(step)
 
 		# 2. Retrieve context
-		retrieved_context = ""
-		retrieved_docs = []
-		if use_rag:
-			try:
-				retrieved_docs = self.vector_store.search(query_embedding, top_k=top_k)
-				if retrieved_docs:
-					# Trim chunks to sentence boundary for cleaner context
-					retrieved_context = "\n".join([f"{i+1}. {trim_to_sentence(doc['text'], 350)}" for i, doc in enumerate(retrieved_docs)])
-			except Exception as e:
-				print(f"RAG search error: {e}")
+		step = time.time()
+		retrieved_docs, retrieved_context = await sync_to_async(
+			self._retrieve, thread_sensitive=False
+		)(query_embedding, use_rag, plan.retrieval_k(top_k))
+		timings['retrieval_time'] = self._elapsed(step)
+		yield ('sources', self._sources(retrieved_docs))
 
-		# 3. Get history (limit to 3 for speed)
-		history = self._get_conversation_history(session, limit=3)
-		final_context = retrieved_context
-		if history:
-			final_context = f"Conversation History:\n{history}\n\n" + (final_context or "")
+		# 3. Get history (async ORM; skipped under load)
+		history = await self._aget_conversation_history(session, limit=3) if plan.use_history else ""
+		final_context = self._with_history(history, retrieved_context)
 
-		# 4. Stream from LLM
+		# 4. Stream from LLM (or answer from the knowledge base alone)
 		full_response_text = ""
 		ttft = 0
-		first_chunk = True
-
-		for chunk in self.llm_service.stream_response(
-			prompt=user_message,
-			context=final_context,
-			temperature=temperature
-		):
-			if first_chunk:
+		cancelled = False
+
+		if plan.use_llm:
+			chunks = self.llm_service.astream_response(
+				prompt=user_message,
+				context=final_context,
+				temperature=temperature,
+				**self._llm_limits(plan)
+			)
+		else:
+			chunks = self._aiter([self._fallback_text(retrieved_context)])
+
+		async for chunk in chunks:
+			if cancel is not None and cancel.is_set():
+				cancelled = True
+				await chunks.aclose()
+				break
+			if not ttft:
 				ttft = time.time() - start_time
-				first_chunk = False
 			full_response_text += chunk
-			yield chunk
+			yield ('token', chunk)
+
+		if self._streamed_from_llm(plan):
+			await sync_to_async(ttft_window.record, thread_sensitive=False)(ttft)
 
-		# 5. Persist final AI response
-		assistant_msg = ChatMessage.objects.create(
+		# 5. Persist the turn
+		tokens = self._stream_tokens(user_message, final_context, full_response_text)
+		metadata = self._stream_metadata(retrieved_docs, use_rag, start_time, ttft, timings)
+		metadata.update(self._degradation_metadata(plan))
+		if cancelled:
+			metadata.update(await sync_to_async(self._cancellation_metadata)(tokens['completion'], start_time))
+		assistant_msg = await sync_to_async(TurnStore.persist_reply)(
 			session=session,
-			role='assistant',
-			content=full_response_text,
-			metadata={
-				'retrieved_docs': [
-					{'source': doc.get('id', 'N/A'), 'text': doc.get('text', '')} for doc in retrieved_docs
-				],
-				'model': 'gemini-2.5-flash',
-				'rag_enabled': use_rag,
-				'streaming': True,
-				'latency': round(ttft if ttft > 0 else (time.time() - start_time), 3),
-				'sentiment': random.choice(['positive', 'neutral', 'neutral', 'neutral', 'negative']),
-				'intent': 'general_query' if use_rag else 'chit_chat'
-			}
+			user_msg=user_msg,
+			assistant_content=full_response_text,
+			tokens_used=tokens['completion'],
+			metadata=metadata
 		)
-		
-		# Generating embedding for response in background or post-stream
+		await sync_to_async(TimingSketches.record, thread_sensitive=False)(assistant_msg.metadata)
+		yield ('done', self._done_payload(user_msg, assistant_msg, start_time, ttft, tokens))
+
+	def _retrieve(self, query_embedding: List[float], use_rag: bool, top_k: int) -> Tuple[List[dict], str]:
+		"""FAISS retrieval → (docs, numbered context block)"""
+		if not use_rag:
+			return [], ""
 		try:
-			assistant_msg.embedding = self.embedding_service.get_embedding(full_response_text)
-			assistant_msg.save()
-		except:
-			pass
+			retrieved_docs = self.vector_store.search(query_embedding, top_k=top_k)
+		except Exception as e:
+			print(f"RAG search error: {e}")
+			return [], ""
+		# Trim chunks to sentence boundary for cleaner context
+		retrieved_context = "\n".join(
+			f"{i}. {trim_to_sentence(doc['text'], 350)}" for i, doc in enumerate(retrieved_docs, 1)
+		)
+		return retrieved_docs, retrieved_context
+
+	def _streamed_from_llm(self, plan: DegradationPlan) -> bool:
+		"""
+		Whether the stream's TTFT is a real Gemini sample: not the FAISS-only
+		fallback, and not the apology stream_response yields on an error
+		(which would read as a fast first token exactly when Gemini fails)
+		"""
+		return plan.use_llm and getattr(self.llm_service, 'last_error', None) is None
+
+	@staticmethod
+	def _elapsed(since: float) -> float:
+		return round(time.time() - since, 4)
+
+	@staticmethod
+	def _llm_limits(plan: DegradationPlan) -> dict:
+		return {'max_tokens': plan.max_tokens} if plan.max_tokens else {}
+
+	@staticmethod
+	def _degradation_metadata(plan: DegradationPlan) -> dict:
+		metadata = {'degradation_level': plan.level}
+		if not plan.use_llm:
+			metadata['fallback'] = True
+		return metadata
+
+	@staticmethod
+	def _fallback_text(retrieved_context: str) -> str:
+		"""Answer without the LLM: the retrieved knowledge base chunks, if any"""
+		if retrieved_context:
+			return "Here’s what I found from the knowledge base:\n\n" + retrieved_context
+		return "⚠️ I’m temporarily unavailable due to high load. Please retry shortly."
+
+	@staticmethod
+	async def _aiter(items):
+		for item in items:
+			yield item
+
+	@staticmethod
+	def _with_history(history: str, retrieved_context: str) -> str:
+		if history:
+			return f"Conversation History:\n{history}\n\n" + (retrieved_context or "")
+		return retrieved_context
+
+	@staticmethod
+	def _sources(retrieved_docs: List[dict]) -> List[dict]:
+		return [{'source': doc.get('id', 'N/A'), 'text': doc.get('text', '')} for doc in retrieved_docs]
+
+	def _stream_tokens(self, user_message: str, context: str, response_text: str) -> dict:
+		"""Gemini-reported usage when available, else the usual estimate"""
+		usage = self.llm_service.last_usage or {}
+		return {
+			'prompt': usage.get('prompt') or LLMService.count_tokens((context or "") + user_message),
+			'completion': usage.get('completion') or LLMService.count_tokens(response_text),
+		}
+
+	@staticmethod
+	def _done_payload(user_msg: ChatMessage, assistant_msg: ChatMessage, start_time: float, ttft: float, tokens: dict) -> dict:
+		return {
+			'message_id': assistant_msg.id,
+			'user_message_id': user_msg.id,
+			'turn_id': assistant_msg.turn_id,
+			'created_at': assistant_msg.created_at,
+			'latency': round(time.time() - start_time, 3),
+			'ttft': round(ttft, 3),
+			'tokens': tokens,
+			'cancelled': bool(assistant_msg.metadata.get('cancelled')),
+		}
 
-		session.save()
+	@classmethod
+	def _stream_metadata(cls, retrieved_docs: List[dict], use_rag: bool, start_time: float, ttft: float, timings: dict) -> dict:
+		return {
+			**timings,
+			'retrieved_docs': cls._sources(retrieved_docs),
+			'model': 'gemini-2.5-flash',
+			'rag_enabled': use_rag,
+			'streaming': True,
+			'latency': round(ttft if ttft > 0 else (time.time() - start_time), 3),
+			'duration': round(time.time() - start_time, 3),
+			'ttft': round(ttft, 3) if ttft > 0 else None,
+			'sentiment': random.choice(['positive', 'neutral', 'neutral', 'neutral', 'negative']),
+			'intent': 'general_query' if use_rag else 'chit_chat'
+		}
+
+	@staticmethod
+	def stored_turn_events(user_msg: ChatMessage, assistant_msg: ChatMessage):
+		"""The stream events of an already-persisted turn (idempotent replays)"""
+		metadata = assistant_msg.metadata or {}
+		timings = TimingSketches.samples(metadata)
+		yield ('sources', metadata.get('retrieved_docs', []))
+		yield ('token', assistant_msg.content)
+		yield ('done', {
+			'message_id': assistant_msg.id,
+			'user_message_id': user_msg.id,
+			'turn_id': assistant_msg.turn_id,
+			'created_at': assistant_msg.created_at,
+			'latency': timings['latency'],
+			'ttft': timings['ttft'],
+			'tokens': {'prompt': None, 'completion': assistant_msg.tokens_used},
+			'cancelled': bool(metadata.get('cancelled')),
+		})
+
+	@staticmethod
+	def _cancellation_metadata(generated_tokens: int, start_time: float) -> dict:
+		"""
+		Flag a cancelled stream and estimate what stopping early saved,
+		against the average of recent completed streamed responses.
+		"""
+		elapsed = time.time() - start_time
+		recent = list(
+			ChatMessage.objects.filter(role='assistant', metadata__streaming=True, tokens_used__isnull=False)
+			.exclude(metadata__cancelled=True)
+			.order_by('-created_at')
+			.values_list('tokens_used', 'metadata')[:CANCELLATION_BASELINE_SIZE]
+		)
+		durations = [m['duration'] for _, m in recent if m and m.get('duration')]
+		expected_tokens = sum(t for t, _ in recent) / len(recent) if recent else generated_tokens
+		expected_seconds = sum(durations) / len(durations) if durations else elapsed
+
+		metadata = {
+			'cancelled': True,
+			'tokens_saved': max(0, round(expected_tokens - generated_tokens)),
+			'seconds_saved': round(max(0.0, expected_seconds - elapsed), 3),
+		}
+		logger.info(
+			f"Stream cancelled after {elapsed:.1f}s ({generated_tokens} tokens); "
+			f"saved ~{metadata['tokens_saved']} tokens, ~{metadata['seconds_saved']}s"
+		)
+		return metadata
 
 	def process_user_message(
 		self,
@@ -142,7 +381,8 @@ class RAGService:
 		user_message: str,
 		use_rag: bool = True,
 		top_k: int = 3,
-		temperature: float = 0.3
+		temperature: float = 0.3,
+		turn_id: Optional[uuid.UUID] = None
 	) -> Tuple[ChatMessage, ChatMessage]:
 		"""
 		Complete RAG pipeline: NLU → Search → Context → NLG → Persist
@@ -153,30 +393,32 @@ class RAGService:
 			use_rag: Whether to use FAISS retrieval
 			top_k: Number of context docs to retrieve
 			temperature: Gemini creativity (0.0-1.0)
+			turn_id: Id for the persisted turn (e.g. claimed by an Idempotency-Key)
 		
 		Returns:
 			(user_message_obj, assistant_message_obj)
 		"""
 		
-		# ============ STEP 0: Start timer ============
+		# ============ STEP 0: Start timer, pick degradation level ============
 		start_time = time.time()
+		plan = degradation.current_plan()
+		top_k = plan.retrieval_k(top_k)
 
-		# ============ STEP 1: Save user message ============
-		user_msg = ChatMessage.objects.create(
-			session=session,
-			role='user',
-			content=user_message
-		)
-		
-		# ============ STEP 2: NLU - Generate embedding ============
-		# Convert user message to semantic vector
+		# Store the question before anything can fail, so a failed turn never loses it
+		user_msg = TurnStore.persist_user_message(session, user_message, turn_id)
+
+		# ============ STEP 1-2: NLU - Generate embedding ============
+		# Convert user message to semantic vector (cached, so the post-turn
+		# task stores it without recomputing)
+		timings = {}
+		step = time.time()
 		query_embedding = self.embedding_service.get_embedding(user_message)
-		user_msg.embedding = query_embedding
-		user_msg.save()
+		timings['embedding_time'] = self._elapsed(step)
 		
 		# ============ STEP 3: Semantic Search - Retrieve context ============
 		retrieved_context = ""
 		retrieved_docs = []
+		step = time.time()
 		
 		if use_rag:
 			# Defensive: skip FAISS search if index has zero vectors (common on fresh installs)
@@ -208,10 +450,11 @@ class RAGService:
 					context_items.append(f"{i}. {trim_to_sentence(doc['text'], 350)}")
 				
 				retrieved_context = "\n".join(context_items)
+		timings['retrieval_time'] = self._elapsed(step)
 		
 		# ============ STEP 4: Get conversation history ============
-		# Provide last 3 messages for speed
-		history = self._get_conversation_history(session, limit=3)
+		# Provide last 3 messages for speed (skipped under load)
+		history = self._get_conversation_history(session, limit=3) if plan.use_history else ""
 		
 		# ============ STEP 5: Context Injection + NLG ============
 		# Send to Gemini with context and conversation history
@@ -220,31 +463,31 @@ class RAGService:
 			final_context = f"Conversation History:\n{history}\n\n" + final_context
 		
 		# Call LLM to generate response; handle graceful fallback if LLM is unavailable
-		response_data = self.llm_service.generate_response(
-			prompt=user_message,
-			context=final_context if final_context else None,
-			temperature=temperature,
-		)
+		# (at the last degradation level the LLM is skipped altogether)
+		if plan.use_llm:
+			llm_start = time.time()
+			response_data = self.llm_service.generate_response(
+				prompt=user_message,
+				context=final_context if final_context else None,
+				temperature=temperature,
+				**self._llm_limits(plan)
+			)
+			if not response_data.get('fallback'):
+				ttft_window.record(time.time() - llm_start)
+		else:
+			response_data = {'fallback': True}
 
 		# If the LLM returned a fallback indicator or failed, provide a FAISS-only or generic fallback
 		if response_data.get('fallback'):
-			if retrieved_context:
-				assistant_text = "Here’s what I found from the knowledge base:\n\n" + retrieved_context
-			else:
-				assistant_text = "⚠️ I’m temporarily unavailable due to high load. Please retry shortly."
+			response_data = {"text": self._fallback_text(retrieved_context), "tokens_used": 0, "fallback": True}
 
-			response_data = {"text": assistant_text, "tokens_used": 0, "fallback": True}
-
-		# ============ STEP 6: Generate embedding of response ============
-		response_embedding = self.embedding_service.get_embedding(response_data['text'])
-		
-		# ============ STEP 7: Persist AI response ============
-		assistant_msg = ChatMessage.objects.create(
+		# ============ STEP 6: Persist the reply (one transaction) ============
+		# Response embedding and enrichment run post-turn in the background
+		assistant_msg = TurnStore.persist_reply(
 			session=session,
-			role='assistant',
-			content=response_data['text'],
+			user_msg=user_msg,
+			assistant_content=response_data['text'],
 			tokens_used=response_data.get('tokens_used', 0),
-			embedding=response_embedding,
 			metadata={
 				'retrieved_docs': [
 					{
@@ -257,12 +500,12 @@ class RAGService:
 				'fallback': response_data.get('fallback', False),
 				'latency': round(time.time() - start_time, 3),
 				'sentiment': random.choice(['positive', 'neutral', 'neutral', 'neutral', 'negative']),
-				'intent': 'general_query' if use_rag else 'chit_chat'
+				'intent': 'general_query' if use_rag else 'chit_chat',
+				'degradation_level': plan.level,
+				**timings
 			}
 		)
-		
-		# Update session's last updated time
-		session.save()
+		TimingSketches.record(assistant_msg.metadata)
 		
 		return user_msg, assistant_msg
 	
@@ -271,8 +514,17 @@ class RAGService:
 		Get last N messages as formatted conversation history
 		Provides context for coherent multi-turn conversation
 		"""
-		messages = session.messages.order_by('-created_at')[:limit]
-		
+		messages = session.messages.order_by('-created_at').only('role', 'content')[:limit]
+		return self._format_history(list(messages))
+	
+	async def _aget_conversation_history(self, session: ChatSession, limit: int = 5) -> str:
+		"""Async ORM variant of _get_conversation_history"""
+		messages = session.messages.order_by('-created_at').only('role', 'content')[:limit]
+		return self._format_history([msg async for msg in messages])
+	
+	@staticmethod
+	def _format_history(messages: List[ChatMessage]) -> str:
+		"""Format newest-first messages as a chronological transcript"""
 		if not messages:
 			return ""
 		
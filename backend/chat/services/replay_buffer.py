@@ -0,0 +1,203 @@
+"""
+Stream Replay Buffer
+Keeps the recent SSE frames of an in-flight generation in the shared cache
+so a dropped client can reconnect with Last-Event-ID and resume
+"""
+
+import time
+from typing import Iterable, List, Optional, Tuple
+
+from django.conf import settings
+from django.core.cache import cache
+
+
+class ReplayBuffer:
+	"""
+	Bounded, cache-backed frame log for one chat turn
+
+	Layout (all keys expire after SSE_REPLAY_TTL_SECONDS):
+	- stream:{turn_id}:meta   → {'user_id', 'last_id', 'done'}
+	- stream:{turn_id}:{id}   → the SSE frame with that event id
+	- stream:{turn_id}:subscribers / :detached_at → connected clients, and
+	  when the last one left (lets the generation cancel itself)
+
+	Only the last SSE_REPLAY_MAX_EVENTS frames are kept. Frames are written
+	before the meta record that advertises them, so a reader never sees an
+	id whose frame has not been stored yet. Frames without an id
+	(heartbeats) are not buffered.
+	"""
+
+	def __init__(self, turn_id, max_events: int = None, ttl: int = None):
+		self.turn_id = str(turn_id)
+		self.max_events = max_events or getattr(settings, 'SSE_REPLAY_MAX_EVENTS', 500)
+		self.ttl = ttl or getattr(settings, 'SSE_REPLAY_TTL_SECONDS', 300)
+		self._meta = None
+
+	@property
+	def meta_key(self) -> str:
+		return f"stream:{self.turn_id}:meta"
+
+	def frame_key(self, event_id: int) -> str:
+		return f"stream:{self.turn_id}:{event_id}"
+
+	@staticmethod
+	def frame_id(frame: str) -> Optional[int]:
+		"""Event id of a serialised frame (None for comments/heartbeats)"""
+		if not frame.startswith('id: '):
+			return None
+		return int(frame[4:frame.index('\n')])
+
+	# Writer side (the generation)
+
+	def open(self, user_id):
+		"""Register the turn before the first frame is produced"""
+		self._meta = {'user_id': str(user_id), 'last_id': 0, 'done': False}
+		cache.set(self.meta_key, self._meta, timeout=self.ttl)
+
+	def _writes(self, frames: Iterable[str]) -> Tuple[dict, List[str]]:
+		previous = self._meta['last_id']
+		values = {}
+		for frame in frames:
+			event_id = self.frame_id(frame)
+			if event_id is not None:
+				values[self.frame_key(event_id)] = frame
+				self._meta['last_id'] = event_id
+		if not values:
+			return {}, []
+		values[self.meta_key] = dict(self._meta)
+
+		# Ids that just fell out of the window
+		evicted = range(max(1, previous - self.max_events + 1), self._meta['last_id'] - self.max_events + 1)
+		return values, [self.frame_key(i) for i in evicted]
+
+	def append(self, frames: Iterable[str]):
+		values, evicted = self._writes(frames)
+		if values:
+			cache.set_many(values, timeout=self.ttl)
+		if evicted:
+			cache.delete_many(evicted)
+
+	async def aappend(self, frames: Iterable[str]):
+		values, evicted = self._writes(frames)
+		if values:
+			await cache.aset_many(values, timeout=self.ttl)
+		if evicted:
+			await cache.adelete_many(evicted)
+
+	def finish(self):
+		self._meta['done'] = True
+		cache.set(self.meta_key, self._meta, timeout=self.ttl)
+
+	async def afinish(self):
+		self._meta['done'] = True
+		await cache.aset(self.meta_key, self._meta, timeout=self.ttl)
+
+	# Subscribers (connections currently receiving the stream)
+
+	@property
+	def subscribers_key(self) -> str:
+		return f"stream:{self.turn_id}:subscribers"
+
+	@property
+	def detached_key(self) -> str:
+		return f"stream:{self.turn_id}:detached_at"
+
+	ATTACH_ATTEMPTS = 3
+
+	def attach(self):
+		# The counter can expire between add and incr; re-create it rather
+		# than fail the (re)connecting request
+		for _ in range(self.ATTACH_ATTEMPTS):
+			cache.add(self.subscribers_key, 0, timeout=self.ttl)
+			try:
+				cache.incr(self.subscribers_key)
+				return
+			except ValueError:
+				continue
+		cache.set(self.subscribers_key, 1, timeout=self.ttl)
+
+	async def aattach(self):
+		for _ in range(self.ATTACH_ATTEMPTS):
+			await cache.aadd(self.subscribers_key, 0, timeout=self.ttl)
+			try:
+				await cache.aincr(self.subscribers_key)
+				return
+			except ValueError:
+				continue
+		await cache.aset(self.subscribers_key, 1, timeout=self.ttl)
+
+	def detach(self):
+		try:
+			remaining = cache.decr(self.subscribers_key)
+		except ValueError:
+			remaining = 0
+		if remaining <= 0:
+			cache.set(self.detached_key, time.time(), timeout=self.ttl)
+
+	async def adetach(self):
+		try:
+			remaining = await cache.adecr(self.subscribers_key)
+		except ValueError:
+			remaining = 0
+		if remaining <= 0:
+			await cache.aset(self.detached_key, time.time(), timeout=self.ttl)
+
+	def _abandoned_for(self, values: dict) -> float:
+		if values.get(self.subscribers_key, 0) > 0:
+			return 0.0
+		detached_at = values.get(self.detached_key)
+		return time.time() - detached_at if detached_at else 0.0
+
+	def abandoned_for(self) -> float:
+		"""Seconds since the last subscriber disconnected (0 while anyone is attached)"""
+		return self._abandoned_for(cache.get_many([self.subscribers_key, self.detached_key]))
+
+	async def aabandoned_for(self) -> float:
+		return self._abandoned_for(await cache.aget_many([self.subscribers_key, self.detached_key]))
+
+	# Reader side (a reconnecting client)
+
+	def owner(self) -> Optional[str]:
+		"""User id the turn belongs to, or None if the buffer is gone"""
+		meta = cache.get(self.meta_key)
+		return meta['user_id'] if meta else None
+
+	async def aowner(self) -> Optional[str]:
+		meta = await cache.aget(self.meta_key)
+		return meta['user_id'] if meta else None
+
+	def _range(self, meta: Optional[dict], after: int) -> Optional[List[str]]:
+		if meta is None:
+			return None
+		first_kept = max(1, meta['last_id'] - self.max_events + 1)
+		if after + 1 < first_kept:
+			return None
+		return [self.frame_key(i) for i in range(after + 1, meta['last_id'] + 1)]
+
+	@staticmethod
+	def _collect(keys: List[str], found: dict) -> Optional[List[str]]:
+		if len(found) < len(keys):
+			return None  # evicted underneath us
+		return [found[k] for k in keys]
+
+	def read_after(self, after: int) -> Optional[Tuple[List[str], bool]]:
+		"""
+		Frames with id > after, and whether the generation has finished.
+
+		Returns None when the turn is unknown or the requested position has
+		already been evicted (the client must fall back to a full reload).
+		"""
+		meta = cache.get(self.meta_key)
+		keys = self._range(meta, after)
+		if keys is None:
+			return None
+		frames = self._collect(keys, cache.get_many(keys)) if keys else []
+		return None if frames is None else (frames, meta['done'])
+
+	async def aread_after(self, after: int) -> Optional[Tuple[List[str], bool]]:
+		meta = await cache.aget(self.meta_key)
+		keys = self._range(meta, after)
+		if keys is None:
+			return None
+		frames = self._collect(keys, await cache.aget_many(keys)) if keys else []
+		return None if frames is None else (frames, meta['done'])
@@ -0,0 +1,62 @@
+"""
+Log Search Index
+Current DDL of the full-text index behind admin log search, run by
+LogSearchService.install(); migration 0018 keeps its own frozen copy
+"""
+
+from typing import List
+
+# SQLite: external-content FTS5 tables over the tables' implicit rowid,
+# synced by triggers. A table rebuild drops the triggers, and it or a
+# VACUUM renumbers the rowids, so LogSearchService.problems() checks both.
+SQLITE_TABLES = {
+	'chat_chatmessage_fts': ('chat_chatmessage', 'content'),
+	'chat_chatsession_fts': ('chat_chatsession', 'title'),
+}
+
+
+def sqlite_triggers(fts: str) -> List[str]:
+	return [f"{fts}_ai", f"{fts}_ad", f"{fts}_au"]
+
+
+def _sqlite_schema(fts: str, table: str, column: str) -> List[str]:
+	ai, ad, au = sqlite_triggers(fts)
+	return [
+		f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+		f" {column}, content='{table}', content_rowid='rowid', tokenize='porter unicode61')",
+		f"CREATE TRIGGER IF NOT EXISTS {ai} AFTER INSERT ON {table} BEGIN"
+		f" INSERT INTO {fts}(rowid, {column}) VALUES (new.rowid, new.{column}); END",
+		f"CREATE TRIGGER IF NOT EXISTS {ad} AFTER DELETE ON {table} BEGIN"
+		f" INSERT INTO {fts}({fts}, rowid, {column}) VALUES ('delete', old.rowid, old.{column}); END",
+		f"CREATE TRIGGER IF NOT EXISTS {au} AFTER UPDATE OF {column} ON {table} BEGIN"
+		f" INSERT INTO {fts}({fts}, rowid, {column}) VALUES ('delete', old.rowid, old.{column});"
+		f" INSERT INTO {fts}(rowid, {column}) VALUES (new.rowid, new.{column}); END",
+	]
+
+
+SQLITE_SCHEMA = [sql for fts, (table, column) in SQLITE_TABLES.items() for sql in _sqlite_schema(fts, table, column)]
+
+# Repopulates each index from its table
+SQLITE_REBUILD = [f"INSERT INTO {fts}({fts}) VALUES ('rebuild')" for fts in SQLITE_TABLES]
+
+SQLITE_DROP = [
+	sql for fts in SQLITE_TABLES
+	for sql in [f"DROP TRIGGER IF EXISTS {name}" for name in sqlite_triggers(fts)] + [f"DROP TABLE IF EXISTS {fts}"]
+]
+
+# PostgreSQL: generated tsvector columns with GIN indexes
+POSTGRES_SCHEMA = [
+	"ALTER TABLE chat_chatmessage ADD COLUMN search_vector tsvector"
+	" GENERATED ALWAYS AS (to_tsvector('english', coalesce(content, ''))) STORED",
+	"CREATE INDEX chat_chatmessage_search_gin ON chat_chatmessage USING GIN (search_vector)",
+	"ALTER TABLE chat_chatsession ADD COLUMN search_vector tsvector"
+	" GENERATED ALWAYS AS (to_tsvector('english', coalesce(title, ''))) STORED",
+	"CREATE INDEX chat_chatsession_search_gin ON chat_chatsession USING GIN (search_vector)",
+]
+
+POSTGRES_DROP = [
+	"DROP INDEX IF EXISTS chat_chatmessage_search_gin",
+	"ALTER TABLE chat_chatmessage DROP COLUMN IF EXISTS search_vector",
+	"DROP INDEX IF EXISTS chat_chatsession_search_gin",
+	"ALTER TABLE chat_chatsession DROP COLUMN IF EXISTS search_vector",
+]
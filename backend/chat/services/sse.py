@@ -0,0 +1,420 @@
+"""
+Server-Sent Events protocol for chat streams
+
+Frames:
+- event: token    data: {"text": "..."}           (coalesced LLM output)
+- event: sources  data: [{"source": ..., "text": ...}]
+- event: done     data: {"message_id", "user_message_id", "turn_id", "latency", "ttft", "tokens"}
+- event: error    data: {"error": "..."}
+- ": ping" comments as heartbeats while idle
+
+Every event carries a monotonically increasing id. Payloads are JSON, so
+text containing newlines can't break framing.
+
+Streams started with a ReplayBuffer can be resumed after a dropped
+connection: the client reconnects to the turn's resume endpoint with
+Last-Event-ID and receives the missed frames, then the live tail. Once
+no client has been attached for SSE_DISCONNECT_GRACE_SECONDS the
+generation is cancelled and its partial response persisted.
+"""
+
+import asyncio
+import json
+import logging
+import queue
+import threading
+import time
+from typing import AsyncIterable, Iterable, List, Optional
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import connections
+from django.http import HttpResponse, StreamingHttpResponse
+
+from .replay_buffer import ReplayBuffer
+
+logger = logging.getLogger(__name__)
+
+HEARTBEAT = ": ping\n\n"
+CONNECTED = ": connected\n\n"
+_END = object()
+
+
+def format_event(event: str, data, event_id: Optional[int] = None) -> str:
+	"""Serialise one SSE frame"""
+	frame = f"id: {event_id}\n" if event_id is not None else ""
+	return frame + f"event: {event}\ndata: {json.dumps(data, cls=DjangoJSONEncoder)}\n\n"
+
+
+class SSEEncoder:
+	"""
+	Turns pipeline events into SSE frames
+
+	- Token text is coalesced until flush_bytes accumulate or flush_interval
+	  passes since the first buffered token
+	- Any other event flushes pending tokens first, preserving order
+	- A heartbeat comment is due after heartbeat_interval without output
+	"""
+
+	def __init__(self, flush_interval: float = None, flush_bytes: int = None, heartbeat_interval: float = None, start_id: int = 0):
+		self.flush_interval = flush_interval if flush_interval is not None else getattr(settings, 'SSE_FLUSH_INTERVAL_MS', 50) / 1000
+		self.flush_bytes = flush_bytes if flush_bytes is not None else getattr(settings, 'SSE_FLUSH_BYTES', 512)
+		self.heartbeat_interval = heartbeat_interval if heartbeat_interval is not None else getattr(settings, 'SSE_HEARTBEAT_SECONDS', 15)
+		self.last_id = start_id
+		self._buffer: List[str] = []
+		self._buffered = 0
+		self._first_buffered_at = None
+		self._last_write = time.monotonic()
+
+	def timeout(self) -> float:
+		"""Seconds until a forced flush or heartbeat is due"""
+		now = time.monotonic()
+		if self._buffer:
+			return max(0.0, self._first_buffered_at + self.flush_interval - now)
+		return max(0.0, self._last_write + self.heartbeat_interval - now)
+
+	def feed(self, event: str, data) -> List[str]:
+		if event == 'token':
+			if not data:
+				return []
+			if not self._buffer:
+				self._first_buffered_at = time.monotonic()
+			self._buffer.append(data)
+			self._buffered += len(data)
+			if self._buffered >= self.flush_bytes:
+				return self._flush()
+			return []
+		return self._flush() + [self._emit(event, data)]
+
+	def tick(self) -> List[str]:
+		"""Called when timeout() elapsed with no new event"""
+		if self._buffer:
+			return self._flush()
+		self._last_write = time.monotonic()
+		return [HEARTBEAT]
+
+	def close(self) -> List[str]:
+		return self._flush()
+
+	def _flush(self) -> List[str]:
+		if not self._buffer:
+			return []
+		text = "".join(self._buffer)
+		self._buffer = []
+		self._buffered = 0
+		return [self._emit('token', {'text': text})]
+
+	def _emit(self, event: str, data) -> str:
+		self.last_id += 1
+		self._last_write = time.monotonic()
+		return format_event(event, data, self.last_id)
+
+
+def _error_event(e: Exception):
+	logger.exception(f"Chat stream failed: {e}")
+	return ('error', {'error': 'Sorry, something went wrong. Please try again in a moment.'})
+
+
+class _DisconnectWatch:
+	"""
+	Cancels a detached generation nobody is listening to
+
+	With a replay buffer the generation survives its connection, so it is
+	only cancelled once no client has been attached for
+	SSE_DISCONNECT_GRACE_SECONDS (time to reconnect). The shared cache is
+	checked at most once per CHECK_INTERVAL.
+	"""
+
+	CHECK_INTERVAL = 1.0
+
+	def __init__(self, buffer: Optional[ReplayBuffer], cancel: Optional[threading.Event]):
+		self.buffer = buffer
+		self.cancel = cancel
+		self.grace = getattr(settings, 'SSE_DISCONNECT_GRACE_SECONDS', 10)
+		self._next_check = time.monotonic() + self.CHECK_INTERVAL
+
+	def wait_timeout(self, encoder: SSEEncoder) -> float:
+		if self.cancel is None or self.buffer is None:
+			return encoder.timeout()
+		return min(encoder.timeout(), self.CHECK_INTERVAL)
+
+	def _due(self) -> bool:
+		if self.cancel is None or self.buffer is None or self.cancel.is_set():
+			return False
+		now = time.monotonic()
+		if now < self._next_check:
+			return False
+		self._next_check = now + self.CHECK_INTERVAL
+		return True
+
+	def _expired(self, abandoned_for: float) -> bool:
+		return abandoned_for > 0 and abandoned_for >= self.grace
+
+	def poll(self):
+		if self._due() and self._expired(self.buffer.abandoned_for()):
+			self.cancel.set()
+
+	async def apoll(self):
+		if self._due() and self._expired(await self.buffer.aabandoned_for()):
+			self.cancel.set()
+
+
+def stream_sync(
+	events: Iterable,
+	encoder: SSEEncoder = None,
+	buffer: ReplayBuffer = None,
+	cancel: threading.Event = None
+):
+	"""
+	SSE frames for a sync event iterator.
+
+	The pipeline runs on its own thread and a pump thread encodes its
+	output, so coalesced tokens are flushed on time and heartbeats go out
+	while the LLM is silent. With a replay buffer, the generation is
+	detached from the connection: it keeps running (and buffering) if the
+	client goes away, so a reconnect can resume it. `cancel` is the
+	pipeline's cancellation flag; it is set once the client is gone for
+	good (immediately when there is no buffer to resume from).
+	"""
+	encoder = encoder or SSEEncoder()
+	watch = _DisconnectWatch(buffer, cancel)
+	pending = queue.Queue()
+	frames = queue.Queue()
+
+	def produce():
+		try:
+			for item in events:
+				pending.put(item)
+		except Exception as e:
+			pending.put(_error_event(e))
+		finally:
+			pending.put(_END)
+			connections.close_all()  # this thread's DB connections
+
+	def publish(batch):
+		if buffer is not None:
+			buffer.append(batch)
+		for frame in batch:
+			frames.put(frame)
+
+	def pump():
+		try:
+			while True:
+				watch.poll()
+				try:
+					item = pending.get(timeout=watch.wait_timeout(encoder))
+				except queue.Empty:
+					if encoder.timeout() <= 0:
+						publish(encoder.tick())
+					continue
+				if item is _END:
+					break
+				publish(encoder.feed(*item))
+			publish(encoder.close())
+		finally:
+			if buffer is not None:
+				buffer.finish()
+			frames.put(_END)
+
+	if buffer is not None:
+		buffer.attach()
+	threading.Thread(target=produce, daemon=True).start()
+	threading.Thread(target=pump, daemon=True).start()
+
+	try:
+		yield CONNECTED
+		while True:
+			frame = frames.get()
+			if frame is _END:
+				break
+			yield frame
+	finally:
+		# Runs on normal completion and when the server closes the
+		# response because the client disconnected
+		if buffer is not None:
+			buffer.detach()
+		elif cancel is not None:
+			cancel.set()
+
+
+# Detached generations must not be garbage collected mid-run
+_background_tasks = set()
+
+
+def _detach(coro) -> asyncio.Task:
+	task = asyncio.ensure_future(coro)
+	_background_tasks.add(task)
+	task.add_done_callback(_background_tasks.discard)
+	return task
+
+
+async def stream_async(
+	events: AsyncIterable,
+	encoder: SSEEncoder = None,
+	buffer: ReplayBuffer = None,
+	cancel: threading.Event = None
+):
+	"""SSE frames for an async event iterator (see stream_sync)"""
+	encoder = encoder or SSEEncoder()
+	watch = _DisconnectWatch(buffer, cancel)
+	pending = asyncio.Queue()
+	frames = asyncio.Queue()
+
+	async def produce():
+		try:
+			async for item in events:
+				await pending.put(item)
+		except Exception as e:
+			await pending.put(_error_event(e))
+		finally:
+			await pending.put(_END)
+
+	async def publish(batch):
+		if buffer is not None:
+			await buffer.aappend(batch)
+		for frame in batch:
+			frames.put_nowait(frame)
+
+	async def pump():
+		try:
+			while True:
+				await watch.apoll()
+				try:
+					item = await asyncio.wait_for(pending.get(), timeout=watch.wait_timeout(encoder))
+				except asyncio.TimeoutError:
+					if encoder.timeout() <= 0:
+						await publish(encoder.tick())
+					continue
+				if item is _END:
+					break
+				await publish(encoder.feed(*item))
+			await publish(encoder.close())
+		finally:
+			if buffer is not None:
+				await buffer.afinish()
+			frames.put_nowait(_END)
+
+	if buffer is not None:
+		await buffer.aattach()
+	tasks = [_detach(produce()), _detach(pump())]
+	try:
+		yield CONNECTED
+		while True:
+			frame = await frames.get()
+			if frame is _END:
+				break
+			yield frame
+	finally:
+		# Under ASGI a client disconnect cancels the response (lands here)
+		if buffer is not None:
+			await buffer.adetach()
+		elif cancel is not None:
+			cancel.set()
+		else:
+			for task in tasks:
+				task.cancel()
+
+
+def _replay_unavailable() -> str:
+	return format_event('error', {
+		'error': 'This response can no longer be resumed.',
+		'code': 'replay_unavailable'
+	})
+
+
+def _poll_interval() -> float:
+	return getattr(settings, 'SSE_REPLAY_POLL_MS', 100) / 1000
+
+
+def resume_sync(buffer: ReplayBuffer, last_event_id: int):
+	"""
+	SSE frames after last_event_id for a buffered generation: first the
+	backlog, then the live tail (polled from the shared cache) until the
+	generation finishes.
+	"""
+	heartbeat_interval = getattr(settings, 'SSE_HEARTBEAT_SECONDS', 15)
+	last_write = time.monotonic()
+
+	buffer.attach()
+	try:
+		yield CONNECTED
+		while True:
+			result = buffer.read_after(last_event_id)
+			if result is None:
+				yield _replay_unavailable()
+				return
+			batch, finished = result
+			if batch:
+				yield from batch
+				last_event_id = ReplayBuffer.frame_id(batch[-1])
+				last_write = time.monotonic()
+			if finished:
+				return
+			if time.monotonic() - last_write >= heartbeat_interval:
+				yield HEARTBEAT
+				last_write = time.monotonic()
+			time.sleep(_poll_interval())
+	finally:
+		buffer.detach()
+
+
+async def resume_async(buffer: ReplayBuffer, last_event_id: int):
+	"""Async counterpart of resume_sync"""
+	heartbeat_interval = getattr(settings, 'SSE_HEARTBEAT_SECONDS', 15)
+	last_write = time.monotonic()
+
+	await buffer.aattach()
+	try:
+		yield CONNECTED
+		while True:
+			result = await buffer.aread_after(last_event_id)
+			if result is None:
+				yield _replay_unavailable()
+				return
+			batch, finished = result
+			for frame in batch:
+				yield frame
+			if batch:
+				last_event_id = ReplayBuffer.frame_id(batch[-1])
+				last_write = time.monotonic()
+			if finished:
+				return
+			if time.monotonic() - last_write >= heartbeat_interval:
+				yield HEARTBEAT
+				last_write = time.monotonic()
+			await asyncio.sleep(_poll_interval())
+	finally:
+		await buffer.adetach()
+
+
+def last_event_id(request) -> int:
+	"""Resume position from the Last-Event-ID header (or ?last_event_id=)"""
+	value = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id') or 0
+	try:
+		return max(0, int(value))
+	except (TypeError, ValueError):
+		return 0
+
+
+def sse_response(frames, turn_id=None) -> StreamingHttpResponse:
+	response = StreamingHttpResponse(frames, content_type="text/event-stream")
+	response['Cache-Control'] = 'no-cache'
+	response['X-Accel-Buffering'] = 'no'  # disable proxy buffering (nginx)
+	if turn_id is not None:
+		response['X-Turn-Id'] = str(turn_id)  # resume handle for reconnects
+	return response
+
+
+def sse_complete_response(events: Iterable, turn_id=None) -> HttpResponse:
+	"""An SSE body for an already-finished event sequence (nothing to wait for)"""
+	encoder = SSEEncoder()
+	frames = [CONNECTED]
+	for item in events:
+		frames.extend(encoder.feed(*item))
+	frames.extend(encoder.close())
+
+	response = HttpResponse("".join(frames), content_type="text/event-stream")
+	response['Cache-Control'] = 'no-cache'
+	if turn_id is not None:
+		response['X-Turn-Id'] = str(turn_id)
+	return response
@@ -0,0 +1,145 @@
+"""
+Turn Persistence
+Writes a completed chat turn in one transaction with minimal statements
+"""
+
+import uuid
+from typing import Optional, Tuple
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from chat.models import ChatSession, ChatMessage
+from .live_analytics import live_channel
+from .post_turn import PostTurnProcessor
+from .quantiles import TimingSketches
+
+
+class TurnStore:
+	"""
+	Persistence layer for chat turns
+
+	The pipelines write a turn in two steps:
+	1. persist_user_message, before anything can fail (embedding,
+	   retrieval, generation), so the user's question is never lost
+	2. persist_reply once the answer is complete
+	persist_turn writes both at once when the whole turn is known.
+
+	Each step is one transaction: an INSERT (the reply's metric columns are
+	filled from its metadata) and one targeted UPDATE of the session's
+	updated_at and denormalized counters (message_count, total_tokens via
+	F() so concurrent turns don't lose increments; last_message_at/_preview
+	from the newest row). Embeddings and enrichment are handled by
+	PostTurnProcessor after the reply commits, when the turn is also
+	published to live admin dashboards (live_analytics).
+	"""
+
+	@staticmethod
+	def _bump_session(session: ChatSession, newest: ChatMessage, messages: int, tokens: int):
+		"""Counters and last-message snapshot; call inside the writing transaction"""
+		snapshot = {
+			'updated_at': timezone.now(),
+			'last_message_at': newest.created_at,
+			'last_message_preview': ChatSession.preview(newest.content),
+		}
+		ChatSession.objects.filter(pk=session.pk).update(
+			message_count=F('message_count') + messages,
+			total_tokens=F('total_tokens') + tokens,
+			**snapshot
+		)
+		for field, value in snapshot.items():
+			setattr(session, field, value)
+
+	@staticmethod
+	def _on_reply_commit(session: ChatSession, assistant_msg: ChatMessage):
+		transaction.on_commit(lambda: PostTurnProcessor.schedule(session.id))
+		transaction.on_commit(lambda: live_channel.turn_completed(session.id, assistant_msg))
+
+	@staticmethod
+	def persist_user_message(
+		session: ChatSession,
+		content: str,
+		turn_id: Optional[uuid.UUID] = None
+	) -> ChatMessage:
+		"""Persist the user's side of a turn before it is answered"""
+		with transaction.atomic():
+			user_msg = ChatMessage.objects.create(
+				session=session, role='user', content=content, turn_id=turn_id or uuid.uuid4()
+			)
+			TurnStore._bump_session(session, user_msg, messages=1, tokens=0)
+		return user_msg
+
+	@staticmethod
+	def persist_reply(
+		session: ChatSession,
+		user_msg: ChatMessage,
+		assistant_content: str,
+		tokens_used: Optional[int] = None,
+		metadata: Optional[dict] = None
+	) -> ChatMessage:
+		"""Persist the assistant response to a stored user message (same turn_id)"""
+		with transaction.atomic():
+			assistant_msg = ChatMessage.objects.create(
+				session=session,
+				role='assistant',
+				content=assistant_content,
+				turn_id=user_msg.turn_id,
+				tokens_used=tokens_used,
+				metadata=metadata or {},
+				**TurnStore.metric_fields(metadata or {})
+			)
+			TurnStore._bump_session(session, assistant_msg, messages=1, tokens=tokens_used or 0)
+			TurnStore._on_reply_commit(session, assistant_msg)
+		return assistant_msg
+
+	@staticmethod
+	def persist_turn(
+		session: ChatSession,
+		user_content: str,
+		assistant_content: str,
+		tokens_used: Optional[int] = None,
+		metadata: Optional[dict] = None,
+		turn_id: Optional[uuid.UUID] = None
+	) -> Tuple[ChatMessage, ChatMessage]:
+		"""
+		Persist the user message and assistant response of one turn together
+
+		Returns:
+			(user_message_obj, assistant_message_obj)
+		"""
+		turn_id = turn_id or uuid.uuid4()
+
+		with transaction.atomic():
+			user_msg, assistant_msg = ChatMessage.objects.bulk_create([
+				ChatMessage(session=session, role='user', content=user_content, turn_id=turn_id),
+				ChatMessage(
+					session=session,
+					role='assistant',
+					content=assistant_content,
+					turn_id=turn_id,
+					tokens_used=tokens_used,
+					metadata=metadata or {},
+					**TurnStore.metric_fields(metadata or {})
+				),
+			])
+
+			TurnStore._bump_session(session, assistant_msg, messages=2, tokens=tokens_used or 0)
+			TurnStore._on_reply_commit(session, assistant_msg)
+
+		return user_msg, assistant_msg
+
+	@staticmethod
+	def metric_fields(metadata: dict) -> dict:
+		"""Typed ChatMessage columns for a reply's metadata (latencies in ms)"""
+		timings = TimingSketches.samples(metadata)
+		to_ms = lambda seconds: round(seconds * 1000) if seconds is not None else None
+		return {
+			'latency_ms': to_ms(timings['latency']),
+			'ttft_ms': to_ms(timings['ttft']),
+			'fallback': bool(metadata.get('fallback')),
+			'intent': metadata.get('intent') or '',
+			'sentiment': metadata.get('sentiment') or '',
+			'model': metadata.get('model') or '',
+			'rag_enabled': metadata.get('rag_enabled'),
+		}
@@ -0,0 +1,211 @@
+"""
+Usage Rollups
+Per-day usage totals, so admin analytics cost doesn't grow with history
+"""
+
+from datetime import date, datetime, time, timedelta
+from typing import Optional, Tuple
+
+from django.conf import settings
+from django.db.models import Count, FloatField, IntegerField, Max, Min, Q, Sum
+from django.db.models.fields.json import KeyTextTransform
+from django.db.models.functions import Cast, Coalesce
+from django.utils import timezone
+
+from chat.models import ChatSession, ChatMessage, DailyUsageRollup
+from .cardinality import HyperLogLog
+from .quantiles import TimingSketches
+
+
+class UsageRollupService:
+	"""
+	Maintains DailyUsageRollup and answers windowed usage questions
+
+	- roll_up() (Celery beat) rolls up every closed day after the high-water
+	  mark (the latest rollup date). A day is closed once
+	  ANALYTICS_ROLLUP_GRACE_MINUTES have passed since it ended, which lets
+	  in-flight turns and post-turn bookkeeping land first.
+	- window(days) sums the rollups in the window and computes only the days
+	  after the mark from the messages table. Today, read on every admin
+	  request, costs grouped counts only: its latency sketches come from
+	  the hourly TimingSketches in the cache rather than a pass over the
+	  day's replies.
+	Stats are plain dicts keyed like the rollup fields; latency_sketches
+	and the *_hll user sketches hold live sketch objects until a rollup
+	stores them. Day counters of distinct users don't add up over a
+	window, their sketches do.
+	"""
+
+	COUNTERS = (
+		'sessions', 'messages', 'user_messages', 'assistant_messages', 'active_users', 'engaged_users',
+		'tokens', 'fallbacks', 'cancelled_streams', 'tokens_saved', 'seconds_saved',
+	)
+	BREAKDOWNS = ('intents', 'sentiments')
+	USER_SKETCHES = ('active_users_hll', 'engaged_users_hll')
+
+	@staticmethod
+	def day_bounds(day: date) -> Tuple[datetime, datetime]:
+		start = timezone.make_aware(datetime.combine(day, time.min))
+		return start, start + timedelta(days=1)
+
+	@classmethod
+	def empty(cls) -> dict:
+		stats = {name: 0 for name in cls.COUNTERS}
+		stats.update({name: {} for name in cls.BREAKDOWNS})
+		stats['latency_sketches'] = TimingSketches.empty()
+		stats.update({name: HyperLogLog() for name in cls.USER_SKETCHES})
+		return stats
+
+	@classmethod
+	def merge(cls, total: dict, stats) -> dict:
+		"""Add a stats dict (or DailyUsageRollup) into total"""
+		get = stats.get if isinstance(stats, dict) else lambda name: getattr(stats, name)
+		for name in cls.COUNTERS:
+			total[name] += get(name)
+		for name in cls.BREAKDOWNS:
+			for key, count in get(name).items():
+				total[name][key] = total[name].get(key, 0) + count
+		sketches = get('latency_sketches')
+		if isinstance(stats, dict):
+			for metric, sketch in sketches.items():
+				total['latency_sketches'][metric].merge(sketch)
+		else:
+			TimingSketches.merge_dicts(total['latency_sketches'], sketches)
+		for name in cls.USER_SKETCHES:
+			sketch = get(name)
+			total[name].merge(sketch if isinstance(sketch, HyperLogLog) else HyperLogLog.from_bytes(sketch))
+		return total
+
+	@classmethod
+	def compute(cls, start: datetime, end: datetime) -> dict:
+		"""Stats for [start, end) straight from the sessions/messages tables"""
+		stats = cls.counts(start, end)
+
+		# Typed columns plus two metadata keys extracted in SQL; the metadata
+		# blob itself (retrieved docs and all) is never loaded
+		replies = ChatMessage.objects.filter(
+			created_at__gte=start, created_at__lt=end, role='assistant'
+		).order_by().values_list('ttft_ms', 'latency_ms', 'metadata__embedding_time', 'metadata__retrieval_time')
+		for timings in replies.iterator(chunk_size=2000):
+			cls._add_timings(stats['latency_sketches'], *timings)
+		return stats
+
+	@classmethod
+	def live(cls, start: datetime, end: datetime) -> dict:
+		"""
+		Stats for [start, end) from aggregate queries, with latency sketches
+		from the hourly cache slots. The slots are whole UTC hours, so a
+		start off the hour also takes in that hour's earlier turns.
+		"""
+		stats = cls.counts(start, end)
+		stats['latency_sketches'] = TimingSketches.since(start, end)
+		return stats
+
+	@classmethod
+	def counts(cls, start: datetime, end: datetime) -> dict:
+		"""Every stat for [start, end) but the latency sketches, in aggregate queries"""
+		stats = cls.empty()
+		stats['sessions'] = ChatSession.objects.filter(created_at__gte=start, created_at__lt=end).count()
+
+		messages = ChatMessage.objects.filter(created_at__gte=start, created_at__lt=end)
+		cancelled = Q(role='assistant', metadata__cancelled=True)
+		stats.update(messages.aggregate(
+			messages=Count('id'),
+			user_messages=Count('id', filter=Q(role='user')),
+			assistant_messages=Count('id', filter=Q(role='assistant')),
+			tokens=Coalesce(Sum('tokens_used'), 0),
+			fallbacks=Count('id', filter=Q(role='assistant', fallback=True)),
+			cancelled_streams=Count('id', filter=cancelled),
+			tokens_saved=Coalesce(Sum(cls._metadata_number('tokens_saved', IntegerField()), filter=cancelled), 0),
+			seconds_saved=Coalesce(Sum(cls._metadata_number('seconds_saved', FloatField()), filter=cancelled), 0.0),
+		))
+
+		per_user = messages.filter(role='user').values('session__user').annotate(n=Count('id'))
+		for user_id, n in per_user.values_list('session__user', 'n'):
+			stats['active_users'] += 1
+			stats['active_users_hll'].add(user_id)
+			if n > 1:
+				stats['engaged_users'] += 1
+				stats['engaged_users_hll'].add(user_id)
+
+		breakdowns = messages.filter(role='assistant').order_by().values('intent', 'sentiment').annotate(n=Count('id'))
+		for intent, sentiment, n in breakdowns.values_list('intent', 'sentiment', 'n'):
+			for name, value in (('intents', intent or 'unknown'), ('sentiments', sentiment or 'neutral')):
+				stats[name][value] = stats[name].get(value, 0) + n
+		return stats
+
+	@staticmethod
+	def _metadata_number(key: str, output_field):
+		return Cast(KeyTextTransform(key, 'metadata'), output_field)
+
+	@staticmethod
+	def _add_timings(sketches: dict, ttft_ms, latency_ms, embedding, retrieval):
+		to_seconds = lambda ms: ms / 1000 if ms is not None else None
+		sketches['ttft'].add(to_seconds(ttft_ms))
+		sketches['latency'].add(to_seconds(latency_ms))
+		sketches['embedding'].add(embedding)
+		sketches['retrieval'].add(retrieval)
+
+	# Maintenance
+
+	@staticmethod
+	def high_water_mark() -> Optional[date]:
+		return DailyUsageRollup.objects.aggregate(mark=Max('date'))['mark']
+
+	@classmethod
+	def roll_up(cls, now: datetime = None) -> int:
+		"""
+		Roll up closed days after the high-water mark, oldest first, at most
+		ANALYTICS_ROLLUP_MAX_DAYS per run (the first run backfills history
+		over several).
+
+		Returns:
+			Number of days rolled up
+		"""
+		now = now or timezone.now()
+		grace = timedelta(minutes=getattr(settings, 'ANALYTICS_ROLLUP_GRACE_MINUTES', 15))
+		last_closed = timezone.localdate(now - grace) - timedelta(days=1)
+
+		mark = cls.high_water_mark()
+		if mark is not None:
+			day = mark + timedelta(days=1)
+		else:
+			first = ChatSession.objects.aggregate(first=Min('created_at'))['first']
+			if first is None:
+				return 0
+			day = timezone.localdate(first)
+
+		done = 0
+		while day <= last_closed and done < getattr(settings, 'ANALYTICS_ROLLUP_MAX_DAYS', 31):
+			stats = cls.compute(*cls.day_bounds(day))
+			stats['latency_sketches'] = TimingSketches.to_dicts(stats['latency_sketches'])
+			for name in cls.USER_SKETCHES:
+				stats[name] = stats[name].to_bytes()
+			DailyUsageRollup.objects.update_or_create(date=day, defaults=stats)
+			day += timedelta(days=1)
+			done += 1
+		return done
+
+	# Reads
+
+	@classmethod
+	def window(cls, days: int) -> dict:
+		"""Stats for the last `days` calendar days including today"""
+		today = timezone.localdate()
+		first = today - timedelta(days=days - 1)
+		total = cls.empty()
+
+		mark = cls.high_water_mark()
+		live_from = first
+		if mark is not None and mark >= first:
+			for rollup in DailyUsageRollup.objects.filter(date__gte=first, date__lte=mark):
+				cls.merge(total, rollup)
+			live_from = mark + timedelta(days=1)
+
+		today_start = cls.day_bounds(today)[0]
+		if live_from < today:
+			# Closed days the rollup hasn't reached yet (just after midnight,
+			# or before the first run)
+			cls.merge(total, cls.compute(cls.day_bounds(live_from)[0], today_start))
+		cls.merge(total, cls.live(today_start, timezone.now()))
+		return total
@@ -1,22 +1,57 @@
-import os
 from celery import shared_task
-from django.conf import settings
-from chat.services.feedback_pipeline import FeedbackPipeline
-from datetime import datetime
+from chat.services.feedback_export import IncrementalFeedbackExport
 
 @shared_task
 def export_high_quality_feedback_task(min_rating=4):
     """
     Periodic task to export high-quality user feedback for model retraining.
+    Only feedback rated since the last run is exported, as a delta shard.
     """
-    export_dir = os.path.join(settings.BASE_DIR, 'media', 'datasets')
-    os.makedirs(export_dir, exist_ok=True)
-    
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    file_path = os.path.join(export_dir, f'feedback_tuning_{timestamp}.jsonl')
-    
-    count = FeedbackPipeline.export_feedback_dataset(file_path, min_rating)
-    return f"Exported {count} feedback entries to {file_path}"
+    result = IncrementalFeedbackExport(min_rating=min_rating).run()
+    if result['status'] != 'ok':
+        return "Feedback export already running"
+    shard = result['shard']
+    return (
+        f"Exported {shard['entries'] if shard else 0} new feedback entries"
+        f"{' and compacted the dataset' if result['snapshot'] else ''}"
+    )
+
+@shared_task
+def finalize_session_turns_task(session_id):
+    """
+    Post-turn work for a session: embed responses, enrich metadata, bump the session.
+    Idempotent; several quick turns in one session coalesce into one run.
+    """
+    from chat.services.post_turn import PostTurnProcessor
+    count = PostTurnProcessor.finalize_session(session_id)
+    return f"Finalized {count} messages in session {session_id}"
+
+@shared_task
+def purge_expired_idempotency_keys_task():
+    """
+    Periodic task to delete Idempotency-Key records past their retention window.
+    """
+    from chat.services.idempotency import IdempotencyService
+    count = IdempotencyService.purge_expired()
+    return f"Purged {count} expired idempotency keys"
+
+@shared_task
+def purge_sync_tombstones_task():
+    """
+    Periodic task to delete deletion tombstones older than the sync token lifetime.
+    """
+    from chat.services.sync import SyncService
+    count = SyncService.purge_tombstones()
+    return f"Purged {count} sync tombstones"
+
+@shared_task
+def roll_up_daily_usage_task():
+    """
+    Periodic task to roll up closed days into DailyUsageRollup (from the high-water mark).
+    """
+    from chat.services.usage_rollups import UsageRollupService
+    count = UsageRollupService.roll_up()
+    return f"Rolled up {count} days of usage"
 
 @shared_task
 def process_single_feedback_for_rag(message_id):
@@ -1,3 +1,1345 @@
-from django.test import TestCase
+import asyncio
+import json
+import os
+import threading
+import time
+import uuid
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from asgiref.sync import async_to_sync
+
+from django.core.handlers.asgi import ASGIHandler
+from django.core.management import CommandError, call_command
+from django.core.signals import request_finished, request_started
+from django.db import close_old_connections
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.core.cache import cache
+from django.utils import timezone
+from django.db import connection
+from django.contrib.auth import get_user_model
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from chat.checks import search_index_check, shared_cache_check
+from chat.models import ChatSession, ChatMessage, DailyUsageRollup, IdempotencyKey, MessageEmbedding
+from chat.services.admission import admission
+from chat.services.analytics_cache import AnalyticsDashboard
+from chat.services.cardinality import HyperLogLog
+from chat.services.degradation import degradation, llm_breaker, ttft_window
+from chat.services.llm_service import LLMService
+from chat.services.history_index import HistorySearchService, UserHistoryIndex, history_indexes
+from chat.services.live_analytics import live_async, live_channel, live_sync
+from chat.services.log_search import LogSearchService
+from chat.services.post_turn import PostTurnProcessor
+from chat.services.quantiles import DDSketch, TimingSketches
+from chat.services.replay_buffer import ReplayBuffer
+from chat.services.rag_service import RAGService
+from chat.services.sse import SSEEncoder, _DisconnectWatch, format_event, resume_sync, stream_sync
+from chat.services.turn_store import TurnStore
+from chat.services.analytics_service import AnalyticsService
+from chat.services.usage_rollups import UsageRollupService
+
+User = get_user_model()
+
+
+def _vector(*hot):
+    """384-d test vector with 1.0 at the given positions"""
+    vec = [0.0] * 384
+    for i in hot:
+        vec[i] = 1.0
+    return vec
+
+
+class HistorySearchTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        history_indexes.clear()
+        self.user = User.objects.create_user(email='search@example.com', password='password123')
+        self.other = User.objects.create_user(email='other@example.com', password='password123')
+
+        self.cooking = ChatSession.objects.create(user=self.user, title="Cooking")
+        self.travel = ChatSession.objects.create(user=self.user, title="Travel")
+        foreign = ChatSession.objects.create(user=self.other, title="Not mine")
+
+        for session, content, vector in [
+            (self.cooking, "Pasta recipe", _vector(0)),
+            (self.travel, "Flights to Lagos", _vector(1)),
+            (foreign, "Pasta again", _vector(0)),
+        ]:
+            msg = ChatMessage.objects.create(session=session, role='user', content=content)
+            MessageEmbedding.store(msg, vector)
+
+    def test_ranks_sessions_by_best_match(self):
+        results = HistorySearchService(embedding_service=object()).search_by_vector(self.user, _vector(0))
+
+        self.assertEqual(results[0]['id'], self.cooking.id)
+        self.assertEqual(results[0]['matches'][0]['snippet'], "Pasta recipe")
+        self.assertNotIn("Not mine", [r['title'] for r in results])
+
+    def test_index_catches_up_on_new_messages(self):
+        service = HistorySearchService(embedding_service=object())
+        service.search_by_vector(self.user, _vector(2))
+
+        msg = ChatMessage.objects.create(session=self.travel, role='user', content="Museums")
+        MessageEmbedding.store(msg, _vector(2))
+        history_indexes.record_message(self.user.id, msg.id, self.travel.id, _vector(2), msg.created_at)
+
+        results = service.search_by_vector(self.user, _vector(2))
+        self.assertEqual(results[0]['matches'][0]['message_id'], msg.id)
+
+    def test_deleted_messages_leave_the_index(self):
+        service = HistorySearchService(embedding_service=object())
+        noise = ChatSession.objects.create(user=self.user, title="Noise")
+        for i in range(50):
+            msg = ChatMessage.objects.create(session=noise, role='user', content=f"Exact {i}")
+            MessageEmbedding.store(msg, _vector(5))
+        live = ChatMessage.objects.create(session=self.travel, role='user', content="Close enough")
+        MessageEmbedding.store(live, _vector(5, 6))
+        service.search_by_vector(self.user, _vector(5))
+        elsewhere = UserHistoryIndex(self.user.id)  # another process's copy
+        elsewhere.sync()
+
+        client = APIClient()
+        client.force_authenticate(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(client.delete(f'/api/chat/sessions/{noise.id}/').status_code, 204)
+
+        results = service.search_by_vector(self.user, _vector(5))
+        self.assertEqual(results[0]['matches'][0]['message_id'], live.id)
+        self.assertEqual(history_indexes.peek(self.user.id).index.ntotal, 3)
+
+        elsewhere.sync()  # rebuilds on the new epoch
+        self.assertEqual(elsewhere.index.ntotal, 3)
+        self.assertEqual(elsewhere.search(_vector(5), top_k=1)[0]['message_id'], live.id)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(client.delete(f'/api/chat/messages/{live.id}/').status_code, 204)
+        self.assertEqual(history_indexes.peek(self.user.id).index.ntotal, 2)
+
+
+class MessageEmbeddingTest(TestCase):
+    def setUp(self):
+        user = User.objects.create_user(email='vectors@example.com', password='password123')
+        session = ChatSession.objects.create(user=user, title="Vectors")
+        self.msg = ChatMessage.objects.create(session=session, role='user', content="Hi")
+
+    def test_round_trip_packed_vector(self):
+        MessageEmbedding.store(self.msg, _vector(3, 7), dtype='float16')
+        stored = MessageEmbedding.objects.get(message=self.msg)
+
+        self.assertEqual(len(bytes(stored.vector)), 384 * 2)
+        self.assertEqual(stored.as_array()[3], 1.0)
+
+        ids, matrix = MessageEmbedding.objects.filter(message=self.msg).as_matrix()
+        self.assertEqual(ids, [self.msg.id])
+        self.assertEqual(matrix.shape, (1, 384))
+        self.assertEqual(matrix.dtype, np.float32)
+        self.assertTrue(matrix.flags['C_CONTIGUOUS'])
+        self.assertEqual(matrix[0, 7], 1.0)
+
+    def test_matrix_of_no_rows_is_empty(self):
+        ids, matrix = MessageEmbedding.objects.none().as_matrix()
+        self.assertEqual((ids, matrix.shape), ([], (0, 0)))
+
+    def test_message_fetch_does_not_load_vectors(self):
+        MessageEmbedding.store(self.msg, _vector(1))
+        with self.assertNumQueries(1):
+            msg = ChatMessage.objects.get(pk=self.msg.pk)
+            self.assertEqual(msg.content, "Hi")
+
+
+class PostTurnProcessorTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        user = User.objects.create_user(email='turns@example.com', password='password123')
+        self.session = ChatSession.objects.create(user=user, title="Turns")
+        self.reply = ChatMessage.objects.create(session=self.session, role='assistant', content="A streamed reply")
+
+    @mock.patch('chat.tasks.finalize_session_turns_task.apply_async')
+    def test_schedule_coalesces_per_session(self, apply_async):
+        self.assertTrue(PostTurnProcessor.schedule(self.session.id))
+        self.assertFalse(PostTurnProcessor.schedule(self.session.id))
+        self.assertEqual(apply_async.call_count, 1)
+
+    @mock.patch('chat.services.embedding_service.EmbeddingService')
+    def test_finalize_is_idempotent(self, embedding_service):
+        embedding_service.return_value.get_embeddings_batch.side_effect = lambda texts: [_vector(0) for _ in texts]
+
+        self.assertEqual(PostTurnProcessor.finalize_session(self.session.id), 1)
+        self.assertEqual(PostTurnProcessor.finalize_session(self.session.id), 0)
+
+        self.reply.refresh_from_db()
+        self.assertTrue(MessageEmbedding.objects.filter(message=self.reply).exists())
+        self.assertEqual(self.reply.tokens_used, len("A streamed reply") // 4)
+
+    @mock.patch('chat.services.embedding_service.EmbeddingService')
+    def test_overlapping_runs_count_tokens_once(self, embedding_service):
+        def embed(texts):
+            if not runs:
+                # A second run starts while this one is still embedding
+                runs.append(None)
+                runs[0] = PostTurnProcessor.finalize_session(self.session.id)
+            return [_vector(0) for _ in texts]
+        runs = []
+        embedding_service.return_value.get_embeddings_batch.side_effect = embed
+
+        self.assertEqual(PostTurnProcessor.finalize_session(self.session.id), 1)
+        self.assertEqual(runs, [1])  # both runs saw the reply pending
+
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.total_tokens, len("A streamed reply") // 4)
+
+
+class TurnStoreTest(TestCase):
+    def setUp(self):
+        user = User.objects.create_user(email='store@example.com', password='password123')
+        self.session = ChatSession.objects.create(user=user, title="Store")
+
+    @mock.patch('chat.services.post_turn.PostTurnProcessor.schedule')
+    def test_turn_is_one_insert_and_one_update(self, schedule):
+        with CaptureQueriesContext(connection) as ctx, self.captureOnCommitCallbacks(execute=True):
+            user_msg, assistant_msg = TurnStore.persist_turn(
+                self.session, "Question?", "Answer.", metadata={'latency': 0.2}
+            )
+
+        writes = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith(('INSERT', 'UPDATE'))]
+        self.assertEqual(len(writes), 2)
+        self.assertEqual(user_msg.turn_id, assistant_msg.turn_id)
+        self.assertEqual(list(self.session.messages.values_list('role', flat=True)), ['user', 'assistant'])
+        schedule.assert_called_once_with(self.session.id)
+
+    @mock.patch('chat.services.post_turn.PostTurnProcessor.schedule')
+    def test_turn_maintains_session_counters(self, schedule):
+        TurnStore.persist_turn(self.session, "First?", "One.", tokens_used=10)
+        TurnStore.persist_turn(self.session, "Second?", "y" * 150, tokens_used=5)
+
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.message_count, 4)
+        self.assertEqual(self.session.total_tokens, 15)
+        self.assertEqual(self.session.last_message_preview, "y" * 100 + "...")
+        self.assertEqual(self.session.last_message_at, self.session.messages.last().created_at)
+
+    @mock.patch('chat.services.post_turn.PostTurnProcessor.schedule')
+    def test_reply_metrics_are_written_to_columns(self, schedule):
+        _, reply = TurnStore.persist_turn(self.session, "Question?", "Answer.", metadata={
+            'streaming': True, 'latency': 0.25, 'ttft': 0.25, 'duration': 1.5, 'fallback': True,
+            'intent': 'general_query', 'sentiment': 'positive', 'model': 'gemini-2.5-flash', 'rag_enabled': True,
+        })
+
+        reply.refresh_from_db()
+        self.assertEqual((reply.latency_ms, reply.ttft_ms), (1500, 250))
+        self.assertEqual((reply.fallback, reply.intent, reply.sentiment), (True, 'general_query', 'positive'))
+        self.assertEqual((reply.model, reply.rag_enabled), ('gemini-2.5-flash', True))
+        self.assertTrue(ChatMessage.objects.filter(role='assistant', fallback=True, intent='general_query').exists())
+
+    @mock.patch('chat.services.post_turn.PostTurnProcessor.schedule')
+    def test_recount_repairs_drifted_counters(self, schedule):
+        TurnStore.persist_turn(self.session, "Question?", "Answer.", tokens_used=7)
+        ChatMessage.objects.create(session=self.session, role='user', content="Written around TurnStore")
+        ChatSession.objects.filter(pk=self.session.pk).update(total_tokens=0)
+
+        call_command('recount_session_stats', chunk_size=1, stdout=StringIO())
+
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.message_count, 3)
+        self.assertEqual(self.session.total_tokens, 7)
+        self.assertEqual(self.session.last_message_preview, "Written around TurnStore")
+
+
+class AsyncStreamEndpointTest(TestCase):
+    def test_requires_bearer_token(self):
+        response = self.client.post('/api/chat/messages/astream/', {}, content_type='application/json')
+        self.assertEqual(response.status_code, 401)
+
+    def test_frames_reach_the_asgi_client_while_the_generation_runs(self):
+        cache.clear()
+        user = User.objects.create_user(email='asgi@example.com', password='password123')
+        session = ChatSession.objects.create(user=user, title="ASGI")
+        token = str(RefreshToken.for_user(user).access_token)
+        body = json.dumps({'session_id': str(session.id), 'content': "Hi"}).encode()
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'POST',
+            'scheme': 'http', 'path': '/api/chat/messages/astream/', 'raw_path': b'/api/chat/messages/astream/',
+            'query_string': b'', 'root_path': '', 'client': ('127.0.0.1', 5000), 'server': ('testserver', 80),
+            'headers': [
+                (b'host', b'testserver'), (b'content-type', b'application/json'),
+                (b'authorization', f'Bearer {token}'.encode()),
+            ],
+        }
+
+        async def drive():
+            finish = asyncio.Event()
+
+            class Pipeline:
+                async def astream_user_message(self, **kwargs):
+                    yield ('token', "Hello")
+                    await finish.wait()
+                    yield ('done', {'message_id': 'm1'})
+
+            inbox, sent = asyncio.Queue(), asyncio.Queue()
+            await inbox.put({'type': 'http.request', 'body': body, 'more_body': False})
+            with mock.patch('chat.async_views.RAGService', Pipeline):
+                handler = asyncio.ensure_future(ASGIHandler()(scope, inbox.get, sent.put))
+                start = await asyncio.wait_for(sent.get(), 10)
+                self.assertEqual(start['status'], 200)
+
+                received = b''
+                while b'event: token' not in received:
+                    received += (await asyncio.wait_for(sent.get(), 10)).get('body', b'')
+                self.assertNotIn(b'event: done', received)  # the generator is still waiting
+
+                finish.set()
+                while True:
+                    message = await asyncio.wait_for(sent.get(), 10)
+                    received += message.get('body', b'')
+                    if not message.get('more_body'):
+                        break
+                await asyncio.wait_for(handler, 10)
+            return received
+
+        # Keep the test's database connection open across the request signals
+        request_started.disconnect(close_old_connections)
+        request_finished.disconnect(close_old_connections)
+        try:
+            received = async_to_sync(drive)()
+        finally:
+            request_started.connect(close_old_connections)
+            request_finished.connect(close_old_connections)
+        self.assertIn(b'event: done', received)
+
+
+class SSEProtocolTest(TestCase):
+    def test_tokens_are_coalesced_before_other_events(self):
+        encoder = SSEEncoder(flush_interval=10, flush_bytes=1000, heartbeat_interval=10)
+        self.assertEqual(encoder.feed('token', "Hello"), [])
+        self.assertEqual(encoder.feed('token', ",\nworld"), [])
+
+        frames = encoder.feed('done', {'message_id': 'abc'})
+        self.assertEqual(len(frames), 2)
+        self.assertEqual(frames[0], 'id: 1\nevent: token\ndata: {"text": "Hello,\\nworld"}\n\n')
+        self.assertTrue(frames[1].startswith('id: 2\nevent: done\n'))
+
+    def test_flushes_on_size(self):
+        encoder = SSEEncoder(flush_interval=10, flush_bytes=4, heartbeat_interval=10)
+        self.assertEqual(encoder.feed('token', "ab"), [])
+        self.assertEqual(len(encoder.feed('token', "cd")), 1)
+        self.assertEqual(encoder.close(), [])
+
+    def test_stream_sync_reports_pipeline_errors(self):
+        def events():
+            yield ('token', "partial")
+            raise RuntimeError("boom")
+
+        frames = list(stream_sync(events(), SSEEncoder(flush_interval=10, heartbeat_interval=10)))
+        self.assertIn('event: token', frames[1])
+        self.assertIn('event: error', frames[2])
+
+
+class SharedCacheCheckTest(TestCase):
+    def test_process_local_cache_with_several_workers_is_an_error(self):
+        with mock.patch.dict(os.environ, {'WEB_CONCURRENCY': '4'}):
+            self.assertEqual([e.id for e in shared_cache_check()], ['chat.E001'])
+        with mock.patch.dict(os.environ, {'WEB_CONCURRENCY': '1'}):
+            self.assertEqual(shared_cache_check(), [])
+
+    @override_settings(CACHES={'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://127.0.0.1:6379/1',
+    }})
+    def test_shared_cache_passes(self):
+        with mock.patch.dict(os.environ, {'WEB_CONCURRENCY': '4'}):
+            self.assertEqual(shared_cache_check(), [])
+
+
+class ReplayBufferTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email='replay@example.com', password='password123')
+        self.buffer = ReplayBuffer('00000000-0000-0000-0000-000000000001', max_events=3)
+        self.buffer.open(self.user.id)
+        self.frames = [format_event('token', {'text': str(i)}, i) for i in range(1, 6)]
+
+    def test_resume_replays_frames_after_last_event_id(self):
+        self.buffer.append(self.frames[:2] + [': ping\n\n'])
+        self.buffer.finish()
+
+        frames = list(resume_sync(self.buffer, 1))
+        self.assertEqual(frames[1:], [self.frames[1]])
+
+    def test_evicted_position_cannot_be_resumed(self):
+        self.buffer.append(self.frames)
+
+        self.assertIsNone(self.buffer.read_after(1))
+        self.assertEqual(self.buffer.read_after(2), (self.frames[2:], False))
+
+    def test_resume_endpoint_is_owner_only(self):
+        self.buffer.append(self.frames[:1])
+        self.buffer.finish()
+        url = f'/api/chat/messages/stream/{self.buffer.turn_id}/'
+        client = APIClient()
+
+        client.force_authenticate(User.objects.create_user(email='intruder@example.com', password='password123'))
+        self.assertEqual(client.get(url).status_code, 404)
+
+        client.force_authenticate(self.user)
+        response = client.get(url, HTTP_LAST_EVENT_ID='0')
+        self.assertEqual(response['X-Turn-Id'], self.buffer.turn_id)
+        self.assertIn(self.frames[0], b''.join(response.streaming_content).decode())
+
+    def test_attach_survives_the_counter_expiring(self):
+        real_incr = cache.incr
+        calls = []
+
+        def incr(key, *args, **kwargs):
+            calls.append(key)
+            if len(calls) == 1:
+                cache.delete(key)  # expires between add and incr
+            return real_incr(key, *args, **kwargs)
+
+        with mock.patch.object(cache, 'incr', side_effect=incr):
+            self.buffer.attach()
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(cache.get(self.buffer.subscribers_key), 1)
+        self.assertEqual(self.buffer.abandoned_for(), 0.0)
+
+
+class StreamCancellationTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email='cancel@example.com', password='password123')
+        self.session = ChatSession.objects.create(user=self.user, title="Cancel")
+
+    def test_abandoned_generation_is_cancelled_after_grace(self):
+        buffer = ReplayBuffer('00000000-0000-0000-0000-000000000002')
+        buffer.open(self.user.id)
+        cancel = threading.Event()
+        watch = _DisconnectWatch(buffer, cancel)
+        watch.grace = 0
+
+        buffer.attach()
+        watch._next_check = 0
+        watch.poll()
+        self.assertFalse(cancel.is_set())
+
+        buffer.detach()
+        watch._next_check = 0
+        watch.poll()
+        self.assertTrue(cancel.is_set())
+
+    @mock.patch('chat.services.post_turn.PostTurnProcessor.schedule')
+    def test_cancelled_stream_persists_partial_response(self, schedule):
+        cancel = threading.Event()
+
+        closed = []
+
+        def chunks(**kwargs):
+            try:
+                yield "Partial"
+                cancel.set()
+                yield " never sent"
+            finally:
+                closed.append(True)
+
+        service = RAGService.__new__(RAGService)
+        service.embedding_service = mock.Mock(get_embedding=mock.Mock(return_value=_vector(0)))
+        service.llm_service = mock.Mock(stream_response=chunks, last_usage=None)
+
+        events = []
+        for event in service.stream_user_message(self.session, "Hi", use_rag=False, cancel=cancel):
+            events.append(event)
+            if event[0] == 'done':
+                self.assertEqual(closed, [True])  # upstream closed on cancel, not at GC
+
+        self.assertEqual([e for e, _ in events], ['sources', 'token', 'done'])
+        self.assertTrue(events[-1][1]['cancelled'])
+        reply = ChatMessage.objects.get(session=self.session, role='assistant')
+        self.assertEqual(reply.content, "Partial")
+        self.assertTrue(reply.metadata['cancelled'])
+        self.assertIn('tokens_saved', reply.metadata)
+
+    @mock.patch('chat.services.post_turn.PostTurnProcessor.schedule')
+    def test_failed_generation_keeps_the_question(self, schedule):
+        def chunks(**kwargs):
+            raise RuntimeError("LLM down")
+            yield
+
+        service = RAGService.__new__(RAGService)
+        service.embedding_service = mock.Mock(get_embedding=mock.Mock(return_value=_vector(0)))
+        service.llm_service = mock.Mock(stream_response=chunks, generate_response=mock.Mock(side_effect=RuntimeError("LLM down")))
+
+        with self.assertRaises(RuntimeError):
+            list(service.stream_user_message(self.session, "Streamed question", use_rag=False))
+        with self.assertRaises(RuntimeError):
+            service.process_user_message(self.session, "Plain question", use_rag=False)
+
+        stored = ChatMessage.objects.filter(session=self.session)
+        self.assertEqual(
+            sorted(stored.values_list('role', 'content')),
+            [('user', "Plain question"), ('user', "Streamed question")]
+        )
+        self.session.refresh_from_db()
+        self.assertEqual(self.session.message_count, 2)
+
+
+@mock.patch('chat.services.post_turn.PostTurnProcessor.schedule')
+class IdempotencyKeyTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email='idem@example.com', password='password123')
+        self.session = ChatSession.objects.create(user=self.user, title="Idem")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.payload = {'session_id': str(self.session.id), 'content': "Hello?"}
+
+    def _send(self, key, **overrides):
+        return self.client.post(
+            '/api/chat/messages/', {**self.payload, **overrides}, format='json', HTTP_IDEMPOTENCY_KEY=key
+        )
+
+    @staticmethod
+    def _fake_pipeline(session, user_message, turn_id=None, **kwargs):
+        return TurnStore.persist_turn(session, user_message, "Hi there.", turn_id=turn_id)
+
+    @mock.patch('chat.views.RAGService')
+    def test_retry_returns_the_original_turn(self, rag_service, schedule):
+        rag_service.return_value.process_user_message.side_effect = self._fake_pipeline
+
+        first = self._send('key-1')
+        retry = self._send('key-1')
+
+        self.assertEqual(first.status_code, 201)
+        self.assertEqual(retry.status_code, 200)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(retry.data['assistant_message']['id'], first.data['assistant_message']['id'])
+        self.assertEqual(rag_service.return_value.process_user_message.call_count, 1)
+        self.assertEqual(self.session.messages.count(), 2)
+
+    @mock.patch('chat.views.RAGService')
+    def test_reused_key_with_different_payload_is_rejected(self, rag_service, schedule):
+        rag_service.return_value.process_user_message.side_effect = self._fake_pipeline
+
+        self._send('key-2')
+        self.assertEqual(self._send('key-2', content="Something else").status_code, 422)
+
+    def test_in_progress_turn_reports_conflict(self, schedule):
+        IdempotencyKey.objects.create(user=self.user, session=self.session, key='key-3', fingerprint='x')
+        with mock.patch('chat.services.idempotency.IdempotencyService.fingerprint', return_value='x'):
+            response = self._send('key-3')
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response['Retry-After'], '1')
+
+    @mock.patch('chat.views.RAGService')
+    def test_failed_turn_releases_the_key(self, rag_service, schedule):
+        rag_service.return_value.process_user_message.side_effect = RuntimeError("LLM down")
+        client = APIClient(raise_request_exception=False)
+        client.force_authenticate(self.user)
+
+        client.post('/api/chat/messages/', self.payload, format='json', HTTP_IDEMPOTENCY_KEY='key-4')
+        self.assertFalse(IdempotencyKey.objects.filter(key='key-4').exists())
+
+    @mock.patch('chat.views.RAGService', side_effect=RuntimeError("FAISS index missing"))
+    def test_pipeline_construction_failure_releases_slot_and_key(self, rag_service, schedule):
+        client = APIClient(raise_request_exception=False)
+        client.force_authenticate(self.user)
+
+        response = client.post('/api/chat/messages/', self.payload, format='json', HTTP_IDEMPOTENCY_KEY='key-6')
+        self.assertEqual(response.status_code, 500)
+        self.assertFalse(IdempotencyKey.objects.filter(key='key-6').exists())
+        self.assertEqual(admission.inflight(), 0)
+
+    def test_stream_retry_replays_the_stored_turn(self, schedule):
+        with mock.patch('chat.services.idempotency.IdempotencyService.fingerprint', return_value='x'):
+            record = IdempotencyKey.objects.create(user=self.user, session=self.session, key='key-5', fingerprint='x')
+            TurnStore.persist_turn(self.session, "Hello?", "Stored answer", turn_id=record.turn_id)
+            response = self.client.post(
+                '/api/chat/messages/stream/', self.payload, format='json', HTTP_IDEMPOTENCY_KEY='key-5'
+            )
+
+        body = response.content.decode()
+        self.assertEqual(response['Idempotent-Replayed'], 'true')
+        self.assertIn('"text": "Stored answer"', body)
+        self.assertIn('event: done', body)
+
+
+@override_settings(LLM_MAX_INFLIGHT_PER_USER=1, LLM_MAX_INFLIGHT_GLOBAL=2, LLM_ADMISSION_QUEUE_SECONDS=0)
+class AdmissionControlTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(email='busy@example.com', password='password123')
+
+    def test_caps_per_user_and_globally(self):
+        self.assertTrue(admission.try_acquire('a'))
+        self.assertFalse(admission.try_acquire('a'))
+        self.assertTrue(admission.try_acquire('b'))
+        self.assertFalse(admission.try_acquire('c'))
+        self.assertEqual(admission.inflight(), 2)
+
+        admission.release('a')
+        self.assertTrue(admission.try_acquire('c'))
+
+    @override_settings(LLM_INFLIGHT_TTL_SECONDS=10)
+    def test_busy_counter_outlives_its_ttl_and_never_goes_negative(self):
+        start = time.time()
+        with mock.patch('django.core.cache.backends.locmem.time.time') as now:
+            now.return_value = start
+            self.assertTrue(admission.try_acquire('a'))
+            now.return_value = start + 8
+            self.assertTrue(admission.try_acquire('b'))
+
+            # Past the first acquire's TTL: still counted, so still capped
+            now.return_value = start + 15
+            self.assertEqual(admission.inflight(), 2)
+            self.assertFalse(admission.try_acquire('c'))
+
+            # Counters lapse while 'a' and 'b' run; their releases must not
+            # push the recreated global counter below zero
+            now.return_value = start + 30
+            self.assertTrue(admission.try_acquire('d'))
+            admission.release('a')
+            admission.release('b')
+            self.assertEqual(cache.get(admission.GLOBAL_KEY), 0)
+
+    def test_saturated_user_gets_429_with_retry_after(self):
+        session = ChatSession.objects.create(user=self.user, title="Busy")
+        client = APIClient()
+        client.force_authenticate(self.user)
+        admission.try_acquire(self.user.id)
+
+        response = client.post(
+            '/api/chat/messages/stream/',
+            {'session_id': str(session.id), 'content': "Hi"},
+            format='json',
+            HTTP_IDEMPOTENCY_KEY='busy-1'
+        )
+
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response['Retry-After'], '2')
+        self.assertFalse(IdempotencyKey.objects.filter(key='busy-1').exists())
+
+
+@override_settings(LLM_MAX_INFLIGHT_GLOBAL=10, LLM_BREAKER_FAILURES=2)
+class DegradationLadderTest(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def test_level_follows_the_worst_signal(self):
+        self.assertEqual(degradation.status()['name'], 'normal')
+
+        for user_id in range(6):
+            admission.try_acquire(user_id)
+        self.assertEqual(degradation.level(), 1)
+
+        for _ in range(20):
+            ttft_window.record(7.0)
+        self.assertEqual(degradation.current_plan().name, 'capped_output')
+
+    @override_settings(DEGRADATION_TTFT_WINDOW_SECONDS=60)
+    def test_slow_ttft_never_stops_the_llm_and_ages_out(self):
+        start = time.time()
+        with mock.patch('django.core.cache.backends.locmem.time.time') as now:
+            now.return_value = start
+            for _ in range(20):
+                ttft_window.record(30.0)
+            plan = degradation.current_plan()
+            self.assertEqual(plan.name, 'capped_output')
+            self.assertTrue(plan.use_llm)  # requests keep sampling Gemini
+
+            # Gemini recovered; the slow spell leaves the window
+            now.return_value = start + 61
+            ttft_window.record(0.4)
+            self.assertEqual(degradation.level(), 0)
+
+    def test_concurrent_ttft_samples_are_all_kept(self):
+        def record():
+            for _ in range(25):
+                ttft_window.record(0.5)
+
+        threads = [threading.Thread(target=record) for _ in range(4)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual(len(ttft_window.samples()), 100)
+
+        for _ in range(ttft_window.SIZE):
+            ttft_window.record(1.0)
+        self.assertEqual(ttft_window.samples(), [1.0] * ttft_window.SIZE)
+
+    @mock.patch('chat.services.post_turn.PostTurnProcessor.schedule')
+    def test_failed_llm_stream_is_not_a_ttft_sample(self, schedule):
+        user = User.objects.create_user(email='ttft@example.com', password='password123')
+        session = ChatSession.objects.create(user=user, title="TTFT")
+        llm = LLMService.__new__(LLMService)
+        llm.model_name = 'gemini-test'
+        llm.client = mock.Mock()
+        llm.client.models.generate_content_stream.side_effect = RuntimeError("quota")
+        service = RAGService.__new__(RAGService)
+        service.embedding_service = mock.Mock(get_embedding=mock.Mock(return_value=_vector(0)))
+        service.llm_service = llm
+
+        events = list(service.stream_user_message(session, "Hi", use_rag=False))
+
+        self.assertIn("Sorry", ''.join(data for event, data in events if event == 'token'))
+        self.assertEqual(ttft_window.samples(), [])
+
+    def test_open_breaker_sheds_to_faiss_only(self):
+        llm_breaker.record_failure()
+        self.assertEqual(degradation.level(), 0)
+        llm_breaker.record_failure()
+        self.assertEqual(degradation.current_plan().name, 'faiss_only')
+
+        llm_breaker.record_success()
+        self.assertEqual(degradation.level(), 0)
+
+    @override_settings(DEGRADATION_FORCE_LEVEL=4)
+    @mock.patch('chat.services.post_turn.PostTurnProcessor.schedule')
+    def test_faiss_only_level_skips_the_llm(self, schedule):
+        user = User.objects.create_user(email='shed@example.com', password='password123')
+        session = ChatSession.objects.create(user=user, title="Shed")
+        service = RAGService.__new__(RAGService)
+        service.embedding_service = mock.Mock(get_embedding=mock.Mock(return_value=_vector(0)))
+        service.vector_store = mock.Mock(index=None)
+        service.llm_service = mock.Mock()
+
+        _, reply = service.process_user_message(session, "Hello?")
+
+        service.llm_service.generate_response.assert_not_called()
+        self.assertTrue(reply.metadata['fallback'])
+        self.assertEqual(reply.metadata['degradation_level'], 4)
+
+
+class SessionListQueryTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='lists@example.com', password='password123')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    @mock.patch('chat.services.post_turn.PostTurnProcessor.schedule')
+    def _session(self, title, schedule, replies=2):
+        session = ChatSession.objects.create(user=self.user, title=title)
+        for i in range(replies):
+            TurnStore.persist_turn(session, f"{title} question {i}", f"{title} answer {i} " + "x" * 120)
+        return session
+
+    def _list_queries(self, url):
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx.captured_queries), response.data['results'] if 'results' in response.data else response.data
+
+    def test_list_query_count_does_not_grow_with_sessions(self):
+        self._session("First")
+        baseline, _ = self._list_queries('/api/chat/sessions/')
+
+        for i in range(5):
+            self._session(f"More {i}")
+        queries, results = self._list_queries('/api/chat/sessions/')
+
+        self.assertEqual(queries, baseline)
+        self.assertEqual(len(results), 6)
+        first = next(r for r in results if r['title'] == "First")
+        self.assertEqual(first['message_count'], 4)
+        self.assertEqual(first['last_message_preview'], ("First answer 1 " + "x" * 120)[:100] + "...")
+
+    def test_archived_list_is_annotated(self):
+        for i in range(3):
+            session = self._session(f"Old {i}", replies=1)
+            ChatSession.objects.filter(pk=session.pk).update(is_archived=True)
+
+        with self.assertNumQueries(1):
+            response = self.client.get('/api/chat/sessions/archived/')
+        self.assertEqual([r['message_count'] for r in response.data], [2, 2, 2])
+
+    def test_admin_logs_count_all_messages_of_matching_sessions(self):
+        admin = User.objects.create_user(email='admin@example.com', password='password123', is_staff=True)
+        self._session("Searchable")
+        self.client.force_authenticate(admin)
+
+        with self.assertNumQueries(2):
+            response = self.client.get('/api/chat/admin/logs/', {'q': 'question 1'})
+        results = response.data['results']
+        self.assertEqual(len(results), 1)
+        self.assertEqual(results[0]['message_count'], 4)
+        self.assertEqual(results[0]['user'], 'lists@example.com')
+
+
+class MessagePaginationTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='pages@example.com', password='password123')
+        self.session = ChatSession.objects.create(user=self.user, title="Long chat")
+        ChatMessage.objects.bulk_create([
+            ChatMessage(session=self.session, role='user' if i % 2 == 0 else 'assistant', content=f"m{i}")
+            for i in range(7)
+        ])
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    @override_settings(MESSAGE_PAGE_SIZE=3)
+    def test_detail_returns_latest_page_then_walks_back(self):
+        detail = self.client.get(f'/api/chat/sessions/{self.session.id}/').data
+        self.assertEqual([m['content'] for m in detail['messages']], ['m6', 'm5', 'm4'])
+        self.assertEqual(detail['title'], "Long chat")
+
+        seen = [m['content'] for m in detail['messages']]
+        before = detail['cursors']['before']
+        while before:
+            page = self.client.get(f'/api/chat/sessions/{self.session.id}/messages/', {'before': before}).data
+            seen += [m['content'] for m in page['results']]
+            before = page['cursors']['before']
+        self.assertEqual(seen, [f"m{i}" for i in range(6, -1, -1)])
+
+    @override_settings(MESSAGE_PAGE_SIZE=3)
+    def test_after_cursor_returns_newer_messages(self):
+        after = self.client.get(f'/api/chat/sessions/{self.session.id}/').data['cursors']['after']
+        url = f'/api/chat/sessions/{self.session.id}/messages/'
+        self.assertEqual(self.client.get(url, {'after': after}).data['results'], [])
+
+        ChatMessage.objects.create(session=self.session, role='user', content="m7")
+        page = self.client.get(url, {'after': after}).data
+        self.assertEqual([m['content'] for m in page['results']], ['m7'])
+
+    def test_invalid_cursor_is_rejected(self):
+        url = f'/api/chat/sessions/{self.session.id}/messages/'
+        self.assertEqual(self.client.get(url, {'before': 'nope'}).status_code, 400)
+
+    def test_public_messages_require_public_session(self):
+        anonymous = APIClient()
+        url = f'/api/chat/sessions/{self.session.id}/public/messages/'
+        self.assertEqual(anonymous.get(url).status_code, 404)
+
+        ChatSession.objects.filter(pk=self.session.pk).update(is_public=True)
+        response = anonymous.get(url, {'limit': 2})
+        self.assertEqual([m['content'] for m in response.data['results']], ['m6', 'm5'])
+        self.assertIsNotNone(response.data['cursors']['before'])
+
+
+@override_settings(SYNC_OVERLAP_SECONDS=0)
+class DeltaSyncTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='sync@example.com', password='password123')
+        self.keep = ChatSession.objects.create(user=self.user, title="Keep")
+        self.drop = ChatSession.objects.create(user=self.user, title="Drop")
+        ChatSession.objects.create(
+            user=User.objects.create_user(email='else@example.com', password='password123'), title="Foreign"
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def _sync(self, since=None):
+        response = self.client.get('/api/chat/sync/', {'since': since} if since else {})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    @mock.patch('chat.services.post_turn.PostTurnProcessor.schedule')
+    def test_returns_only_changes_since_token(self, schedule):
+        token = self._sync()['next']
+
+        TurnStore.persist_turn(self.keep, "Question?", "Answer.")
+        self.client.post(f'/api/chat/sessions/{self.drop.id}/pin/')
+        self.client.delete(f'/api/chat/sessions/{self.drop.id}/')
+
+        delta = self._sync(token)
+        self.assertEqual([s['title'] for s in delta['sessions']], ["Keep"])
+        self.assertEqual([m['content'] for m in delta['messages']], ["Question?", "Answer."])
+        self.assertEqual(delta['messages'][0]['session_id'], self.keep.id)
+        self.assertEqual(delta['deleted']['sessions'], [self.drop.id])
+        self.assertFalse(delta['has_more'])
+
+    @mock.patch('chat.services.post_turn.PostTurnProcessor.schedule')
+    def test_deleted_messages_reach_sync_clients(self, schedule):
+        _, reply = TurnStore.persist_turn(self.keep, "Question?", "Answer.", tokens_used=7)
+        foreign = ChatMessage.objects.create(
+            session=ChatSession.objects.get(title="Foreign"), role='user', content="Not yours"
+        )
+        token = self._sync()['next']
+
+        self.assertEqual(self.client.delete(f'/api/chat/messages/{foreign.id}/').status_code, 404)
+        self.assertEqual(self.client.delete(f'/api/chat/messages/{reply.id}/').status_code, 204)
+
+        delta = self._sync(token)
+        self.assertEqual(delta['deleted']['messages'], [reply.id])
+        self.assertEqual([s['title'] for s in delta['sessions']], ["Keep"])
+        self.keep.refresh_from_db()
+        self.assertEqual((self.keep.message_count, self.keep.total_tokens), (1, 0))
+
+        quiet = self._sync(delta['next'])
+        self.assertEqual((quiet['sessions'], quiet['messages'], quiet['deleted']['sessions']), ([], [], []))
+
+    @mock.patch('chat.services.post_turn.PostTurnProcessor.schedule')
+    def test_deleting_the_last_message_refreshes_the_preview(self, schedule):
+        question, reply = TurnStore.persist_turn(self.keep, "Question?", "Answer.")
+
+        self.assertEqual(self.client.delete(f'/api/chat/messages/{reply.id}/').status_code, 204)
+        self.keep.refresh_from_db()
+        self.assertEqual(self.keep.last_message_preview, "Question?")
+        self.assertEqual(self.keep.last_message_at, question.created_at)
+
+        self.assertEqual(self.client.delete(f'/api/chat/messages/{question.id}/').status_code, 204)
+        self.keep.refresh_from_db()
+        self.assertEqual((self.keep.last_message_preview, self.keep.last_message_at), (None, None))
+
+    @override_settings(SYNC_MAX_CHANGES=2)
+    def test_pages_through_large_deltas(self):
+        token = self._sync()['next']
+        ChatMessage.objects.bulk_create([
+            ChatMessage(session=self.keep, role='user', content=f"m{i}") for i in range(5)
+        ])
+
+        seen, has_more = [], True
+        while has_more:
+            delta = self._sync(token)
+            seen += [m['content'] for m in delta['messages']]
+            token, has_more = delta['next'], delta['has_more']
+        self.assertEqual(seen, [f"m{i}" for i in range(5)])
+
+    def test_rejects_bad_and_expired_tokens(self):
+        self.assertEqual(self.client.get('/api/chat/sync/', {'since': 'junk'}).status_code, 400)
+
+        token = self._sync()['next']
+        with override_settings(SYNC_TOMBSTONE_TTL_DAYS=0):
+            response = self.client.get('/api/chat/sync/', {'since': token})
+        self.assertEqual(response.status_code, 410)
+        self.assertEqual(response.data['code'], 'resync_required')
+
+
+class UsageRollupTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        TimingSketches._buffer = None
+        self.user = User.objects.create_user(email='rollup@example.com', password='password123')
+
+    def _turn(self, days_ago, **metadata):
+        when = timezone.now() - timedelta(days=days_ago)
+        session = ChatSession.objects.create(user=self.user, title="Usage")
+        ChatSession.objects.filter(pk=session.pk).update(created_at=when)
+        question = ChatMessage.objects.create(session=session, role='user', content="Q?")
+        metadata = {'latency': 1.0, 'intent': 'general_query', 'sentiment': 'positive', **metadata}
+        reply = ChatMessage.objects.create(
+            session=session, role='assistant', content="A.", tokens_used=10,
+            metadata=metadata, **TurnStore.metric_fields(metadata)
+        )
+        ChatMessage.objects.filter(pk__in=[question.pk, reply.pk]).update(created_at=when)
+        TimingSketches.record(metadata, now=when)  # as the RAG pipeline does
+
+    def test_rolls_up_closed_days_from_the_high_water_mark(self):
+        self._turn(3)
+        self._turn(2, fallback=True)
+        self._turn(0)
+
+        self.assertEqual(UsageRollupService.roll_up(), 3)  # three days ago through yesterday
+        self.assertEqual(UsageRollupService.roll_up(), 0)
+        self.assertEqual(UsageRollupService.high_water_mark(), timezone.localdate() - timedelta(days=1))
+
+        day = DailyUsageRollup.objects.get(date=timezone.localdate() - timedelta(days=2))
+        self.assertEqual((day.sessions, day.messages, day.active_users, day.fallbacks), (1, 2, 1, 1))
+        self.assertEqual(DailyUsageRollup.objects.get(date=timezone.localdate() - timedelta(days=1)).messages, 0)
+
+    def test_analytics_read_rollups_plus_live_today(self):
+        self._turn(2, fallback=True)
+        UsageRollupService.roll_up()
+        self._turn(0, intent='chit_chat')
+
+        service = AnalyticsService()
+        with CaptureQueriesContext(connection) as queries:
+            nlp = service.get_nlp_performance(days=7)
+        # high-water mark, rollups, today's sessions/messages/users/breakdowns;
+        # today's latency comes from the hourly sketches, not its replies
+        self.assertEqual(len(queries.captured_queries), 6)
+        self.assertFalse(any('latency_ms' in query['sql'] for query in queries.captured_queries))
+        self.assertEqual(nlp['total_responses'], 2)
+        self.assertEqual(nlp['fallback_rate'], 50.0)
+        self.assertEqual(nlp['latency']['latency']['p50'], 1.0)
+        self.assertEqual(nlp['latency']['latency']['count'], 2)
+        self.assertEqual(service.get_intent_distribution(days=7), {'general_query': 1, 'chit_chat': 1})
+        self.assertEqual(AnalyticsService().get_nlp_performance(days=1)['total_responses'], 1)
+
+
+    def test_live_stats_never_load_reply_metadata(self):
+        self._turn(0, retrieved_docs=[{'content': "x" * 1000}] * 5)
+        self._turn(0, streaming=True, ttft=0.4, duration=2.0, embedding_time=0.02,
+                   cancelled=True, tokens_saved=120, seconds_saved=3.5)
+
+        start, end = UsageRollupService.day_bounds(timezone.localdate())
+        with CaptureQueriesContext(connection) as queries:
+            stats = UsageRollupService.compute(start, end)
+        for query in queries.captured_queries:
+            self.assertNotRegex(query['sql'], r'"metadata"(?!, \'\$)')  # only JSON key extraction
+
+        self.assertEqual((stats['cancelled_streams'], stats['tokens_saved'], stats['seconds_saved']), (1, 120, 3.5))
+        sketches = stats['latency_sketches']
+        self.assertEqual((sketches['latency'].count, sketches['ttft'].count, sketches['embedding'].count), (2, 1, 1))
+        self.assertAlmostEqual(sketches['ttft'].quantile(0.5), 0.4, delta=0.004)
+        self.assertEqual(stats['intents'], {'general_query': 2})
+
+    def test_distinct_users_merge_across_days(self):
+        other = User.objects.create_user(email='other@example.com', password='password123')
+        self._turn(2)
+        self._turn(1)
+        UsageRollupService.roll_up()
+        self._turn(0)
+        session = ChatSession.objects.create(user=other, title="Usage")
+        for content in ("One?", "Two?"):
+            ChatMessage.objects.create(session=session, role='user', content=content)
+
+        summary = AnalyticsService().get_summary_stats(days=7)
+        self.assertEqual(summary['active_users'], 2)  # self.user on three days counts once
+        self.assertEqual(summary['engagement_rate'], 50.0)
+
+    def test_hyperloglog_estimates_within_a_few_percent(self):
+        days = [HyperLogLog().update(range(i * 4000, i * 4000 + 6000)) for i in range(5)]
+        window = HyperLogLog()
+        for day in days:
+            window.merge(HyperLogLog.from_bytes(day.to_bytes()))
+        self.assertAlmostEqual(window.count(), 22000, delta=22000 * 0.03)
+
+class LatencySketchTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        TimingSketches._buffer = None
+
+    def test_quantiles_within_relative_accuracy_and_merge(self):
+        values = [i / 100 for i in range(1, 1001)]  # 0.01s .. 10s
+        low, high = DDSketch(0.01), DDSketch(0.01)
+        for value in values[:500]:
+            low.add(value)
+        for value in values[500:]:
+            high.add(value)
+
+        merged = DDSketch.from_dict(low.to_dict()).merge(DDSketch.from_dict(high.to_dict()))
+        self.assertEqual(merged.count, 1000)
+        for q in (0.5, 0.9, 0.99):
+            exact = values[int(q * 999)]
+            self.assertAlmostEqual(merged.quantile(q), exact, delta=exact * 0.011)
+        self.assertIsNone(DDSketch().quantile(0.5))
+
+    def test_rollups_store_sketches_and_cache_holds_the_current_hour(self):
+        user = User.objects.create_user(email='sketch@example.com', password='password123')
+        session = ChatSession.objects.create(user=user, title="Sketch")
+        yesterday = timezone.now() - timedelta(days=1)
+        ChatSession.objects.filter(pk=session.pk).update(created_at=yesterday)
+        for latency in (1.0, 2.0, 3.0):
+            metadata = {'streaming': True, 'latency': 0.5, 'ttft': 0.5, 'duration': latency,
+                        'embedding_time': 0.02, 'retrieval_time': 0.004}
+            reply = ChatMessage.objects.create(
+                session=session, role='assistant', content="A.",
+                metadata=metadata, **TurnStore.metric_fields(metadata)
+            )
+            ChatMessage.objects.filter(pk=reply.pk).update(created_at=yesterday)
+        UsageRollupService.roll_up()
+
+        stored = DailyUsageRollup.objects.get(date=timezone.localdate(yesterday)).latency_sketches
+        self.assertEqual(sorted(stored), ['embedding', 'latency', 'retrieval', 'ttft'])
+
+        latency = AnalyticsService().get_nlp_performance(days=7)['latency']
+        self.assertAlmostEqual(latency['latency']['p50'], 2.0, delta=0.02)
+        self.assertAlmostEqual(latency['latency']['mean'], 2.0)
+        self.assertAlmostEqual(latency['ttft']['p90'], 0.5, delta=0.005)
+        self.assertEqual(latency['retrieval']['count'], 3)
+
+        TimingSketches.record({'latency': 4.0, 'embedding_time': 0.03})
+        recent = TimingSketches.summaries(TimingSketches.recent(hours=1))
+        self.assertAlmostEqual(recent['latency']['p50'], 4.0, delta=0.04)
+        self.assertEqual(recent['ttft']['count'], 0)  # not streamed
+
+    def test_hourly_sketches_keep_every_process_and_thread(self):
+        def record_many():
+            for _ in range(25):
+                TimingSketches.record({'latency': 1.0})
+
+        for pid in (101, 102):  # two worker processes, four threads each
+            with mock.patch('chat.services.quantiles.os.getpid', return_value=pid):
+                threads = [threading.Thread(target=record_many) for _ in range(4)]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+
+        self.assertEqual(TimingSketches.recent(hours=1)['latency'].count, 200)
+        hour_key = TimingSketches._hour_key(timezone.now())
+        self.assertEqual(cache.get(f"{hour_key}:writers"), 2)
+
+
+class AnalyticsSeriesTest(TestCase):
+    def setUp(self):
+        user = User.objects.create_user(email='series@example.com', password='password123')
+        now = timezone.now()
+        for days_ago, fallback in ((0, True), (0, False), (2, False)):
+            session = ChatSession.objects.create(user=user, title="Series")
+            reply = ChatMessage.objects.create(
+                session=session, role='assistant', content="A.", tokens_used=5,
+                metadata={'fallback': fallback}, fallback=fallback
+            )
+            ChatSession.objects.filter(pk=session.pk).update(created_at=now - timedelta(days=days_ago))
+            ChatMessage.objects.filter(pk=reply.pk).update(created_at=now - timedelta(days=days_ago))
+
+    def test_daily_series_is_zero_filled_from_one_query_per_table(self):
+        with self.assertNumQueries(2):
+            data = AnalyticsService().get_series(['sessions', 'tokens', 'fallbacks'], days=4)
+
+        self.assertEqual(data['buckets'][-1], timezone.localdate().isoformat())
+        self.assertEqual(data['series']['sessions'], [0, 1, 0, 2])
+        self.assertEqual(data['series']['tokens'], [0, 5, 0, 10])
+        self.assertEqual(data['series']['fallbacks'], [0, 0, 0, 1])
+
+    def test_hourly_and_weekly_buckets(self):
+        hourly = AnalyticsService().get_series(['messages'], days=1, interval='hour')
+        self.assertEqual(len(hourly['buckets']), 24)
+        self.assertEqual(hourly['series']['messages'][-1], 2)
+
+        weekly = AnalyticsService().get_series(['messages'], days=14, interval='week')
+        self.assertEqual(sum(weekly['series']['messages']), 3)
+
+    def test_engagement_trends_keep_their_shape(self):
+        with self.assertNumQueries(1):
+            trends = AnalyticsService().get_engagement_trends(3)
+        self.assertEqual([t['count'] for t in trends], [1, 0, 2])
+        self.assertEqual(trends[-1]['date'], timezone.localdate().strftime('%Y-%m-%d'))
+
+    def test_rejects_unknown_metrics(self):
+        with self.assertRaises(ValueError):
+            AnalyticsService().get_series(['revenue'])
+
+
+@override_settings(ANALYTICS_SECTION_WORKERS=1, ANALYTICS_CACHE_FRESH_SECONDS=60)
+class AnalyticsDashboardCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        admin = User.objects.create_user(email='admin@example.com', password='password123', is_staff=True)
+        self.client.force_authenticate(admin)
+
+    def test_serves_cached_payload_and_revalidates_once_when_stale(self):
+        first = self.client.get('/api/chat/admin/?days=7').json()
+        self.assertEqual(set(first) - {'generated_at'}, {'summary', 'nlp', 'intents', 'trends', 'learning', 'health'})
+
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get('/api/chat/admin/?days=7').json(), first)
+
+        stale = {**cache.get(AnalyticsDashboard._key(7)), 'generated_at': first['generated_at'] - 120}
+        cache.set(AnalyticsDashboard._key(7), stale)
+        with mock.patch('chat.services.analytics_cache.threading.Thread') as thread:
+            self.assertEqual(self.client.get('/api/chat/admin/?days=7').json()['generated_at'], stale['generated_at'])
+            self.client.get('/api/chat/admin/?days=7')
+        thread.return_value.start.assert_called_once()
+
+    def test_days_is_validated_and_clamped(self):
+        for path in ('/api/chat/admin/', '/api/chat/admin/trends/', '/api/chat/admin/series/'):
+            response = self.client.get(path, {'days': 'week'})
+            self.assertEqual(response.status_code, 400, path)
+            self.assertEqual(response.json(), {'error': "days must be an integer"})
+
+        with mock.patch.object(AnalyticsDashboard, 'get', return_value={}) as get:
+            self.client.get('/api/chat/admin/', {'days': 100000})
+            self.client.get('/api/chat/admin/', {'days': -5})
+        self.assertEqual([c.args for c in get.call_args_list], [(365,), (1,)])
+        self.assertEqual(len(self.client.get('/api/chat/admin/trends/', {'days': 100000}).json()), 365)
+
+
+@override_settings(ANALYTICS_SECTION_WORKERS=4)
+class AnalyticsDashboardParallelTest(TransactionTestCase):
+    def test_sections_compute_on_worker_threads(self):
+        cache.clear()
+        user = User.objects.create_user(email='parallel@example.com', password='password123')
+        session = ChatSession.objects.create(user=user, title="Parallel")
+        ChatMessage.objects.create(session=session, role='user', content="Q?")
+
+        payload = AnalyticsDashboard.compute(days=7)
+        self.assertEqual(payload['summary']['total_conversations'], 1)
+        self.assertEqual(payload['summary']['active_users'], 1)
+        self.assertEqual(payload['health']['knowledge_base']['total_documents'], 0)
+
+
+@override_settings(LIVE_ANALYTICS_POLL_MS=0, LIVE_ANALYTICS_MAX_EVENTS=3)
+class LiveAnalyticsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        user = User.objects.create_user(email='live@example.com', password='password123')
+        self.session = ChatSession.objects.create(user=user, title="Live")
+
+    @mock.patch('chat.services.post_turn.PostTurnProcessor.schedule')
+    def test_turns_are_pushed_as_deltas_after_commit(self, schedule):
+        stream = live_sync()
+        self.assertEqual(next(stream), ": connected\n\n")
+        self.assertIn("event: status", next(stream))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            TurnStore.persist_turn(self.session, "Q?", "A.", tokens_used=4, metadata={'latency': 0.8, 'fallback': True})
+
+        with self.assertNumQueries(0):
+            frame = next(stream)
+        self.assertTrue(frame.startswith("id: 1\nevent: turn\n"))
+        self.assertIn('"fallback": true', frame)
+        self.assertIn('"latency": 0.8', frame)
+
+    def test_subscriber_behind_the_window_is_told_to_resync(self):
+        for _ in range(5):
+            live_channel.session_created(self.session)
+
+        events, last = live_channel.read_after(3)
+        self.assertEqual([event_id for event_id, _, _ in events], [4, 5])
+        self.assertEqual(live_channel.read_after(1), (None, 5))
+
+        stream = live_sync(last_event_id=1)
+        next(stream), next(stream)
+        self.assertIn('"code": "resync_required"', next(stream))
+
+    @override_settings(LIVE_ANALYTICS_POLL_MS=10, LIVE_ANALYTICS_MAX_SECONDS=0.2, LIVE_ANALYTICS_MAX_EVENTS=2)
+    def test_async_feed_serves_the_same_events(self):
+        for _ in range(3):
+            live_channel.session_created(self.session)
+
+        async def collect(last_event_id):
+            return [frame async for frame in live_async(last_event_id)]
+
+        frames = async_to_sync(collect)(1)
+        self.assertEqual(frames[0], ": connected\n\n")
+        self.assertIn("event: status", frames[1])
+        self.assertEqual([frame.split("\n")[:2] for frame in frames[2:]], [
+            ["id: 2", "event: session"], ["id: 3", "event: session"],
+        ])
+
+        frames = async_to_sync(collect)(0)  # a new connection starts at the newest id
+        self.assertEqual(len(frames), 2)
+
+    def test_async_view_is_for_admins_only(self):
+        token = str(RefreshToken.for_user(self.session.user).access_token)
+        response = self.client.get('/api/chat/admin/alive/', HTTP_AUTHORIZATION=f'Bearer {token}')
+        self.assertEqual(response.status_code, 403)
+        self.assertEqual(self.client.get('/api/chat/admin/alive/').status_code, 401)
+
+
+class LogSearchTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='searcher@example.com', password='password123')
+        admin = User.objects.create_user(email='admin@example.com', password='password123', is_staff=True)
+        self.client = APIClient()
+        self.client.force_authenticate(admin)
+
+    def _session(self, title, *contents, user=None):
+        session = ChatSession.objects.create(user=user or self.user, title=title)
+        ChatMessage.objects.bulk_create([
+            ChatMessage(session=session, role='user', content=content) for content in contents
+        ])
+        return session
+
+    def _search(self, **params):
+        response = self.client.get('/api/chat/admin/logs/', params)
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_matches_content_and_ranks_title_hits_first(self):
+        in_content = self._session("Weekend plans", "how do I reset my password")
+        in_title = self._session("Password reset", "it keeps failing")
+        self._session("Unrelated", "what is the weather")
+
+        results = self._search(q='password')['results']
+        self.assertEqual([r['id'] for r in results], [in_title.id, in_content.id])
+        self.assertGreater(results[0]['score'], results[1]['score'])
+
+    def test_terms_are_prefix_matched_and_all_required(self):
+        both = self._session("A", "billing invoices are late")
+        self._session("B", "billing question only")
+
+        self.assertEqual([r['id'] for r in self._search(q='bill invoice')['results']], [both.id])
+
+    def test_keyset_pages_cover_every_match_once(self):
+        sessions = {self._session(f"Chat {i}", f"refund request {i}").id for i in range(5)}
+
+        seen, cursor = [], None
+        while True:
+            page = self._search(q='refund', limit=2, **({'cursor': cursor} if cursor else {}))
+            seen += [r['id'] for r in page['results']]
+            cursor = page['next']
+            if not cursor:
+                break
+        self.assertEqual(len(seen), 5)
+        self.assertEqual(set(seen), sessions)
+
+    def test_index_follows_updates_and_deletes(self):
+        session = self._session("Draft", "original wording")
+        message = session.messages.get()
+
+        ChatMessage.objects.filter(pk=message.pk).update(content="revised wording")
+        self.assertEqual(self._search(q='original')['results'], [])
+        self.assertEqual(len(self._search(q='revised')['results']), 1)
+
+        ChatSession.objects.filter(pk=session.pk).update(title="Renamed")
+        self.assertEqual(len(self._search(q='renamed')['results']), 1)
+
+        session.delete()
+        self.assertEqual(self._search(q='revised')['results'], [])
+        self.assertEqual(self._search(q='renamed')['results'], [])
+
+    def test_email_queries_match_users_by_recency(self):
+        other = User.objects.create_user(email='other@example.com', password='password123')
+        older = self._session("One", "hello")
+        newer = self._session("Two", "hello again")
+        self._session("Three", "hello", user=other)
+        ChatSession.objects.filter(pk=older.pk).update(updated_at=timezone.now() - timedelta(days=1))
+
+        first = self._search(q='searcher@', limit=1)
+        self.assertEqual([r['id'] for r in first['results']], [newer.id])
+        self.assertIsNone(first['results'][0]['score'])
+        second = self._search(q='searcher@', limit=1, cursor=first['next'])
+        self.assertEqual([r['id'] for r in second['results']], [older.id])
+        self.assertIsNone(second['next'])
+
+    def test_malformed_cursor_is_rejected(self):
+        response = self.client.get('/api/chat/admin/logs/', {'q': 'x', 'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 400)
+
+    def test_install_rebuilds_the_index(self):
+        session = self._session("Rebuilt", "indexed content")
+        with connection.cursor() as cursor:
+            cursor.execute("DELETE FROM chat_chatmessage_fts")
+        self.assertEqual(self._search(q='indexed')['results'], [])
+
+        self.assertTrue(LogSearchService.install())
+        self.assertEqual([r['id'] for r in self._search(q='indexed')['results']], [session.id])
+
+    def test_checks_catch_dropped_triggers_and_renumbered_rowids(self):
+        self._session("Checked", "first", "second")
+        self.assertEqual(LogSearchService.problems(thorough=True), [])
+
+        with connection.cursor() as cursor:
+            cursor.execute("DROP TRIGGER chat_chatmessage_fts_ai")  # as a table rebuild would
+        self._session("Unindexed", "third")
+        warnings = search_index_check(databases=['default'])
+        self.assertEqual([w.id for w in warnings], ['chat.W001', 'chat.W001'])
+        self.assertIn('chat_chatmessage_fts_ai', warnings[0].msg)
+        self.assertIn('indexes 2 rows but chat_chatmessage has 3', warnings[1].msg)
+        with self.assertRaises(CommandError):
+            call_command('rebuild_search_index', check=True)
+
+        call_command('rebuild_search_index', stdout=StringIO())
+        self.assertEqual(search_index_check(databases=['default']), [])
+
+        with connection.cursor() as cursor:
+            cursor.execute("UPDATE chat_chatmessage SET rowid = rowid + 1000")  # as a VACUUM may
+        self.assertEqual(LogSearchService.problems(), [])  # counts still match
+        self.assertIn('rowids renumbered', LogSearchService.problems(thorough=True)[0])
+
+        LogSearchService.install()
+        self.assertEqual(LogSearchService.problems(thorough=True), [])
+        self.assertEqual(len(self._search(q='third')['results']), 1)
+
+    def test_postgres_query_compares_cursor_scores_as_float8(self):
+        after, hit = uuid.uuid4(), uuid.uuid4()
+        postgres = mock.MagicMock(vendor='postgresql')
+        cursor = postgres.cursor.return_value.__enter__.return_value
+        cursor.fetchall.return_value = [(hit, 0.0607927106320858)]
+
+        with mock.patch('chat.services.log_search.connection', postgres):
+            rows, more = LogSearchService._ranked(['refund', 'late'], {'s': 0.25, 'id': str(after)}, 10)
+
+        sql, params = cursor.execute.call_args.args
+        # ts_rank is float4; both arms are widened so MAX(score) round-trips
+        # through the cursor and the HAVING equality holds
+        self.assertIn("ts_rank(m.search_vector, q.query)::float8 AS score", sql)
+        self.assertIn("ts_rank(s.search_vector, q.query)::float8 * 2", sql)
+        self.assertIn(LogSearchService.HAVING, sql)
+        self.assertEqual(params, ['refund:* & late:*', 0.25, 0.25, after, 11])
+        self.assertEqual((rows, more), ([(hit, 0.0607927106320858)], False))
@@ -1,8 +1,15 @@
-from django.test import TestCase
+from datetime import timedelta
+from django.test import TestCase, override_settings
+from django.utils import timezone
 from chat.models import ChatSession, ChatMessage
+from chat.services.analytics_service import AnalyticsService
+from chat.services.feedback_export import IncrementalFeedbackExport
 from chat.services.feedback_pipeline import FeedbackPipeline
 from django.contrib.auth import get_user_model
+import gzip
+import json
 import os
+import tempfile
 
 User = get_user_model()
 
@@ -47,3 +54,129 @@ class FeedbackPipelineTest(TestCase):
         # Cleanup
         if os.path.exists(file_path):
             os.remove(file_path)
+
+    def test_pairs_are_read_in_one_query(self):
+        for i in range(5):
+            ChatMessage.objects.create(session=self.session, role='user', content=f"Question {i}")
+            ChatMessage.objects.create(session=self.session, role='assistant', content=f"Answer {i}", rating=4)
+        orphan_session = ChatSession.objects.create(user=self.user, title="No prompt")
+        ChatMessage.objects.create(session=orphan_session, role='assistant', content="Orphan", rating=5)
+
+        feedback = FeedbackPipeline.get_high_quality_feedback(min_rating=4)
+        with self.assertNumQueries(1):
+            dataset = FeedbackPipeline.format_for_fine_tuning(feedback)
+
+        pairs = [(e['messages'][0]['content'], e['messages'][1]['content']) for e in dataset]
+        self.assertEqual(pairs[0], ("Hello world", "Hello! How can I help you?"))
+        self.assertEqual(pairs[1:], [(f"Question {i}", f"Answer {i}") for i in range(5)])
+
+    def test_export_gzip_dataset(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            file_path = os.path.join(tmp, "feedback.jsonl.gz")
+            count = FeedbackPipeline.export_feedback_dataset(file_path, min_rating=4)
+
+            self.assertEqual(count, 1)
+            self.assertEqual(os.listdir(tmp), ["feedback.jsonl.gz"])
+            with gzip.open(file_path, 'rt', encoding='utf-8') as f:
+                entries = [json.loads(line) for line in f]
+        self.assertEqual(entries[0]['messages'][1]['content'], "Hello! How can I help you?")
+
+
+@override_settings(FEEDBACK_EXPORT_SETTLE_SECONDS=0, FEEDBACK_EXPORT_COMPACT_SHARDS=3)
+class IncrementalFeedbackExportTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(email='export@example.com', password='password123')
+        self.session = ChatSession.objects.create(user=self.user, title="Export")
+        self.tmp = tempfile.TemporaryDirectory()
+        self.exporter = IncrementalFeedbackExport(directory=self.tmp.name)
+
+    def tearDown(self):
+        self.tmp.cleanup()
+
+    def _turn(self, n, rating=None):
+        ChatMessage.objects.create(session=self.session, role='user', content=f"Q{n}")
+        return ChatMessage.objects.create(
+            session=self.session, role='assistant', content=f"A{n}",
+            rating=rating, rated_at=timezone.now() if rating else None
+        )
+
+    def _rate(self, reply, rating):
+        ChatMessage.objects.filter(pk=reply.pk).update(rating=rating, rated_at=timezone.now())
+
+    def _answers(self, files):
+        answers = []
+        for name in files:
+            with gzip.open(os.path.join(self.tmp.name, name), 'rt', encoding='utf-8') as f:
+                answers += [json.loads(line)['messages'][1]['content'] for line in f]
+        return answers
+
+    def test_each_run_exports_only_newly_rated_replies(self):
+        self._turn(1, rating=5)
+        old_unrated = self._turn(2)
+        first = self.exporter.run()
+        self.assertEqual(self._answers([first['shard']['file']]), ["A1"])
+
+        self.assertIsNone(self.exporter.run()['shard'])
+
+        # Created before the watermark but rated after it
+        self._rate(old_unrated, 4)
+        self._turn(3, rating=2)
+        second = self.exporter.run()
+        self.assertEqual(self._answers([second['shard']['file']]), ["A2"])
+
+        manifest = self.exporter.load_manifest()
+        self.assertEqual(manifest['watermark']['id'], str(old_unrated.id))
+        self.assertEqual(self._answers(self.exporter.files(manifest)), ["A1", "A2"])
+
+    def test_recent_ratings_wait_for_the_settle_window(self):
+        reply = self._turn(1, rating=5)
+        with override_settings(FEEDBACK_EXPORT_SETTLE_SECONDS=60):
+            self.assertIsNone(self.exporter.run()['shard'])
+
+        ChatMessage.objects.filter(pk=reply.pk).update(rated_at=timezone.now() - timedelta(minutes=2))
+        with override_settings(FEEDBACK_EXPORT_SETTLE_SECONDS=60):
+            self.assertEqual(self.exporter.run()['shard']['entries'], 1)
+
+    def test_shards_compact_into_a_snapshot(self):
+        replies = [self._turn(1, rating=5)]
+        self.exporter.run()
+        replies.append(self._turn(2, rating=4))
+        self.exporter.run()
+        self._rate(replies[0], 1)  # downgraded after export
+        replies.append(self._turn(3, rating=5))
+        result = self.exporter.run()
+
+        self.assertIsNotNone(result['snapshot'])
+        manifest = self.exporter.load_manifest()
+        self.assertEqual(manifest['shards'], [])
+        self.assertEqual(self.exporter.files(manifest), [manifest['snapshot']['file']])
+        self.assertEqual(self._answers(self.exporter.files(manifest)), ["A2", "A3"])
+        self.assertEqual(sorted(os.listdir(self.tmp.name)), ['manifest.json', manifest['snapshot']['file']])
+
+    def test_changing_the_threshold_starts_over(self):
+        self._turn(1, rating=4)
+        self._turn(2, rating=5)
+        self.exporter.run()
+
+        result = IncrementalFeedbackExport(directory=self.tmp.name, min_rating=5).run()
+        self.assertEqual(self._answers(result['files']), ["A2"])
+        self.assertEqual(sorted(os.listdir(self.tmp.name)), sorted(['manifest.json'] + result['files']))
+
+    def test_learning_stats_list_the_exported_files(self):
+        with override_settings(FEEDBACK_EXPORT_DIR=self.tmp.name):
+            self.assertEqual(AnalyticsService().get_learning_pipeline_stats()['exported_datasets'], [])
+
+            self._turn(1, rating=5)
+            first = IncrementalFeedbackExport().run()
+            self._turn(2, rating=4)
+            self._turn(3, rating=5)
+            second = IncrementalFeedbackExport().run()
+            stats = AnalyticsService().get_learning_pipeline_stats()
+
+        datasets = stats['exported_datasets']
+        self.assertEqual([d['name'] for d in datasets], [second['shard']['file'], first['shard']['file']])
+        self.assertEqual([d['entries'] for d in datasets], [2, 1])
+        for dataset in datasets:
+            self.assertEqual(dataset['size'], os.path.getsize(os.path.join(self.tmp.name, dataset['name'])))
+        self.assertEqual(stats['high_quality_feedback_count'], 3)
+        self.assertEqual(stats['last_export_status'], 'Success')
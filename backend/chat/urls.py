@@ -1,8 +1,10 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
+from chat import async_views
 from chat.views import (
     ChatSessionViewSet, 
     ChatMessageViewSet, 
+    SyncViewSet,
     AdminAnalyticsViewSet, 
     KnowledgeBaseViewSet,
     UserManagementViewSet,
@@ -12,11 +14,16 @@ from chat.views import (
 router = DefaultRouter()
 router.register(r'sessions', ChatSessionViewSet, basename='chat-session')
 router.register(r'messages', ChatMessageViewSet, basename='chat-message')
+router.register(r'sync', SyncViewSet, basename='chat-sync')
 router.register(r'admin', AdminAnalyticsViewSet, basename='admin-analytics')
 router.register(r'knowledge', KnowledgeBaseViewSet, basename='knowledge-base')
 router.register(r'users', UserManagementViewSet, basename='user-management')
 router.register(r'settings', SettingsViewSet, basename='system-settings')
 
 urlpatterns = [
+	# Registered before the router so it isn't captured as a message detail route
+	path('messages/astream/', async_views.stream_message, name='chat-message-astream'),
+	path('messages/astream/<uuid:turn_id>/', async_views.resume_stream, name='chat-message-aresume'),
+	path('admin/alive/', async_views.live_analytics, name='admin-analytics-alive'),
 	path('', include(router.urls)),
 ]
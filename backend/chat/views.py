@@ -3,9 +3,13 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated, AllowAny, IsAdminUser
 from rest_framework.throttling import AnonRateThrottle
-from django.http import StreamingHttpResponse
-from django.db.models import Q
+from django.db import transaction
+from django.db.models import F, Q
+from django.db.models.functions import Greatest
+from django.utils import timezone
 from datetime import datetime
+import threading
+import uuid
 
 from chat.models import ChatSession, ChatMessage, KnowledgeBaseDocument, SystemSetting
 from chat.serializers import (
@@ -16,14 +20,26 @@ from chat.serializers import (
 	ChatMessageSerializer,
 	MessageRatingSerializer,
 	PublicChatSessionSerializer,
+	SyncMessageSerializer,
 	KnowledgeBaseDocumentSerializer,
 	SystemSettingSerializer,
 	UserSerializer
 )
 from chat.services.rag_service import RAGService
 from chat.services.analytics_service import AnalyticsService
+from chat.services.analytics_cache import AnalyticsDashboard
 from chat.services.admin_logic import AdminLogic
+from chat.services.history_index import HistorySearchService, history_indexes
+from chat.services.admission import admission
+from chat.services.idempotency import IdempotencyService, IdempotencyKeyReused
+from chat.services.replay_buffer import ReplayBuffer
+from chat.services.sync import SyncService, SyncTokenExpired
+from chat.services.live_analytics import live_channel, live_sync
+from chat.services.log_search import LogSearchService
+from chat.services.sse import stream_sync, resume_sync, last_event_id, sse_response, sse_complete_response
+from chat.pagination import MessageCursorPagination
 from chat.tasks import export_high_quality_feedback_task
+from core.exceptions import ConcurrencyLimitExceeded
 from django.contrib.auth import get_user_model
 
 User = get_user_model()
@@ -35,9 +51,12 @@ class ChatSessionViewSet(viewsets.ModelViewSet):
 	Chat session endpoints:
 	- POST   /api/chat/sessions/          → Create new chat
 	- GET    /api/chat/sessions/          → List user's chats
-	- GET    /api/chat/sessions/{id}/     → Get full chat with messages
+	- GET    /api/chat/sessions/{id}/     → Get chat with its latest page of messages
+	- GET    /api/chat/sessions/{id}/messages/?before=|after= → Page through messages
 	- PATCH  /api/chat/sessions/{id}/     → Update chat (title, archive)
 	- DELETE /api/chat/sessions/{id}/     → Delete chat
+	- GET    /api/chat/sessions/search/?q= → Semantic search over own history
+	Deletions are recorded as tombstones for /api/chat/sync/.
 	"""
 	
 	permission_classes = [IsAuthenticated]
@@ -71,25 +90,69 @@ class ChatSessionViewSet(viewsets.ModelViewSet):
 			user=request.user,
 			title=title
 		)
+		live_channel.session_created(session)
 		
 		return Response(
 			ChatSessionListSerializer(session).data,
 			status=status.HTTP_201_CREATED
 		)
 	
+	def _detail(self, session, serializer_class=ChatSessionDetailSerializer):
+		"""Session header plus the latest page of messages"""
+		page = MessageCursorPagination().paginate(session.messages.all())
+		return serializer_class(session, context={'message_page': page}).data
+	
+	@staticmethod
+	def _message_page(session, request):
+		page = MessageCursorPagination().paginate_request(session.messages.all(), request)
+		return {'results': ChatMessageSerializer(page.messages, many=True).data, 'cursors': page.cursors}
+	
+	def retrieve(self, request, *args, **kwargs):
+		return Response(self._detail(self.get_object()))
+	
+	@action(detail=True, methods=['get'])
+	def messages(self, request, pk=None):
+		"""Messages newest first; ?before=<cursor> for older, ?after=<cursor> for newer"""
+		return Response(self._message_page(self.get_object(), request))
+	
+	def perform_destroy(self, instance):
+		user_id = instance.user_id
+		message_ids = list(instance.messages.values_list('id', flat=True))
+		with transaction.atomic():
+			SyncService.record_deletion(user_id, 'session', instance.id)
+			instance.delete()
+			transaction.on_commit(lambda: history_indexes.record_deletions(user_id, message_ids))
+	
 	def update(self, request, *args, **kwargs):
 		"""Update chat title"""
 		session = self.get_object()
 		
+		# Saves only the touched fields, so counters written by a concurrent
+		# turn (TurnStore) aren't overwritten with stale values
 		if 'title' in request.data:
 			session.title = request.data['title']
-			session.save()
+			session.save(update_fields=['title', 'updated_at'])
 		
 		return Response(
-			ChatSessionDetailSerializer(session).data,
+			self._detail(session),
 			status=status.HTTP_200_OK
 		)
 	
+	@action(detail=False, methods=['get'])
+	def search(self, request):
+		"""Semantic search across the user's own chat history"""
+		query = request.query_params.get('q', '').strip()
+		if not query:
+			return Response({'error': 'Query parameter "q" is required'}, status=status.HTTP_400_BAD_REQUEST)
+		
+		try:
+			limit = min(max(int(request.query_params.get('limit', 10)), 1), 50)
+		except ValueError:
+			limit = 10
+		
+		results = HistorySearchService().search(request.user, query, limit=limit)
+		return Response({'query': query, 'results': results})
+	
 	@action(detail=False, methods=['get'])
 	def archived(self, request):
 		"""Get archived sessions"""
@@ -106,7 +169,7 @@ class ChatSessionViewSet(viewsets.ModelViewSet):
 		"""Archive a session (soft delete)"""
 		session = self.get_object()
 		session.is_archived = True
-		session.save()
+		session.save(update_fields=['is_archived', 'updated_at'])
 		
 		return Response(
 			{'status': 'Session archived'},
@@ -118,7 +181,7 @@ class ChatSessionViewSet(viewsets.ModelViewSet):
 		"""Restore archived session"""
 		session = self.get_object()
 		session.is_archived = False
-		session.save()
+		session.save(update_fields=['is_archived', 'updated_at'])
 		
 		return Response(
 			{'status': 'Session restored'},
@@ -130,7 +193,7 @@ class ChatSessionViewSet(viewsets.ModelViewSet):
 		"""Pin a session to top"""
 		session = self.get_object()
 		session.is_pinned = True
-		session.save()
+		session.save(update_fields=['is_pinned', 'updated_at'])
 		
 		return Response(
 			{'status': 'Session pinned'},
@@ -142,7 +205,7 @@ class ChatSessionViewSet(viewsets.ModelViewSet):
 		"""Unpin a session"""
 		session = self.get_object()
 		session.is_pinned = False
-		session.save()
+		session.save(update_fields=['is_pinned', 'updated_at'])
 		
 		return Response(
 			{'status': 'Session unpinned'},
@@ -154,7 +217,7 @@ class ChatSessionViewSet(viewsets.ModelViewSet):
 		"""Toggle public sharing for a session"""
 		session = self.get_object()
 		session.is_public = not session.is_public
-		session.save()
+		session.save(update_fields=['is_public', 'updated_at'])
 		
 		return Response({
 			'status': 'public' if session.is_public else 'private',
@@ -175,8 +238,45 @@ class ChatSessionViewSet(viewsets.ModelViewSet):
 				status=status.HTTP_404_NOT_FOUND
 			)
 		
-		serializer = PublicChatSessionSerializer(session)
-		return Response(serializer.data)
+		return Response(self._detail(session, PublicChatSessionSerializer))
+	
+	@action(
+		detail=True, methods=['get'], url_path='public/messages',
+		permission_classes=[AllowAny], throttle_classes=[AnonRateThrottle]
+	)
+	def public_messages(self, request, pk=None):
+		"""Page through a public session's messages (same cursors as /messages/)"""
+		session = ChatSession.objects.filter(pk=pk, is_public=True).first()
+		if session is None:
+			return Response(
+				{'error': 'Chat not found or not public'},
+				status=status.HTTP_404_NOT_FOUND
+			)
+		return Response(self._message_page(session, request))
+
+
+class SyncViewSet(viewsets.ViewSet):
+	"""
+	Delta sync:
+	- GET /api/chat/sync/             → Token positioned now (after a full load)
+	- GET /api/chat/sync/?since=<tok> → Sessions/messages changed or deleted since tok
+	Follow 'next' while 'has_more'; 410 means the token expired and the
+	client must reload sessions and start over.
+	"""
+	
+	permission_classes = [IsAuthenticated]
+	
+	def list(self, request):
+		try:
+			changes = SyncService().changes(request.user, request.query_params.get('since'))
+		except SyncTokenExpired as e:
+			return Response({'error': str(e), 'code': 'resync_required'}, status=status.HTTP_410_GONE)
+		except ValueError as e:
+			return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+		
+		changes['sessions'] = ChatSessionListSerializer(changes['sessions'], many=True).data
+		changes['messages'] = SyncMessageSerializer(changes['messages'], many=True).data
+		return Response(changes)
 
 
 class ChatMessageViewSet(viewsets.ModelViewSet):
@@ -184,12 +284,37 @@ class ChatMessageViewSet(viewsets.ModelViewSet):
 	Message endpoints:
 	- POST /api/chat/messages/           → Send message (triggers RAG pipeline)
 	- POST /api/chat/messages/stream/    → Stream message (SSE)
+	- GET  /api/chat/messages/stream/{turn_id}/ → Resume a dropped stream (SSE)
 	- POST /api/chat/messages/{id}/rate/ → Rate AI response (1-5)
+	- DELETE /api/chat/messages/{id}/    → Delete one of your messages
+	Sending and streaming honour an Idempotency-Key header.
 	"""
 	
 	permission_classes = [IsAuthenticated]
 	serializer_class = ChatMessageSerializer
 	
+	def get_queryset(self):
+		return ChatMessage.objects.filter(session__user=self.request.user)
+	
+	def perform_destroy(self, instance):
+		# Tombstone for delta sync, and the session counters and
+		# last-message snapshot TurnStore keeps
+		with transaction.atomic():
+			SyncService.record_deletion(self.request.user.id, 'message', instance.id)
+			message_id, session_id, tokens = instance.id, instance.session_id, instance.tokens_used or 0
+			instance.delete()
+			newest = ChatMessage.objects.filter(session_id=session_id).order_by(
+				'-created_at', '-id'
+			).only('created_at', 'content').first()
+			ChatSession.objects.filter(pk=session_id).update(
+				message_count=Greatest(F('message_count') - 1, 0),
+				total_tokens=Greatest(F('total_tokens') - tokens, 0),
+				last_message_at=newest.created_at if newest else None,
+				last_message_preview=ChatSession.preview(newest.content) if newest else None,
+				updated_at=timezone.now()
+			)
+			transaction.on_commit(lambda: history_indexes.record_deletions(self.request.user.id, [message_id]))
+	
 	def create(self, request, *args, **kwargs):
 		"""
 		Send message to chat - Triggers full RAG pipeline
@@ -215,23 +340,72 @@ class ChatMessageViewSet(viewsets.ModelViewSet):
 		except ChatSession.DoesNotExist:
 			return Response({'error': 'Session not found'}, status=status.HTTP_404_NOT_FOUND)
 		
-		rag_service = RAGService()
-		user_msg, assistant_msg = rag_service.process_user_message(
-			session=session,
-			user_message=user_message,
-			use_rag=use_rag,
-			temperature=temperature
-		)
+		# A retried request (same Idempotency-Key) gets the original turn back
+		try:
+			record, created = IdempotencyService.claim_request(request, session, serializer.validated_data)
+		except IdempotencyKeyReused as e:
+			return Response({'error': str(e)}, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+		except ValueError as e:
+			return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+		if record is not None and not created:
+			turn = IdempotencyService.find_turn(record)
+			if turn is None:
+				return self._idempotency_in_progress()
+			response = Response({
+				'user_message': ChatMessageSerializer(turn[0]).data,
+				'assistant_message': ChatMessageSerializer(turn[1]).data
+			}, status=status.HTTP_200_OK)
+			response['Idempotent-Replayed'] = 'true'
+			return response
+		
+		self._admit(request, record)
+		try:
+			rag_service = RAGService()
+			user_msg, assistant_msg = rag_service.process_user_message(
+				session=session,
+				user_message=user_message,
+				use_rag=use_rag,
+				temperature=temperature,
+				turn_id=record.turn_id if record else None
+			)
+		except Exception:
+			if record is not None:
+				IdempotencyService.release(record)
+			raise
+		finally:
+			admission.release(request.user.id)
 		
 		return Response({
 			'user_message': ChatMessageSerializer(user_msg).data,
 			'assistant_message': ChatMessageSerializer(assistant_msg).data
 		}, status=status.HTTP_201_CREATED)
 
+	@staticmethod
+	def _admit(request, record):
+		"""
+		Take a generation slot (waits briefly, then 429 + Retry-After).
+		A rejected request gives its Idempotency-Key back for the retry.
+		"""
+		try:
+			admission.acquire(request.user.id)
+		except ConcurrencyLimitExceeded:
+			if record is not None:
+				IdempotencyService.release(record)
+			raise
+
+	@staticmethod
+	def _idempotency_in_progress():
+		response = Response(
+			{'error': f"A request with this {IdempotencyService.HEADER} is still in progress"},
+			status=status.HTTP_409_CONFLICT
+		)
+		response['Retry-After'] = '1'
+		return response
+
 	@action(detail=False, methods=['post'])
 	def stream(self, request):
 		"""
-		Stream message via SSE
+		Stream message via SSE (typed events: sources, token, done; see chat.services.sse)
 		"""
 		data = dict(request.data)
 		serializer = SendMessageSerializer(data=data)
@@ -248,17 +422,64 @@ class ChatMessageViewSet(viewsets.ModelViewSet):
 		except ChatSession.DoesNotExist:
 			return Response({'error': 'Session not found'}, status=status.HTTP_404_NOT_FOUND)
 
-		def event_stream():
-			rag_service = RAGService()
-			for chunk in rag_service.stream_user_message(
-				session=session,
-				user_message=user_message,
-				use_rag=use_rag,
-				temperature=temperature
-			):
-				yield f"data: {chunk}\n\n"
+		# A retried request (same Idempotency-Key) attaches to the original
+		# stream while it runs, or replays the stored turn once it's done
+		try:
+			record, created = IdempotencyService.claim_request(request, session, serializer.validated_data)
+		except IdempotencyKeyReused as e:
+			return Response({'error': str(e)}, status=status.HTTP_422_UNPROCESSABLE_ENTITY)
+		except ValueError as e:
+			return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+		if record is not None and not created:
+			buffer = ReplayBuffer(record.turn_id)
+			if buffer.owner() == str(request.user.id):
+				return sse_response(resume_sync(buffer, last_event_id(request)), turn_id=record.turn_id)
+			turn = IdempotencyService.find_turn(record)
+			if turn is None:
+				return self._idempotency_in_progress()
+			response = sse_complete_response(RAGService.stored_turn_events(*turn), turn_id=record.turn_id)
+			response['Idempotent-Replayed'] = 'true'
+			return response
+
+		self._admit(request, record)
+		turn_id = record.turn_id if record else uuid.uuid4()
+		buffer = ReplayBuffer(turn_id)
+		buffer.open(request.user.id)
+		cancel = threading.Event()
+		user_id = request.user.id
+
+		def events():
+			try:
+				rag_service = RAGService()
+				yield from rag_service.stream_user_message(
+					session=session,
+					user_message=user_message,
+					use_rag=use_rag,
+					temperature=temperature,
+					turn_id=turn_id,
+					cancel=cancel
+				)
+			except Exception:
+				if record is not None:
+					IdempotencyService.release(record)
+				raise
+			finally:
+				# The slot is held until the generation ends, not the response
+				admission.release(user_id)
+
+		return sse_response(stream_sync(events(), buffer=buffer, cancel=cancel), turn_id=turn_id)
+
+	@action(detail=False, methods=['get'], url_path=r'stream/(?P<turn_id>[0-9a-f-]{36})')
+	def resume(self, request, turn_id=None):
+		"""
+		Resume a dropped stream (SSE). Replays frames after Last-Event-ID
+		from the turn's replay buffer, then tails the live generation.
+		"""
+		buffer = ReplayBuffer(turn_id)
+		if buffer.owner() != str(request.user.id):
+			return Response({'error': 'Stream not found'}, status=status.HTTP_404_NOT_FOUND)
 
-		return StreamingHttpResponse(event_stream(), content_type="text/event-stream")
+		return sse_response(resume_sync(buffer, last_event_id(request)), turn_id=turn_id)
 	
 	@action(detail=True, methods=['post'])
 	def rate(self, request, pk=None):
@@ -275,6 +496,7 @@ class ChatMessageViewSet(viewsets.ModelViewSet):
 			
 			rating = serializer.validated_data['rating']
 			message.rating = rating
+			message.rated_at = timezone.now()
 			message.save()
 			
 			return Response({'status': 'Message rated', 'rating': rating}, status=status.HTTP_200_OK)
@@ -287,51 +509,62 @@ class AdminAnalyticsViewSet(viewsets.ViewSet):
 	Admin-only endpoints for analytics and system monitoring.
 	"""
 	permission_classes = [IsAdminUser]
+	MAX_DAYS = 365
+
+	def _days(self, request, default):
+		"""?days=, clamped to 1..MAX_DAYS; raises ValueError if not an integer"""
+		try:
+			days = int(request.query_params.get('days', default))
+		except ValueError:
+			raise ValueError("days must be an integer")
+		return max(1, min(days, self.MAX_DAYS))
 	
 	def list(self, request):
-		"""Get all analytics summary"""
-		service = AnalyticsService()
-		days = int(request.query_params.get('days', 30))
-		
-		return Response({
-			'summary': service.get_summary_stats(days),
-			'nlp': service.get_nlp_performance(days),
-			'intents': service.get_intent_distribution(days),
-			'trends': service.get_engagement_trends(days if days < 30 else 7),
-			'learning': service.get_learning_pipeline_stats(),
-			'health': service.get_system_health()
-		})
+		"""Get all analytics summary (cached, stale-while-revalidate)"""
+		try:
+			days = self._days(request, 30)
+		except ValueError as e:
+			return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+		return Response(AnalyticsDashboard.get(days))
+
+	@action(detail=False, methods=['get'])
+	def live(self, request):
+		"""
+		Live metric deltas (SSE): status, turn, session and resync events.
+		Reconnect with Last-Event-ID to resume. For WSGI deployments; under
+		ASGI dashboards use the async admin/alive/ view.
+		"""
+		return sse_response(live_sync(last_event_id(request)))
 
 	@action(detail=False, methods=['get'])
 	def trends(self, request):
-		service = AnalyticsService()
-		days = int(request.query_params.get('days', 7))
-		return Response(service.get_engagement_trends(days))
+		try:
+			days = self._days(request, 7)
+		except ValueError as e:
+			return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+		return Response(AnalyticsService().get_engagement_trends(days))
+
+	@action(detail=False, methods=['get'])
+	def series(self, request):
+		"""?metrics=sessions,messages,tokens,fallbacks&interval=hour|day|week&days=30"""
+		metrics = [m for m in request.query_params.get('metrics', 'sessions').split(',') if m]
+		try:
+			days = self._days(request, 30)
+			data = AnalyticsService().get_series(metrics, days, request.query_params.get('interval', 'day'))
+		except ValueError as e:
+			return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+		return Response(data)
 
 	@action(detail=False, methods=['get'])
 	def logs(self, request):
-		"""Searchable chat logs for admins"""
-		query = request.query_params.get('q', '')
-		sessions = ChatSession.objects.all().order_by('-updated_at')
-		
-		if query:
-			sessions = sessions.filter(
-				Q(title__icontains=query) | 
-				Q(user__email__icontains=query) |
-				Q(messages__content__icontains=query)
-			).distinct()
-			
-		# Simple serialization for logs
-		data = []
-		for s in sessions[:50]: # Limit for now
-			data.append({
-				'id': s.id,
-				'user': s.user.email,
-				'title': s.title,
-				'updated_at': s.updated_at,
-				'message_count': s.messages.count()
-			})
-			
+		"""Searchable chat logs for admins: ?q=<terms>&cursor=<next>&limit=50, best match first"""
+		try:
+			limit = max(1, min(int(request.query_params.get('limit', 50)), 100))
+			data = LogSearchService.search(
+				request.query_params.get('q', ''), request.query_params.get('cursor'), limit
+			)
+		except ValueError as e:
+			return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
 		return Response(data)
 
 	@action(detail=False, methods=['post'])
@@ -1,6 +1,6 @@
 """Custom exceptions for the authentication system."""
 
-from rest_framework.exceptions import APIException
+from rest_framework.exceptions import APIException, Throttled
 from rest_framework import status
 
 
@@ -35,3 +35,9 @@ class RateLimitExceeded(APIException):
     status_code = status.HTTP_429_TOO_MANY_REQUESTS
     default_detail = 'Too many requests. Please try again later.'
     default_code = 'rate_limit_exceeded'
+
+
+class ConcurrencyLimitExceeded(Throttled):
+    """Exception raised when too many responses are being generated at once."""
+    default_detail = 'Too many responses in progress. Please try again shortly.'
+    default_code = 'concurrency_limit_exceeded'
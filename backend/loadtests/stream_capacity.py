@@ -0,0 +1,110 @@
+"""
+Concurrent-stream capacity load test.
+
+Opens N simultaneous SSE chat streams at increasing concurrency levels and
+reports time-to-first-byte, completion time and failures per level. Run it
+once against the sync endpoint (gunicorn sync workers) and once against the
+async endpoint (ASGI) with the same worker count to compare capacity:
+
+    python loadtests/stream_capacity.py --base-url http://localhost:8000 \
+        --token $JWT --session-id $SESSION --endpoint stream --levels 1,4,8,16,32
+
+    python loadtests/stream_capacity.py ... --endpoint astream --levels 1,16,64,128,256
+
+Capacity per worker is the highest level with no errors and a p95 TTFB
+under --ttfb-budget, divided by the number of server workers.
+"""
+
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+ENDPOINTS = {
+    'stream': '/api/chat/messages/stream/',
+    'astream': '/api/chat/messages/astream/',
+}
+
+
+async def open_stream(client, url, headers, payload):
+    """Run one stream to completion → (ttfb, total, ok)"""
+    start = time.perf_counter()
+    ttfb = None
+    try:
+        async with client.stream('POST', url, headers=headers, json=payload) as response:
+            if response.status_code != 200:
+                return None, time.perf_counter() - start, False
+            async for _ in response.aiter_bytes():
+                if ttfb is None:
+                    ttfb = time.perf_counter() - start
+        return ttfb, time.perf_counter() - start, ttfb is not None
+    except httpx.HTTPError:
+        return ttfb, time.perf_counter() - start, False
+
+
+def percentile(values, pct):
+    if not values:
+        return float('nan')
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(pct / 100 * (len(values) - 1))))]
+
+
+async def run_level(args, level):
+    url = args.base_url.rstrip('/') + ENDPOINTS[args.endpoint]
+    headers = {'Authorization': f'Bearer {args.token}'}
+    payload = {'session_id': args.session_id, 'content': args.prompt, 'use_rag': True}
+
+    limits = httpx.Limits(max_connections=level, max_keepalive_connections=level)
+    async with httpx.AsyncClient(timeout=args.timeout, limits=limits) as client:
+        started = time.perf_counter()
+        results = await asyncio.gather(*[open_stream(client, url, headers, payload) for _ in range(level)])
+        wall = time.perf_counter() - started
+
+    ttfbs = [r[0] for r in results if r[0] is not None]
+    totals = [r[1] for r in results if r[2]]
+    errors = sum(1 for r in results if not r[2])
+    return {
+        'level': level,
+        'ok': level - errors,
+        'errors': errors,
+        'ttfb_p50': percentile(ttfbs, 50),
+        'ttfb_p95': percentile(ttfbs, 95),
+        'total_mean': statistics.mean(totals) if totals else float('nan'),
+        'wall': wall,
+    }
+
+
+async def main(args):
+    levels = [int(x) for x in args.levels.split(',')]
+    capacity = 0
+
+    print(f"Endpoint: {ENDPOINTS[args.endpoint]}  workers: {args.workers}")
+    print(f"{'level':>6} {'ok':>5} {'err':>5} {'ttfb p50':>9} {'ttfb p95':>9} {'mean total':>11} {'wall':>7}")
+    for level in levels:
+        row = await run_level(args, level)
+        print(
+            f"{row['level']:>6} {row['ok']:>5} {row['errors']:>5} "
+            f"{row['ttfb_p50']:>9.2f} {row['ttfb_p95']:>9.2f} {row['total_mean']:>11.2f} {row['wall']:>7.2f}"
+        )
+        if row['errors'] == 0 and row['ttfb_p95'] <= args.ttfb_budget:
+            capacity = level
+        await asyncio.sleep(args.pause)
+
+    print(f"\nSustained concurrent streams: {capacity} ({capacity / args.workers:.1f} per worker)")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--base-url', default='http://localhost:8000')
+    parser.add_argument('--token', required=True, help="JWT access token")
+    parser.add_argument('--session-id', required=True, help="Chat session owned by the token's user")
+    parser.add_argument('--endpoint', choices=ENDPOINTS.keys(), default='astream')
+    parser.add_argument('--levels', default='1,8,32,64,128,256')
+    parser.add_argument('--workers', type=int, default=1, help="Server worker processes (for the per-worker figure)")
+    parser.add_argument('--prompt', default="Give me three tips for clearer writing.")
+    parser.add_argument('--ttfb-budget', type=float, default=3.0, help="Max acceptable p95 TTFB in seconds")
+    parser.add_argument('--timeout', type=float, default=120.0)
+    parser.add_argument('--pause', type=float, default=2.0, help="Seconds between levels")
+    asyncio.run(main(parser.parse_args()))
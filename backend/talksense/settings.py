@@ -3,6 +3,7 @@ from pathlib import Path
 import sys
 from datetime import timedelta
 from dotenv import load_dotenv
+from corsheaders.defaults import default_headers
 
 # Base directory (used for loading .env and file paths)
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -186,14 +187,62 @@ CELERY_BEAT_SCHEDULE = {
         'task': 'chat.tasks.export_high_quality_feedback_task',
         'schedule': timedelta(days=1),  # Run daily
     },
+    'purge-expired-idempotency-keys': {
+        'task': 'chat.tasks.purge_expired_idempotency_keys_task',
+        'schedule': timedelta(hours=1),
+    },
+    'purge-sync-tombstones': {
+        'task': 'chat.tasks.purge_sync_tombstones_task',
+        'schedule': timedelta(days=1),
+    },
+    'roll-up-daily-usage': {
+        'task': 'chat.tasks.roll_up_daily_usage_task',
+        'schedule': timedelta(minutes=15),
+    },
 }
 
+# Analytics rollups: a day is rolled up this long after it ends (late
+# writes land first); backfill is spread over runs of at most MAX_DAYS
+ANALYTICS_ROLLUP_GRACE_MINUTES = int(os.getenv('ANALYTICS_ROLLUP_GRACE_MINUTES', '15'))
+ANALYTICS_ROLLUP_MAX_DAYS = int(os.getenv('ANALYTICS_ROLLUP_MAX_DAYS', '31'))
+
+# Latency percentiles: DDSketch relative accuracy (0.01 = quantiles within 1%)
+LATENCY_SKETCH_ACCURACY = float(os.getenv('LATENCY_SKETCH_ACCURACY', '0.01'))
+
+# Admin analytics payload: sections computed on this many threads; served
+# from cache while younger than FRESH, refreshed in the background (one
+# refresh at a time) while younger than STALE
+ANALYTICS_SECTION_WORKERS = int(os.getenv('ANALYTICS_SECTION_WORKERS', '4'))
+ANALYTICS_CACHE_FRESH_SECONDS = int(os.getenv('ANALYTICS_CACHE_FRESH_SECONDS', '60'))
+ANALYTICS_CACHE_STALE_SECONDS = int(os.getenv('ANALYTICS_CACHE_STALE_SECONDS', '3600'))
+
+# Live admin analytics (SSE): deltas kept in the shared cache for
+# subscribers to catch up on; each connection lasts at most MAX_SECONDS
+LIVE_ANALYTICS_MAX_EVENTS = int(os.getenv('LIVE_ANALYTICS_MAX_EVENTS', '1000'))
+LIVE_ANALYTICS_POLL_MS = int(os.getenv('LIVE_ANALYTICS_POLL_MS', '500'))
+LIVE_ANALYTICS_STATUS_SECONDS = int(os.getenv('LIVE_ANALYTICS_STATUS_SECONDS', '5'))
+LIVE_ANALYTICS_MAX_SECONDS = int(os.getenv('LIVE_ANALYTICS_MAX_SECONDS', '300'))
+
 # Celery Worker Optimizations for Scalability
 CELERY_WORKER_CONCURRENCY = int(os.getenv('CELERY_WORKER_CONCURRENCY', 4))
 CELERY_WORKER_MAX_TASKS_PER_CHILD = 1000
 CELERY_TASK_SOFT_TIME_LIMIT = 300  # 5 minutes
 CELERY_TASK_TIME_LIMIT = 360  # 6 minutes
 
+# Post-turn work (response embedding, bookkeeping) for turns in the same
+# session within this window is coalesced into a single task run
+POST_TURN_COALESCE_SECONDS = int(os.getenv('POST_TURN_COALESCE_SECONDS', '2'))
+
+# Rows fetched per round trip when streaming the feedback dataset export
+FEEDBACK_EXPORT_CHUNK_SIZE = int(os.getenv('FEEDBACK_EXPORT_CHUNK_SIZE', '2000'))
+
+# Incremental feedback export (chat.services.feedback_export): delta shards and
+# manifest live here; shards are compacted into one snapshot once this many
+# accumulate; ratings younger than the settle window wait for the next run
+FEEDBACK_EXPORT_DIR = os.getenv('FEEDBACK_EXPORT_DIR', os.path.join(BASE_DIR, 'media', 'datasets', 'feedback'))
+FEEDBACK_EXPORT_COMPACT_SHARDS = int(os.getenv('FEEDBACK_EXPORT_COMPACT_SHARDS', '7'))
+FEEDBACK_EXPORT_SETTLE_SECONDS = int(os.getenv('FEEDBACK_EXPORT_SETTLE_SECONDS', '60'))
+
 # REST Framework Configuration
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
@@ -218,6 +267,16 @@ REST_FRAMEWORK = {
     },
 }
 
+# Messages per page in session detail and /sessions/{id}/messages/ (max 100)
+MESSAGE_PAGE_SIZE = int(os.getenv('MESSAGE_PAGE_SIZE', '30'))
+
+# Delta sync (/api/chat/sync/): rows per stream per response, how far back
+# a caught-up token re-reads (late-committing transactions), and how long
+# deletion tombstones (and so sync tokens) are kept
+SYNC_MAX_CHANGES = int(os.getenv('SYNC_MAX_CHANGES', '200'))
+SYNC_OVERLAP_SECONDS = int(os.getenv('SYNC_OVERLAP_SECONDS', '2'))
+SYNC_TOMBSTONE_TTL_DAYS = int(os.getenv('SYNC_TOMBSTONE_TTL_DAYS', '30'))
+
 # JWT Configuration
 
 SIMPLE_JWT = {
@@ -252,13 +311,86 @@ if not GOOGLE_CLIENT_ID:
 # MAGIC_LINK_EXPIRATION = 900  # 15 minutes in seconds
 # MAGIC_LINK_RATE_LIMIT = 3  # Max requests per email per hour
 
-# Cache Configuration for magic link tokens
-CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-        'LOCATION': 'talksense-cache',
+# Cache Configuration
+# Besides magic link tokens, the cache holds state every worker process must
+# see: stream replay buffers, idempotency keys, admission counters, the LLM
+# circuit breaker and degradation signals, live analytics. Deployments running
+# more than one gunicorn/uvicorn worker must set CACHE_URL to a shared backend
+# (redis://..., rediss://... or memcached://host:port, which needs pymemcache).
+# Without it each process gets its own LocMemCache, and the chat.E001 check
+# reports it when WEB_CONCURRENCY > 1.
+CACHE_URL = os.getenv('CACHE_URL', '')
+if CACHE_URL.startswith(('redis://', 'rediss://', 'unix://')):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_URL,
+            'KEY_PREFIX': 'talksense',
+        }
+    }
+elif CACHE_URL.startswith('memcached://'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.memcached.PyMemcacheCache',
+            'LOCATION': CACHE_URL[len('memcached://'):],
+            'KEY_PREFIX': 'talksense',
+        }
+    }
+elif CACHE_URL:
+    raise ValueError("CACHE_URL must start with redis://, rediss://, unix:// or memcached://")
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'talksense-cache',
+        }
     }
-}
+
+# Chat history search: max per-user vector indexes kept in memory per process
+HISTORY_INDEX_MAX_USERS = int(os.getenv('HISTORY_INDEX_MAX_USERS', '256'))
+
+# Message embeddings are stored packed in chat.MessageEmbedding ('float16' or 'float32')
+MESSAGE_EMBEDDING_DTYPE = os.getenv('MESSAGE_EMBEDDING_DTYPE', 'float16')
+
+# Chat SSE streams: token coalescing window/size and idle heartbeat interval
+SSE_FLUSH_INTERVAL_MS = int(os.getenv('SSE_FLUSH_INTERVAL_MS', '50'))
+SSE_FLUSH_BYTES = int(os.getenv('SSE_FLUSH_BYTES', '512'))
+SSE_HEARTBEAT_SECONDS = int(os.getenv('SSE_HEARTBEAT_SECONDS', '15'))
+
+# Resumable streams: frames kept per turn in the shared cache, for how long,
+# and how often a reconnected client polls for the live tail
+SSE_REPLAY_MAX_EVENTS = int(os.getenv('SSE_REPLAY_MAX_EVENTS', '500'))
+SSE_REPLAY_TTL_SECONDS = int(os.getenv('SSE_REPLAY_TTL_SECONDS', '300'))
+SSE_REPLAY_POLL_MS = int(os.getenv('SSE_REPLAY_POLL_MS', '100'))
+
+# Cancel a generation once no client has been attached for this long
+SSE_DISCONNECT_GRACE_SECONDS = int(os.getenv('SSE_DISCONNECT_GRACE_SECONDS', '10'))
+
+# How long an Idempotency-Key on message submission is honoured
+IDEMPOTENCY_KEY_TTL_HOURS = int(os.getenv('IDEMPOTENCY_KEY_TTL_HOURS', '24'))
+
+# Admission control for LLM generations (chat.services.admission): concurrent
+# generations per user and overall, how long a request may wait for a slot,
+# the Retry-After sent when it can't get one, and a safety expiry for counters
+LLM_MAX_INFLIGHT_PER_USER = int(os.getenv('LLM_MAX_INFLIGHT_PER_USER', '2'))
+LLM_MAX_INFLIGHT_GLOBAL = int(os.getenv('LLM_MAX_INFLIGHT_GLOBAL', '64'))
+LLM_ADMISSION_QUEUE_SECONDS = float(os.getenv('LLM_ADMISSION_QUEUE_SECONDS', '2'))
+LLM_ADMISSION_RETRY_AFTER_SECONDS = int(os.getenv('LLM_ADMISSION_RETRY_AFTER_SECONDS', '2'))
+LLM_INFLIGHT_TTL_SECONDS = int(os.getenv('LLM_INFLIGHT_TTL_SECONDS', '300'))
+
+# Load shedding (chat.services.degradation). Levels: 1 skip history,
+# 2 top_k=1, 3 cap output at DEGRADED_MAX_TOKENS, 4 FAISS-only answers.
+# Each list holds the signal value at which levels 1-4 start; p95 TTFT
+# (over the last DEGRADATION_TTFT_WINDOW_SECONDS) only drives levels 1-3.
+DEGRADATION_INFLIGHT_RATIOS = [float(x) for x in os.getenv('DEGRADATION_INFLIGHT_RATIOS', '0.5,0.7,0.85,0.95').split(',')]
+DEGRADATION_TTFT_SECONDS = [float(x) for x in os.getenv('DEGRADATION_TTFT_SECONDS', '2,4,6').split(',')]
+DEGRADATION_TTFT_WINDOW_SECONDS = int(os.getenv('DEGRADATION_TTFT_WINDOW_SECONDS', '300'))
+DEGRADATION_FORCE_LEVEL = int(os.getenv('DEGRADATION_FORCE_LEVEL')) if os.getenv('DEGRADATION_FORCE_LEVEL') else None
+DEGRADED_MAX_TOKENS = int(os.getenv('DEGRADED_MAX_TOKENS', '512'))
+
+# Gemini circuit breaker: consecutive failures to open, seconds before a probe
+LLM_BREAKER_FAILURES = int(os.getenv('LLM_BREAKER_FAILURES', '5'))
+LLM_BREAKER_COOLDOWN_SECONDS = int(os.getenv('LLM_BREAKER_COOLDOWN_SECONDS', '30'))
 
 # CORS Configuration
 CORS_ALLOWED_ORIGINS = os.getenv(
@@ -273,6 +405,10 @@ if not DEBUG:
 
 CORS_ALLOW_CREDENTIALS = True
 
+# Stream resume handle (see chat.services.sse), idempotent replays, 429 back-off
+CORS_EXPOSE_HEADERS = ['X-Turn-Id', 'Idempotent-Replayed', 'Retry-After']
+CORS_ALLOW_HEADERS = (*default_headers, 'idempotency-key', 'last-event-id')
+
 CORS_ALLOW_ALL_ORIGINS = False
 
 
@@ -171,16 +171,56 @@ export const AppLayout = () => {
   const toggleSidebar = () => setCollapsed(!collapsed);
   const toggleMobileMenu = () => setMobileMenuOpen(!mobileMenuOpen);
 
-  const fetchSessions = useCallback(async () => {
+  // Delta sync position; null until the first full load
+  const syncTokenRef = useRef(null);
+
+  const loadSessions = useCallback(async () => {
     try {
+      // Take the token first: changes made during the fetch are re-sent, not lost
+      const token = (await chatService.sync()).data?.next;
       const res = await chatService.getSessions();
       const sessionsData = res.data?.results || (Array.isArray(res.data) ? res.data : []);
       setSessions(sessionsData);
+      syncTokenRef.current = token || null;
     } catch (err) {
       console.error("Failed to fetch sessions:", err);
     }
   }, []);
 
+  // Applies only what changed since the last sync instead of refetching the list
+  const fetchSessions = useCallback(async () => {
+    if (!syncTokenRef.current) return loadSessions();
+    try {
+      let token = syncTokenRef.current;
+      const changed = [];
+      const deleted = new Set();
+      let hasMore = true;
+      while (hasMore) {
+        const { data } = await chatService.sync(token);
+        changed.push(...data.sessions);
+        data.deleted.sessions.forEach((id) => deleted.add(id));
+        token = data.next;
+        hasMore = data.has_more;
+      }
+      syncTokenRef.current = token;
+      if (!changed.length && !deleted.size) return;
+
+      setSessions((prev) => {
+        const byId = new Map(prev.map((s) => [s.id, s]));
+        changed.forEach((s) => (s.is_archived ? byId.delete(s.id) : byId.set(s.id, s)));
+        deleted.forEach((id) => byId.delete(id));
+        return [...byId.values()].sort(
+          (a, b) => (b.is_pinned - a.is_pinned) || new Date(b.updated_at) - new Date(a.updated_at)
+        );
+      });
+    } catch (err) {
+      // 410: token expired; anything else: fall back to a full reload
+      console.error("Failed to sync sessions:", err);
+      syncTokenRef.current = null;
+      loadSessions();
+    }
+  }, [loadSessions]);
+
   const handlePin = async (session) => {
     try {
       if (session.is_pinned) {
@@ -257,21 +297,8 @@ export const AppLayout = () => {
   };
 
   useEffect(() => {
-    let mounted = true;
-    const fetch = async () => {
-      try {
-        const res = await chatService.getSessions();
-        if (mounted) {
-          const sessionsData = res.data?.results || (Array.isArray(res.data) ? res.data : []);
-          setSessions(sessionsData);
-        }
-      } catch (err) {
-        console.error("Failed to fetch sessions:", err);
-      }
-    };
-    fetch();
-    return () => { mounted = false; };
-  }, [location.pathname]); // Re-fetch on navigation to catch new sessions
+    fetchSessions();
+  }, [location.pathname, fetchSessions]); // Sync on navigation to catch new sessions
 
   // Resizing logic
   useEffect(() => {
@@ -58,6 +58,7 @@ const AnalyticsDashboard = () => {
   const [loading, setLoading] = useState(true);
   const [data, setData] = useState(null);
   const [logs, setLogs] = useState([]);
+  const [logsCursor, setLogsCursor] = useState(null);
   const [users, setUsers] = useState([]);
   const [settings, setSettings] = useState({});
   const [logSearchQuery, setLogSearchQuery] = useState('');
@@ -83,14 +84,15 @@ const AnalyticsDashboard = () => {
       });
     }
     
-    // Latency Alert (threshold: > 3s)
-    if (analyticsData?.nlp?.avg_latency > 3) {
+    // Latency Alert (threshold: p90 > 3s)
+    const p90Latency = analyticsData?.nlp?.latency?.latency?.p90;
+    if (p90Latency > 3) {
       newAlerts.push({
         id: 'latency-degradation',
         type: 'performance',
-        severity: analyticsData.nlp.avg_latency > 5 ? 'critical' : 'warning',
+        severity: p90Latency > 5 ? 'critical' : 'warning',
         title: 'Performance Degradation',
-        message: `Average latency is ${analyticsData.nlp.avg_latency}s - exceeds 3s threshold`,
+        message: `p90 latency is ${p90Latency}s - exceeds 3s threshold`,
         timestamp: now,
         acknowledged: false
       });
@@ -140,7 +142,8 @@ const AnalyticsDashboard = () => {
       
       const settingsMap = results[2].data.reduce((acc, s) => ({ ...acc, [s.key]: s.value }), {});
       setSettings(settingsMap);
-      setLogs(results[3].data);
+      setLogs(results[3].data.results);
+      setLogsCursor(results[3].data.next);
     } catch (error) {
       console.error("Failed to load admin metrics:", error);
       toast.error("Failed to load admin metrics");
@@ -162,12 +165,52 @@ const AnalyticsDashboard = () => {
     loadAdminData();
   }, [loadAdminData]);
 
+  // Apply live deltas to the loaded payload instead of polling it
+  useEffect(() => {
+    const controller = new AbortController();
+    const bump = (counts = {}, key) => ({ ...counts, [key]: (counts[key] || 0) + 1 });
+
+    adminAPI.streamLive((event, payload) => {
+      if (event === 'resync') {
+        adminAPI.getAnalytics(days).then((response) => setData(response.data)).catch(() => {});
+        return;
+      }
+      setData((current) => {
+        if (!current) return current;
+        if (event === 'session') {
+          return { ...current, summary: { ...current.summary, total_conversations: current.summary.total_conversations + 1 } };
+        }
+        if (event === 'turn') {
+          const total = current.nlp.total_responses;
+          const fallbacks = Math.round((current.nlp.fallback_rate * total) / 100) + (payload.fallback ? 1 : 0);
+          return {
+            ...current,
+            intents: bump(current.intents, payload.intent),
+            nlp: {
+              ...current.nlp,
+              total_responses: total + 1,
+              fallback_rate: Math.round((fallbacks / (total + 1)) * 1000) / 10,
+              sentiment_breakdown: bump(current.nlp.sentiment_breakdown, payload.sentiment),
+            },
+          };
+        }
+        if (event === 'status') {
+          return { ...current, health: { ...current.health, ...payload } };
+        }
+        return current;
+      });
+    }, controller.signal);
+
+    return () => controller.abort();
+  }, [days]);
+
   const handleLogSearch = async (e) => {
     e.preventDefault();
     setLoading(true);
     try {
       const response = await adminAPI.searchLogs(logSearchQuery);
-      setLogs(response.data);
+      setLogs(response.data.results);
+      setLogsCursor(response.data.next);
     } catch (err) {
       console.error("Log search failed:", err);
       toast.error("Log search failed");
@@ -176,6 +219,17 @@ const AnalyticsDashboard = () => {
     }
   };
 
+  const handleLoadMoreLogs = async () => {
+    try {
+      const response = await adminAPI.searchLogs(logSearchQuery, logsCursor);
+      setLogs((prev) => [...prev, ...response.data.results]);
+      setLogsCursor(response.data.next);
+    } catch (err) {
+      console.error("Loading more logs failed:", err);
+      toast.error("Failed to load more logs");
+    }
+  };
+
   const handleUserSearch = async (e) => {
     e.preventDefault();
     setLoading(true);
@@ -367,11 +421,20 @@ const AnalyticsDashboard = () => {
                 </div>
                 <div>
                   <h3 className="font-bold text-slate-900">Inference Latency</h3>
-                  <p className="text-sm text-slate-500">Average model response time.</p>
+                  <p className="text-sm text-slate-500">Median response time (p90 / p99 below).</p>
                 </div>
               </div>
               <div className="text-center py-10">
-                <p className="text-6xl font-bold text-slate-900 mb-4">{data?.nlp.avg_latency}s</p>
+                <p className="text-6xl font-bold text-slate-900 mb-4">{data?.nlp.latency?.latency?.p50 ?? 0}s</p>
+                <div className="grid grid-cols-4 gap-2 text-xs text-slate-500 mb-6">
+                  {['ttft', 'latency', 'embedding', 'retrieval'].map((metric) => (
+                    <div key={metric}>
+                      <p className="font-bold uppercase tracking-wide">{metric}</p>
+                      <p>p90 {data?.nlp.latency?.[metric]?.p90 ?? '-'}s</p>
+                      <p>p99 {data?.nlp.latency?.[metric]?.p99 ?? '-'}s</p>
+                    </div>
+                  ))}
+                </div>
                 <div className="flex items-center justify-center gap-2 text-emerald-600 bg-emerald-50 w-fit mx-auto px-4 py-2 rounded-full font-bold">
                   <Zap className="w-4 h-4" />
                   Optimal Score
@@ -580,7 +643,12 @@ const AnalyticsDashboard = () => {
             </div>
             
             <div className="p-4 bg-slate-50 border-t border-slate-200 flex items-center justify-between">
-              <p className="text-xs text-slate-500 font-medium">Showing top {logs.length} interactions</p>
+              <div className="flex items-center gap-4">
+                <p className="text-xs text-slate-500 font-medium">Showing top {logs.length} interactions</p>
+                {logsCursor && (
+                  <Button variant="ghost" size="sm" onClick={handleLoadMoreLogs}>Load more</Button>
+                )}
+              </div>
               <Button variant="ghost" size="sm" className="text-blue-600 font-bold">Export to JSON <FileJson className="w-3 h-3 ml-2"/></Button>
             </div>
           </Card>
@@ -841,13 +909,24 @@ const AnalyticsDashboard = () => {
             <Card className="p-6">
               <h3 className="font-bold text-slate-900 mb-6 flex items-center gap-2">
                 <TrendingUp className="w-4 h-4 text-indigo-600" />
-                Scalability Forecast
+                Load Shedding
               </h3>
-              <p className="text-xs text-slate-500 mb-4">Current load suggests optimal performance.</p>
+              <p className="text-xs text-slate-500 mb-4">
+                {data?.health.degradation?.level
+                  ? `Degraded: level ${data.health.degradation.level} (${data.health.degradation.name.replace('_', ' ')})`
+                  : 'Full pipeline: no degradation.'}
+              </p>
               <div className="h-2 w-full bg-slate-100 rounded-full overflow-hidden">
-                <div className="h-full bg-indigo-500 w-[15%]" />
+                <div
+                  className={`h-full ${data?.health.degradation?.level ? 'bg-amber-500' : 'bg-indigo-500'}`}
+                  style={{ width: `${Math.min(100, Math.round((data?.health.degradation?.signals.inflight_ratio || 0) * 100))}%` }}
+                />
               </div>
-              <p className="text-[10px] text-slate-400 mt-2 text-right">15% Resource Usage</p>
+              <p className="text-[10px] text-slate-400 mt-2 text-right">
+                {data?.health.degradation?.signals.inflight ?? 0} / {data?.health.degradation?.signals.inflight_limit ?? 0} generations in flight
+                {data?.health.degradation?.signals.p95_ttft != null && ` · p95 TTFT ${data.health.degradation.signals.p95_ttft}s`}
+                {` · breaker ${data?.health.degradation?.signals.breaker ?? 'closed'}`}
+              </p>
             </Card>
           </div>
         )}
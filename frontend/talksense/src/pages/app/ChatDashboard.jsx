@@ -179,12 +179,17 @@ const ChatDashboard = () => {
   const navigate = useNavigate();
   const location = useLocation();
   const scrollRef = useRef(null);
+  // Distance from the bottom to restore after prepending older messages
+  const prependedFromRef = useRef(null);
   
   // Initialize state from location.state if available (for navigation transition)
   const [messages, setMessages] = useState(location.state?.messages || []);
   const [inputText, setInputText] = useState("");
   const [sendingSessionId, setSendingSessionId] = useState(location.state?.sendingSessionId || null);
   const [isLoadingSession, setIsLoadingSession] = useState(false);
+  // Cursor for the page of messages before the oldest one shown (null: start of chat)
+  const [olderCursor, setOlderCursor] = useState(null);
+  const [isLoadingOlder, setIsLoadingOlder] = useState(false);
   const [ratingLoading, setRatingLoading] = useState(null);
   const [editingMessage, setEditingMessage] = useState(null);
   const [isShareModalOpen, setIsShareModalOpen] = useState(false);
@@ -218,11 +223,14 @@ const ChatDashboard = () => {
       try {
         console.log("Fetching session details for:", sessionId);
         const response = await chatService.getSession(sessionId);
+        // The latest page arrives newest first
         const fetchedMessages = response.data?.messages || [];
-        setMessages(Array.isArray(fetchedMessages) ? fetchedMessages : []);
+        setMessages(Array.isArray(fetchedMessages) ? [...fetchedMessages].reverse() : []);
+        setOlderCursor(response.data?.cursors?.before || null);
       } catch (error) {
         console.error("Failed to fetch session:", error);
         setMessages([]);
+        setOlderCursor(null);
       } finally {
         setIsLoadingSession(false);
       }
@@ -253,13 +261,19 @@ const ChatDashboard = () => {
     } else {
       setMessages([]);
     }
+    setOlderCursor(null);
   }, [sessionId]); // Removed sendingSessionId dependency to avoid re-triggering logic unnecessarily
 
-  // Scroll to bottom on new messages
+  // Scroll to bottom on new messages (or keep the reader in place after
+  // prepending an older page)
   useEffect(() => {
-    if (scrollRef.current) {
-      scrollRef.current.scrollTop = scrollRef.current.scrollHeight;
+    if (!scrollRef.current) return;
+    if (prependedFromRef.current !== null) {
+      scrollRef.current.scrollTop = scrollRef.current.scrollHeight - prependedFromRef.current;
+      prependedFromRef.current = null;
+      return;
     }
+    scrollRef.current.scrollTop = scrollRef.current.scrollHeight;
   }, [messages, sendingSessionId]);
 
   // Auto-expand textarea
@@ -378,22 +392,27 @@ const ChatDashboard = () => {
               m.id === assistantMsgId ? { ...m, content: m.content + chunk, status: MessageStatus.STREAMING } : m
             ));
           },
-          async (fullText) => {
-            // On complete, mark as not streaming
-            setMessages(prev => prev.map(m => 
-              m.id === assistantMsgId ? { ...m, content: fullText, isStreaming: false, status: MessageStatus.COMPLETED } : m
-            ));
-            
-            // Refresh messages from backend to get real UUIDs for the new messages
-            // This is crucial for actions like 'Rate' to work, which require real UUIDs
-            try {
-                const refreshedSession = await chatService.getSession(currentSessionId);
-                if (refreshedSession.data?.messages) {
-                    setMessages(refreshedSession.data.messages);
-                }
-            } catch (refreshError) {
-                console.error("Failed to refresh session after streaming:", refreshError);
-            }
+          async (fullText, done) => {
+            // On complete, mark as not streaming and swap in the real UUIDs
+            // from the "done" event (needed for actions like 'Rate')
+            setMessages(prev => prev.map(m => {
+              if (m.id === assistantMsgId) {
+                return {
+                  ...m,
+                  id: done?.message_id ?? m.id,
+                  turn_id: done?.turn_id,
+                  content: fullText,
+                  tokens_used: done?.tokens?.completion,
+                  metadata: { ...m.metadata, latency: done?.latency },
+                  isStreaming: false,
+                  status: MessageStatus.COMPLETED
+                };
+              }
+              if (m.id === tempUserMsg.id && done) {
+                return { ...m, id: done.user_message_id, turn_id: done.turn_id };
+              }
+              return m;
+            }));
             
             setSendingSessionId(null);
           },
@@ -403,6 +422,11 @@ const ChatDashboard = () => {
               m.id === assistantMsgId ? { ...m, content: "Sorry, something went wrong. Please try again in a moment.", isStreaming: false, status: MessageStatus.ERROR } : m
             ));
             setSendingSessionId(null);
+          },
+          (sources) => {
+            setMessages(prev => prev.map(m => 
+              m.id === assistantMsgId ? { ...m, metadata: { ...m.metadata, retrieved_docs: sources } } : m
+            ));
           }
         );
       } catch (streamOuterError) {
@@ -427,6 +451,25 @@ const ChatDashboard = () => {
     }
   };
 
+  const handleLoadOlder = async () => {
+    if (!olderCursor || isLoadingOlder) return;
+    setIsLoadingOlder(true);
+    try {
+      const response = await chatService.getSessionMessages(sessionId, { before: olderCursor });
+      const older = [...(response.data?.results || [])].reverse();
+      prependedFromRef.current = scrollRef.current
+        ? scrollRef.current.scrollHeight - scrollRef.current.scrollTop
+        : null;
+      setMessages(prev => [...older, ...prev]);
+      setOlderCursor(response.data?.cursors?.before || null);
+    } catch (error) {
+      console.error("Failed to load earlier messages:", error);
+      toast.error("Failed to load earlier messages");
+    } finally {
+      setIsLoadingOlder(false);
+    }
+  };
+
   const handleRate = async (messageId, rating) => {
     // Prevent rating temporary messages (which have numeric timestamp IDs)
     if (typeof messageId === 'number') {
@@ -529,6 +572,20 @@ const ChatDashboard = () => {
             </div>
           )}
 
+          {/* Earlier messages (paged in on demand) */}
+          {olderCursor && (
+            <div className="flex justify-center">
+              <button
+                onClick={handleLoadOlder}
+                disabled={isLoadingOlder}
+                className="flex items-center gap-2 text-sm font-medium text-slate-500 hover:text-blue-600 disabled:opacity-60 transition-colors"
+              >
+                {isLoadingOlder ? <Loader2 className="w-4 h-4 animate-spin" /> : <ChevronUp className="w-4 h-4" />}
+                Load earlier messages
+              </button>
+            </div>
+          )}
+
           {/* Message List */}
           {messages.map((message) => (
             <ChatMessageItem 
@@ -15,6 +15,8 @@ const PublicChatView = () => {
   const [session, setSession] = useState(null);
   const [isLoading, setIsLoading] = useState(true);
   const [error, setError] = useState(null);
+  const [olderCursor, setOlderCursor] = useState(null);
+  const [isLoadingOlder, setIsLoadingOlder] = useState(false);
 
   useEffect(() => {
     const fetchPublicSession = async () => {
@@ -22,7 +24,9 @@ const PublicChatView = () => {
       setError(null);
       try {
         const response = await chatService.getPublicSession(chatId);
-        setSession(response.data);
+        // The latest page arrives newest first
+        setSession({ ...response.data, messages: [...(response.data?.messages || [])].reverse() });
+        setOlderCursor(response.data?.cursors?.before || null);
       } catch (err) {
         console.error("Failed to fetch public session:", err);
         setError("This chat is not available or has been made private.");
@@ -36,6 +40,21 @@ const PublicChatView = () => {
     }
   }, [chatId]);
 
+  const loadOlder = async () => {
+    if (!olderCursor || isLoadingOlder) return;
+    setIsLoadingOlder(true);
+    try {
+      const response = await chatService.getPublicSessionMessages(chatId, { before: olderCursor });
+      const older = [...(response.data?.results || [])].reverse();
+      setSession(prev => ({ ...prev, messages: [...older, ...prev.messages] }));
+      setOlderCursor(response.data?.cursors?.before || null);
+    } catch (err) {
+      console.error("Failed to load earlier messages:", err);
+    } finally {
+      setIsLoadingOlder(false);
+    }
+  };
+
   if (isLoading) {
     return (
       <div className="min-h-screen bg-[#F9FAFB] flex items-center justify-center">
@@ -101,6 +120,20 @@ const PublicChatView = () => {
             </p>
           </div>
 
+          {/* Earlier messages */}
+          {olderCursor && (
+            <div className="flex justify-center">
+              <button
+                onClick={loadOlder}
+                disabled={isLoadingOlder}
+                className="flex items-center gap-2 text-sm font-medium text-slate-500 hover:text-blue-600 disabled:opacity-60 transition-colors"
+              >
+                {isLoadingOlder && <Loader2 className="w-4 h-4 animate-spin" />}
+                Load earlier messages
+              </button>
+            </div>
+          )}
+
           {/* Messages */}
           {session?.messages?.map((message) => (
             <div
@@ -1,4 +1,4 @@
-import api from "./apiClient";
+import api, { getAccessToken } from "./apiClient";
 
 export const adminAPI = {
   /**
@@ -13,8 +13,75 @@ export const adminAPI = {
    */
   getTrends: (days = 7) => api.get(`/chat/admin/trends/?days=${days}`),
 
-  searchLogs: (query = "") =>
-    api.get(`/chat/admin/logs/?q=${encodeURIComponent(query)}`),
+  /**
+   * Zero-filled time series for several metrics in one request
+   * @param {string[]} metrics - any of sessions, messages, tokens, fallbacks
+   * @param {number} days - Range to cover, ending now
+   * @param {string} interval - hour, day or week
+   */
+  getSeries: (metrics = ["sessions"], days = 30, interval = "day") =>
+    api.get("/chat/admin/series/", {
+      params: { metrics: metrics.join(","), days, interval },
+    }),
+
+  /**
+   * Live metric deltas over SSE (fetch, to send the Authorization header)
+   *
+   * Events: "status" { degradation, latency_last_hour }, "turn" { messages,
+   * tokens, fallback, intent, sentiment, timings }, "session", and
+   * "resync" (reload the analytics payload). The server closes the stream
+   * periodically; it is reopened with Last-Event-ID until `signal` aborts.
+   */
+  streamLive: async (onEvent, signal) => {
+    let lastEventId = 0;
+    while (!signal.aborted) {
+      try {
+        const response = await fetch(`${api.defaults.baseURL}/chat/admin/alive/`, {
+          headers: {
+            Authorization: `Bearer ${getAccessToken()}`,
+            "Last-Event-ID": String(lastEventId),
+          },
+          signal,
+        });
+        if (!response.ok) throw new Error(`HTTP error! status: ${response.status}`);
+
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = "";
+        while (true) {
+          const { value, done } = await reader.read();
+          if (done) break;
+          buffer += decoder.decode(value, { stream: true });
+          let boundary;
+          while ((boundary = buffer.indexOf("\n\n")) !== -1) {
+            const frame = buffer.slice(0, boundary);
+            buffer = buffer.slice(boundary + 2);
+            let event = "message";
+            let data = null;
+            for (const line of frame.split("\n")) {
+              if (line.startsWith("id: ")) lastEventId = Number(line.slice(4));
+              else if (line.startsWith("event: ")) event = line.slice(7);
+              else if (line.startsWith("data: ")) data = JSON.parse(line.slice(6));
+            }
+            if (data !== null) {
+              if (event === "resync") lastEventId = data.last_event_id;
+              onEvent(event, data);
+            }
+          }
+        }
+      } catch (error) {
+        if (signal.aborted) return;
+        console.error("Live analytics stream failed:", error);
+        await new Promise((resolve) => setTimeout(resolve, 5000));
+      }
+    }
+  },
+
+  /**
+   * Ranked chat log search; pass `next` from the previous page as cursor
+   */
+  searchLogs: (query = "", cursor = null) =>
+    api.get("/chat/admin/logs/", { params: { q: query, ...(cursor && { cursor }) } }),
 
   /**
    * Trigger the automated feedback dataset export
@@ -1,5 +1,8 @@
 import apiClient, { getAccessToken } from "./apiClient";
 
+// Reconnects to a dropped stream before giving up
+const STREAM_RESUME_ATTEMPTS = 3;
+
 /**
  * Service for handling chat-related API calls
  */
@@ -10,6 +13,21 @@ const chatService = {
    */
   getSessions: () => apiClient.get("/chat/sessions/"),
 
+  /**
+   * Sessions and messages changed or deleted since a sync token
+   * (omit the token to get one positioned now, after a full load)
+   * @param {string} [since]
+   */
+  sync: (since) =>
+    apiClient.get("/chat/sync/", { params: since ? { since } : {} }),
+
+  /**
+   * Semantic search across the user's own chat history
+   * @param {string} query
+   */
+  searchSessions: (query) =>
+    apiClient.get("/chat/sessions/search/", { params: { q: query } }),
+
   /**
    * Get archived sessions
    */
@@ -27,6 +45,14 @@ const chatService = {
    */
   getSession: (sessionId) => apiClient.get(`/chat/sessions/${sessionId}/`),
 
+  /**
+   * Page through a session's messages (newest first)
+   * @param {string|number} sessionId
+   * @param {Object} cursor - { before } for older or { after } for newer messages
+   */
+  getSessionMessages: (sessionId, cursor = {}) =>
+    apiClient.get(`/chat/sessions/${sessionId}/messages/`, { params: cursor }),
+
   /**
    * Update session details (like title)
    * @param {string|number} sessionId
@@ -73,7 +99,10 @@ const chatService = {
    * Send a message to a session
    * @param {Object} data - { session_id, content, use_rag, temperature }
    */
-  sendMessage: (data) => apiClient.post("/chat/messages/", data),
+  sendMessage: (data, idempotencyKey = crypto.randomUUID()) =>
+    apiClient.post("/chat/messages/", data, {
+      headers: { "Idempotency-Key": idempotencyKey },
+    }),
 
   /**
    * Rate an AI message
@@ -85,46 +114,130 @@ const chatService = {
 
   /**
    * Stream a message via fetch (to support Auth headers)
+   *
+   * The server sends typed SSE events with JSON payloads:
+   * - "sources": retrieved knowledge base chunks
+   * - "token":   { text } coalesced response text
+   * - "done":    { message_id, user_message_id, turn_id, latency, ttft, tokens }
+   * - "error":   { error }
+   * Lines starting with ":" are heartbeats and are ignored.
+   * A dropped connection is resumed via X-Turn-Id + Last-Event-ID.
    */
-  streamMessage: async (data, onChunk, onComplete, onError) => {
+  streamMessage: async (data, onChunk, onComplete, onError, onSources) => {
     try {
       const baseUrl = apiClient.defaults.baseURL;
       const token = getAccessToken();
 
-      const response = await fetch(`${baseUrl}/chat/messages/stream/`, {
-        method: "POST",
-        headers: {
-          "Content-Type": "application/json",
-          Authorization: `Bearer ${token}`,
-        },
-        body: JSON.stringify(data),
-      });
+      let fullText = "";
+      let doneMeta = null;
+      let lastEventId = 0;
+
+      const handleFrame = (frame) => {
+        let event = "message";
+        const dataLines = [];
+        for (const line of frame.split("\n")) {
+          if (line.startsWith(":")) continue;
+          if (line.startsWith("id: ")) lastEventId = Number(line.slice(4));
+          else if (line.startsWith("event: ")) event = line.slice(7);
+          else if (line.startsWith("data: ")) dataLines.push(line.slice(6));
+        }
+        if (!dataLines.length) return;
+        const payload = JSON.parse(dataLines.join("\n"));
+
+        if (event === "token") {
+          fullText += payload.text;
+          onChunk(payload.text);
+        } else if (event === "sources") {
+          onSources?.(payload);
+        } else if (event === "done") {
+          doneMeta = payload;
+        } else if (event === "error") {
+          throw new Error(payload.error);
+        }
+      };
+
+      const consume = async (response) => {
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = "";
+        while (true) {
+          const { value, done } = await reader.read();
+          if (done) break;
+
+          // Frames are separated by a blank line and may span reads
+          buffer += decoder.decode(value, { stream: true });
+          let boundary;
+          while ((boundary = buffer.indexOf("\n\n")) !== -1) {
+            handleFrame(buffer.slice(0, boundary));
+            buffer = buffer.slice(boundary + 2);
+          }
+        }
+      };
+
+      // Retrying with the same key attaches to the original generation
+      // instead of starting (and paying for) a second one
+      const idempotencyKey = crypto.randomUUID();
+      const submit = () =>
+        fetch(`${baseUrl}/chat/messages/astream/`, {
+          method: "POST",
+          headers: {
+            "Content-Type": "application/json",
+            Authorization: `Bearer ${token}`,
+            "Idempotency-Key": idempotencyKey,
+          },
+          body: JSON.stringify(data),
+        });
+
+      let response;
+      for (let attempt = 0; ; attempt++) {
+        try {
+          response = await submit();
+        } catch (error) {
+          if (!(error instanceof TypeError) || attempt >= STREAM_RESUME_ATTEMPTS) throw error;
+          await new Promise((resolve) => setTimeout(resolve, 500 * (attempt + 1)));
+          continue;
+        }
+        // Server busy: wait as instructed and try again
+        if (response.status === 429 && attempt < STREAM_RESUME_ATTEMPTS) {
+          const retryAfter = Number(response.headers.get("Retry-After")) || 1;
+          await new Promise((resolve) => setTimeout(resolve, retryAfter * 1000));
+          continue;
+        }
+        break;
+      }
 
       if (!response.ok) {
         throw new Error(`HTTP error! status: ${response.status}`);
       }
 
-      const reader = response.body.getReader();
-      const decoder = new TextDecoder();
-      let fullText = "";
-
+      // The generation keeps running server-side if the connection drops;
+      // reconnect with Last-Event-ID to pick up where we left off
+      const turnId = response.headers.get("X-Turn-Id");
+      let attempts = 0;
+      let current = response;
       while (true) {
-        const { value, done } = await reader.read();
-        if (done) break;
-
-        const chunk = decoder.decode(value, { stream: true });
-        // EventSource format: "data: chunk\n\n"
-        const lines = chunk.split("\n");
-        for (const line of lines) {
-          if (line.startsWith("data: ")) {
-            const text = line.replace("data: ", "");
-            fullText += text;
-            onChunk(text);
-          }
+        try {
+          await consume(current);
+        } catch (error) {
+          if (!turnId || !(error instanceof TypeError)) throw error;
         }
+        if (doneMeta || !turnId || attempts >= STREAM_RESUME_ATTEMPTS) break;
+
+        attempts += 1;
+        await new Promise((resolve) => setTimeout(resolve, 500 * attempts));
+        current = await fetch(`${baseUrl}/chat/messages/astream/${turnId}/`, {
+          headers: {
+            Authorization: `Bearer ${getAccessToken()}`,
+            "Last-Event-ID": String(lastEventId),
+          },
+        });
+        if (!current.ok) break;
       }
 
-      onComplete?.(fullText);
+      if (!doneMeta && turnId) {
+        throw new Error("Stream interrupted");
+      }
+      onComplete?.(fullText, doneMeta);
     } catch (error) {
       console.error("Streaming error:", error);
       // Pass a sanitized error - don't expose raw API details
@@ -139,6 +252,14 @@ const chatService = {
   getPublicSession: (sessionId) =>
     apiClient.get(`/chat/sessions/${sessionId}/public/`),
 
+  /**
+   * Page through a public session's messages (newest first, no auth required)
+   * @param {string} sessionId
+   * @param {Object} cursor - { before } for older messages
+   */
+  getPublicSessionMessages: (sessionId, cursor = {}) =>
+    apiClient.get(`/chat/sessions/${sessionId}/public/messages/`, { params: cursor }),
+
   /**
    * Toggle public sharing for a session
    * @param {string} sessionId